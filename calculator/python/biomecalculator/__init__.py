@@ -33,15 +33,15 @@ print(biomecalculator.classify_biome_on_planet(**Mars, **Isidis_Mars,
   exoplanet=True, tidal_lock=False))
 >>> Biome.MOONSCAPE
 # Predict biomes for a fantasy map
-lats = numpy.linspace(-90,90,180)
+# (inputs that only vary by latitude can be given as column vectors, 
+#  which are broadcast across the map without making full-size copies)
+lats = numpy.linspace(-90,90,180).reshape((-1, 1))
 lons = numpy.linspace(-180,180,360)
-lat_map = numpy.outer(lats, numpy.ones_like(lons))
-lon_map = numpy.outer(numpy.ones_like(lats), lons)
-solar_flux_map = 800*numpy.cos(lat_map*3.14/180)
-altitude_map = 1000*(numpy.random.default_rng().random(lat_map.shape)-0.5)
-temperature_map = 40*numpy.cos(lat_map*3.14/180)-10
-temp_variation_map = numpy.abs(20 * numpy.sin(lat_map*3.14/180))
-rainfall_map = 1000*(numpy.random.default_rng().random(lat_map.shape))
+solar_flux_map = 800*numpy.cos(lats*3.14/180)
+altitude_map = 1000*(numpy.random.default_rng().random((lats.size, lons.size))-0.5)
+temperature_map = 40*numpy.cos(lats*3.14/180)-10
+temp_variation_map = numpy.abs(20 * numpy.sin(lats*3.14/180))
+rainfall_map = 1000*(numpy.random.default_rng().random(altitude_map.shape))
 biome_map = biomecalculator.classify_planet_biomes(9.81, 101.3, 
   solar_flux_map, altitude_map, temperature_map, temp_variation_map, 
   rainfall_map, exoplanet=False)
@@ -53,11 +53,16 @@ print(biome_map)
 >>>  [ 8 21 21 ... 16  7  7]
 >>>  [ 8 21  8 ...  8 16  7]
 >>>  [ 7 16 16 ... 16 21 21]]
+# Use a custom-tuned terrestrial biome model (see biomecalculator.model)
+biomecalculator.use_model('my-tuned-model.bin')
 ```
 
+A custom model file can also be selected at startup with the BIOMECALCULATOR_MODEL environment variable.
+
 """
-import sys, numpy
+import os, sys, numpy
 from .biomes import Biome
+from .model import BiomeModel, DEFAULT_MODEL
 
 
 try:
@@ -135,35 +140,118 @@ try:
 		))
 
 	def _classify_planet_biomes(
-		gravity_m_per_s2: float,
-		mean_surface_pressure_kPa: float,
+		gravity_m_per_s2,
+		mean_surface_pressure_kPa,
 		mean_solar_flux_Wpm2: numpy.ndarray,
 		altitude_m: numpy.ndarray,
 		mean_temp_C: numpy.ndarray,
 		temp_var_C: numpy.ndarray,
 		annual_precip_mm: numpy.ndarray,
-		exoplanet: bool
+		exoplanet: bool,
+		input_scaling: dict = None
 	) -> numpy.ndarray:
-		assert tuple(mean_solar_flux_Wpm2.shape) == tuple(altitude_m.shape)
-		assert tuple(mean_temp_C.shape) == tuple(altitude_m.shape)
-		assert tuple(temp_var_C.shape) == tuple(altitude_m.shape)
-		assert tuple(annual_precip_mm.shape) == tuple(altitude_m.shape)
-		_mean_solar_flux_Wpm2 = mean_solar_flux_Wpm2.astype(numpy.float32).reshape((-1,))
-		_altitude_m = altitude_m.astype(numpy.float32).reshape((-1,))
-		_mean_temp_C = mean_temp_C.astype(numpy.float32).reshape((-1,))
-		_temp_var_C = temp_var_C.astype(numpy.float32).reshape((-1,))
-		_annual_precip_mm = annual_precip_mm.astype(numpy.float32).reshape((-1,))
-		biomes = classifier_cython.classify_planet_biomes(
+		## (the Cython classifier reads float and 8/16/32-bit integer arrays in place, and broadcasts them without copying)
+		return classifier_cython.classify_planet_biomes(
 			gravity_m_per_s2,
 			mean_surface_pressure_kPa,
-			_mean_solar_flux_Wpm2,
-			_altitude_m,
-			_mean_temp_C,
-			_temp_var_C,
-			_annual_precip_mm,
-			exoplanet
+			mean_solar_flux_Wpm2,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			exoplanet,
+			input_scaling
+		)
+
+	def _summarize_planet_biomes(
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
+			mean_solar_flux_Wpm2: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			exoplanet: bool,
+			weights: numpy.ndarray,
+			labels: numpy.ndarray,
+			num_labels: int,
+			input_scaling: dict,
+			threads: int
+	) -> numpy.ndarray:
+		return classifier_cython.summarize_planet_biomes(
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
+			mean_solar_flux_Wpm2,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			exoplanet,
+			weights,
+			labels,
+			num_labels,
+			input_scaling,
+			threads
+		)
+
+	def _classify_biomes_with_pressure(
+			mean_solar_flux_Wpm2: numpy.ndarray,
+			pressure_kPa: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			input_scaling: dict = None
+	) -> numpy.ndarray:
+		return classifier_cython.classify_biomes_with_pressure(
+			mean_solar_flux_Wpm2,
+			pressure_kPa,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			input_scaling
 		)
-		return biomes.reshape(mean_temp_C.shape)
+
+	def _sweep_planet_biomes(
+			planet_mass_kg: numpy.ndarray,
+			planet_mean_radius_km: numpy.ndarray,
+			toa_solar_flux_Wpm2: numpy.ndarray,
+			axis_tilt_deg: numpy.ndarray,
+			tidal_lock: numpy.ndarray,
+			mean_surface_pressure_kPa: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			latitude: numpy.ndarray,
+			longitude: numpy.ndarray,
+			exoplanet: bool,
+			weights: numpy.ndarray,
+			input_scaling: dict,
+			threads: int
+	) -> numpy.ndarray:
+		return classifier_cython.sweep_planet_biomes(
+			planet_mass_kg,
+			planet_mean_radius_km,
+			toa_solar_flux_Wpm2,
+			axis_tilt_deg,
+			tidal_lock,
+			mean_surface_pressure_kPa,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			latitude,
+			longitude,
+			exoplanet,
+			weights,
+			input_scaling,
+			threads
+		)
+
+	def _set_model(model: BiomeModel):
+		classifier_cython.set_model(model)
 	print('INFO: using Cython bindings for improved performance', file=sys.stderr)
 	#
 except Exception as ex:
@@ -241,14 +329,15 @@ except Exception as ex:
 		))
 
 	def _classify_planet_biomes(
-			gravity_m_per_s2: float,
-			mean_surface_pressure_kPa: float,
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
 			mean_solar_flux_Wpm2: numpy.ndarray,
 			altitude_m: numpy.ndarray,
 			mean_temp_C: numpy.ndarray,
 			temp_var_C: numpy.ndarray,
 			annual_precip_mm: numpy.ndarray,
-			exoplanet: bool
+			exoplanet: bool,
+			input_scaling: dict = None
 	) -> numpy.ndarray:
 		return classifier_python.classify_planet_biomes(
 			gravity_m_per_s2,
@@ -258,9 +347,134 @@ except Exception as ex:
 			mean_temp_C,
 			temp_var_C,
 			annual_precip_mm,
-			exoplanet
+			exoplanet,
+			input_scaling
+		)
+
+	def _summarize_planet_biomes(
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
+			mean_solar_flux_Wpm2: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			exoplanet: bool,
+			weights: numpy.ndarray,
+			labels: numpy.ndarray,
+			num_labels: int,
+			input_scaling: dict,
+			threads: int
+	) -> numpy.ndarray:
+		return classifier_python.summarize_planet_biomes(
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
+			mean_solar_flux_Wpm2,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			exoplanet,
+			weights,
+			labels,
+			num_labels,
+			input_scaling,
+			threads
+		)
+
+	def _classify_biomes_with_pressure(
+			mean_solar_flux_Wpm2: numpy.ndarray,
+			pressure_kPa: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			input_scaling: dict = None
+	) -> numpy.ndarray:
+		return classifier_python.classify_biomes_with_pressure(
+			mean_solar_flux_Wpm2,
+			pressure_kPa,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			input_scaling
+		)
+
+	def _sweep_planet_biomes(
+			planet_mass_kg: numpy.ndarray,
+			planet_mean_radius_km: numpy.ndarray,
+			toa_solar_flux_Wpm2: numpy.ndarray,
+			axis_tilt_deg: numpy.ndarray,
+			tidal_lock: numpy.ndarray,
+			mean_surface_pressure_kPa: numpy.ndarray,
+			altitude_m: numpy.ndarray,
+			mean_temp_C: numpy.ndarray,
+			temp_var_C: numpy.ndarray,
+			annual_precip_mm: numpy.ndarray,
+			latitude: numpy.ndarray,
+			longitude: numpy.ndarray,
+			exoplanet: bool,
+			weights: numpy.ndarray,
+			input_scaling: dict,
+			threads: int
+	) -> numpy.ndarray:
+		return classifier_python.sweep_planet_biomes(
+			planet_mass_kg,
+			planet_mean_radius_km,
+			toa_solar_flux_Wpm2,
+			axis_tilt_deg,
+			tidal_lock,
+			mean_surface_pressure_kPa,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			latitude,
+			longitude,
+			exoplanet,
+			weights,
+			input_scaling,
+			threads
 		)
 
+	def _set_model(model: BiomeModel):
+		classifier_python.set_model(model)
+
+
+_model = DEFAULT_MODEL
+
+def use_model(model) -> BiomeModel:
+	"""
+This function replaces the model (reference points, normalization bounds, and thresholds) used to classify terrestrial
+biomes, for all of the classify functions in this module
+
+Parameters:
+    model (BiomeModel or str) - the model, or the filepath of a binary model file (which is memory-mapped), or None to
+                                restore the built-in model
+
+Returns:
+    (BiomeModel) returns the model now in use
+    """
+	global _model
+	if model is None:
+		model = DEFAULT_MODEL
+	elif not isinstance(model, BiomeModel):
+		model = BiomeModel.load(model, mmap=True)
+	_set_model(model)
+	_model = model
+	return model
+
+def get_model() -> BiomeModel:
+	"""
+Returns:
+    (BiomeModel) returns the model currently used to classify terrestrial biomes
+    """
+	return _model
+
+if os.environ.get('BIOMECALCULATOR_MODEL'):
+	use_model(os.environ['BIOMECALCULATOR_MODEL'])
+
 
 def classify_biome(
 	mean_solar_flux_Wpm2,
@@ -391,34 +605,72 @@ Returns:
 	)
 
 def classify_planet_biomes(
-	gravity_m_per_s2: float,
-	mean_surface_pressure_kPa: float,
+	gravity_m_per_s2,
+	mean_surface_pressure_kPa,
 	mean_solar_flux_Wpm2: numpy.ndarray,
 	altitude_m: numpy.ndarray,
 	mean_temp_C: numpy.ndarray,
 	temp_var_C: numpy.ndarray,
 	annual_precip_mm: numpy.ndarray,
-	exoplanet: bool
+	exoplanet: bool,
+	dedup: bool = False,
+	stats: dict = None,
+	input_scaling: dict = None
 ) -> numpy.ndarray:
 	"""
 This function estimates the biome codes for an array of planet and climate parameters, with the option to include
 extreme exoplanet biomes that do not exist on Earth
 
+Quantized inputs (eg integer altitudes and precipitation, or temperatures in steps of 0.1 C) often repeat the exact same
+combination of values over large areas (especially the oceans). With dedup=True, only the unique combinations of
+input values are classified, and the results are then copied to all of the cells that share each combination.
+
+The input arrays may be float32, float64, float16, int16, uint16, int8, uint8, or int32 arrays, which are read as-is
+(without making float32 copies of them) by the Cython implementation. Scaled integer inputs (eg temperatures stored in
+tenths of a degree) can be read directly by giving their scale and offset with the input_scaling parameter.
+
+The array parameters only need to be broadcastable to the same shape (by the usual numpy broadcasting rules), so
+constant inputs can be given as a single number, and inputs that only vary by latitude as a column vector (eg
+solar_flux_map[:, 0:1]), without making full-size maps of them. This includes the gravity and sea-level pressure, which
+can also be maps (eg the surface pressure field of a weather simulation).
+
 Parameters:
-    gravity_m_per_s2 (float) - gravity at the surface of the planet, in meters per second per second
-    mean_surface_pressure_kPa (float) - atmospheric pressure at sea-level, in kPa
-    mean_solar_flux_Wpm2 (numpy.ndarray) - annual mean solar flux, in watts per square meter
-    altitude_m (numpy.ndarray) - altitude above (or below, if negative) sea-level, in meters
-    mean_temp_C (numpy.ndarray) - annual mean temperature, in degrees C
-    temp_var_C (numpy.ndarray) - the +/- range of the temperature throughout the year (1.5 standard deviations), in
-                                 degrees C
-    annual_precip_mm (numpy.ndarray) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm rainfall)
+    gravity_m_per_s2 (numpy.ndarray or float) - gravity at the surface of the planet, in meters per second per second
+    mean_surface_pressure_kPa (numpy.ndarray or float) - atmospheric pressure at sea-level, in kPa
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
     exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
                        biomes
+    dedup (bool) - set to true to only classify each unique combination of input values once (faster for inputs with
+                   many repeated values, slower for inputs with few)
+    stats (dict) - optional dictionary, which (if dedup is true) is filled in with the number of cells ('cells'), the
+                   number of unique combinations of inputs ('unique'), and their ratio ('dedup_ratio')
+    input_scaling (dict) - optional (scale, offset) tuples for any of the array parameters (by name), for inputs that
+                           are stored scaled; the value used for each cell is (array value * scale) + offset, eg
+                           {'mean_temp_C': (0.1, 0.0), 'annual_precip_mm': (1.0, 0.0)}
 
 Returns:
-    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes
+    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes, with the broadcast
+    shape of the array parameters
     """
+	if dedup:
+		return _classify_unique_planet_biomes(
+			gravity_m_per_s2,
+			mean_surface_pressure_kPa,
+			mean_solar_flux_Wpm2,
+			altitude_m,
+			mean_temp_C,
+			temp_var_C,
+			annual_precip_mm,
+			exoplanet,
+			stats,
+			input_scaling
+		)
 	return _classify_planet_biomes(
 		gravity_m_per_s2,
 		mean_surface_pressure_kPa,
@@ -427,5 +679,252 @@ Returns:
 		mean_temp_C,
 		temp_var_C,
 		annual_precip_mm,
-		exoplanet
+		exoplanet,
+		input_scaling
+	)
+
+def summarize_planet_biomes(
+	gravity_m_per_s2,
+	mean_surface_pressure_kPa,
+	mean_solar_flux_Wpm2: numpy.ndarray,
+	altitude_m: numpy.ndarray,
+	mean_temp_C: numpy.ndarray,
+	temp_var_C: numpy.ndarray,
+	annual_precip_mm: numpy.ndarray,
+	exoplanet: bool,
+	weights: numpy.ndarray = None,
+	labels: numpy.ndarray = None,
+	num_labels: int = 0,
+	input_scaling: dict = None,
+	threads: int = None
+) -> numpy.ndarray:
+	"""
+This function estimates how much of a planet is covered by each biome, from the same inputs as
+classify_planet_biomes(...) but without making a map of the biomes (which saves a lot of memory for very large maps).
+The Cython implementation splits the work between multiple threads.
+
+Each location can be weighted by its area, for example by the cosine of the latitude for an equirectangular map (as a
+column vector, which is broadcast across the map), and the locations can be grouped by region labels, for example by
+latitude band (again as a column vector) or with a map of continents, to get a separate biome histogram for each region.
+
+Example usage:
+```
+lats = numpy.linspace(-89.5, 89.5, 180).reshape((-1, 1))
+areas = numpy.cos(numpy.radians(lats))
+bands = ((lats + 90) // 30).astype(numpy.int8) # 6 latitude bands of 30 degrees each
+hist = biomecalculator.summarize_planet_biomes(9.81, 101.3, solar_flux_map, altitude_map, temperature_map,
+  temp_variation_map, rainfall_map, exoplanet=False, weights=areas, labels=bands)
+jungle_fraction_by_band = hist[:, Biome.JUNGLE.value] / hist.sum(axis=1)
+```
+
+Parameters:
+    gravity_m_per_s2 (numpy.ndarray or float) - gravity at the surface of the planet, in meters per second per second
+    mean_surface_pressure_kPa (numpy.ndarray or float) - atmospheric pressure at sea-level, in kPa
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
+    exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
+                       biomes
+    weights (numpy.ndarray or float) - optional weight (eg area) of each location, broadcastable to the shape of the
+                                       other array parameters (default: every location counts as 1)
+    labels (numpy.ndarray or int) - optional integer region label of each location, broadcastable to the shape of the
+                                    other array parameters; locations with a label less than 0 or greater than or equal
+                                    to num_labels are ignored
+    num_labels (int) - number of region labels (default: 1 + the largest label)
+    input_scaling (dict) - optional (scale, offset) tuples for any of the array parameters (by name), as for
+                           classify_planet_biomes(...)
+    threads (int) - number of threads to use (default: number of CPUs)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or number of locations) of each biome, indexed by biome
+    code, as an array of shape (128,), or of shape (num_labels, 128) if labels are given
+    """
+	return _summarize_planet_biomes(
+		gravity_m_per_s2,
+		mean_surface_pressure_kPa,
+		mean_solar_flux_Wpm2,
+		altitude_m,
+		mean_temp_C,
+		temp_var_C,
+		annual_precip_mm,
+		exoplanet,
+		weights,
+		labels,
+		num_labels,
+		input_scaling,
+		threads
+	)
+
+def classify_biomes_with_pressure(
+	mean_solar_flux_Wpm2: numpy.ndarray,
+	pressure_kPa: numpy.ndarray,
+	altitude_m: numpy.ndarray,
+	mean_temp_C: numpy.ndarray,
+	temp_var_C: numpy.ndarray,
+	annual_precip_mm: numpy.ndarray,
+	input_scaling: dict = None
+) -> numpy.ndarray:
+	"""
+This function estimates the biome codes for arrays of climate parameters, like classify_biome(...) but for whole maps.
+Use this function instead of classify_planet_biomes(...) if the atmospheric pressure at each location is already known
+(eg from an atmosphere model), as the pressure is used as-is instead of being calculated from the altitude.
+
+The array parameters may be any of the array types accepted by classify_planet_biomes(...), and only need to be
+broadcastable to the same shape (by the usual numpy broadcasting rules).
+
+Parameters:
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    pressure_kPa (numpy.ndarray or float) - atmospheric pressure at the surface (use sea-level pressure for underwater
+                                            classification), in kPa
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
+    input_scaling (dict) - optional (scale, offset) tuples for any of the array parameters (by name), for inputs that
+                           are stored scaled; the value used for each cell is (array value * scale) + offset
+
+Returns:
+    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes, with the broadcast
+    shape of the array parameters
+    """
+	return _classify_biomes_with_pressure(
+		mean_solar_flux_Wpm2,
+		pressure_kPa,
+		altitude_m,
+		mean_temp_C,
+		temp_var_C,
+		annual_precip_mm,
+		input_scaling
 	)
+
+def sweep_planet_biomes(
+	planet_mass_kg: numpy.ndarray,
+	planet_mean_radius_km: numpy.ndarray,
+	toa_solar_flux_Wpm2: numpy.ndarray,
+	axis_tilt_deg: numpy.ndarray,
+	tidal_lock: numpy.ndarray,
+	mean_surface_pressure_kPa: numpy.ndarray,
+	altitude_m: numpy.ndarray,
+	mean_temp_C: numpy.ndarray,
+	temp_var_C: numpy.ndarray,
+	annual_precip_mm: numpy.ndarray,
+	latitude: numpy.ndarray,
+	longitude: numpy.ndarray,
+	exoplanet: bool = True,
+	weights: numpy.ndarray = None,
+	input_scaling: dict = None,
+	threads: int = None
+) -> numpy.ndarray:
+	"""
+This function estimates how much of each of many planets would be covered by each biome, by classifying a shared set
+of locations (a climate template) on every planet, as classify_biome_on_planet(...) would. This is much faster than
+calling classify_biome_on_planet(...) in a loop, as the planet-level calculations (such as checking for stars and
+black holes) are done once per planet, and the Cython implementation splits the work between multiple threads. No
+biome maps are made, only a compact summary of each planet.
+
+The planet parameters are arrays that are broadcastable to the same shape (the shape of the parameter grid), and the
+location parameters are arrays that are broadcastable to the same shape (the shape of the climate template).
+
+Example usage:
+```
+# which of these planets have jungles?
+masses = numpy.array([0.5, 1.0, 2.0]).reshape((-1, 1)) * 5.972e24
+toa_fluxes = numpy.array([1000, 1361, 1800]).reshape((1, -1))
+lats = numpy.linspace(-89.5, 89.5, 180).reshape((-1, 1))
+areas = numpy.cos(numpy.radians(lats))
+hist = biomecalculator.sweep_planet_biomes(masses, 6371, toa_fluxes, 23.4, False, 101.3, altitude_map, temperature_map,
+  temp_variation_map, rainfall_map, lats, 0, exoplanet=True, weights=areas)
+jungle_fraction = hist[..., Biome.JUNGLE.value] / hist.sum(axis=-1) # shape (3, 3)
+```
+
+Parameters:
+    planet_mass_kg (numpy.ndarray or float) - mass of each planet, in kg
+    planet_mean_radius_km (numpy.ndarray or float) - radius of each planet, in km
+    toa_solar_flux_Wpm2 (numpy.ndarray or float) - top-of-atmosphere solar flux from each planet's star, in watts per
+                                                   square meter
+    axis_tilt_deg (numpy.ndarray or float) - tilt of each planet's rotation axis, in degrees (ignored for tidally
+                                             locked planets)
+    tidal_lock (numpy.ndarray or bool) - true for tidally-locked planets (same side always faces the host star)
+    mean_surface_pressure_kPa (numpy.ndarray or float) - atmospheric pressure at sea-level of each planet, in kPa
+    altitude_m (numpy.ndarray or float) - altitude of each location above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature of each location, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
+    latitude (numpy.ndarray or float) - the latitude of each location, in degrees north (negative for south)
+    longitude (numpy.ndarray or float) - the longitude of each location, in degrees east (negative for west)
+    exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
+                       biomes
+    weights (numpy.ndarray or float) - optional weight (eg area) of each location, broadcastable to the shape of the
+                                       location parameters (default: every location counts as 1)
+    input_scaling (dict) - optional (scale, offset) tuples for any of the location parameters (by name), for inputs
+                           that are stored scaled; the value used is (array value * scale) + offset
+    threads (int) - number of threads to use (default: number of CPUs)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or number of locations) of each biome on each planet,
+    indexed by biome code, as an array with the shape of the planet parameters + (128,)
+    """
+	return _sweep_planet_biomes(
+		planet_mass_kg,
+		planet_mean_radius_km,
+		toa_solar_flux_Wpm2,
+		axis_tilt_deg,
+		tidal_lock,
+		mean_surface_pressure_kPa,
+		altitude_m,
+		mean_temp_C,
+		temp_var_C,
+		annual_precip_mm,
+		latitude,
+		longitude,
+		exoplanet,
+		weights,
+		input_scaling,
+		threads
+	)
+
+def _classify_unique_planet_biomes(
+	gravity_m_per_s2,
+	mean_surface_pressure_kPa,
+	mean_solar_flux_Wpm2: numpy.ndarray,
+	altitude_m: numpy.ndarray,
+	mean_temp_C: numpy.ndarray,
+	temp_var_C: numpy.ndarray,
+	annual_precip_mm: numpy.ndarray,
+	exoplanet: bool,
+	stats: dict,
+	input_scaling: dict
+) -> numpy.ndarray:
+	inputs = [numpy.asarray(x) for x in (
+		gravity_m_per_s2, mean_surface_pressure_kPa, mean_solar_flux_Wpm2, altitude_m, mean_temp_C, temp_var_C,
+		annual_precip_mm
+	)]
+	shape = numpy.broadcast_shapes(*[x.shape for x in inputs])
+	## only the inputs that vary from cell to cell (not the scalars) need to be compared
+	varying = [n for (n, x) in enumerate(inputs) if x.ndim > 0] or [0]
+	## pack the varying inputs of each cell into one row, so that each row can be compared as a single (void) value
+	dtype = numpy.result_type(*[inputs[n] for n in varying], numpy.float32)
+	packed = numpy.empty((int(numpy.prod(shape)), len(varying)), dtype=dtype)
+	for (col, n) in enumerate(varying):
+		packed[:, col].reshape(shape)[...] = inputs[n]
+	keys = packed.view(numpy.dtype((numpy.void, packed.itemsize * len(varying)))).reshape((-1,))
+	del packed
+	(unique_keys, inverse) = numpy.unique(keys, return_inverse=True)
+	del keys
+	unique_inputs = unique_keys.view(dtype).reshape((-1, len(varying)))
+	for (col, n) in enumerate(varying):
+		inputs[n] = numpy.ascontiguousarray(unique_inputs[:, col])
+	unique_biomes = _classify_planet_biomes(*inputs, exoplanet, input_scaling)
+	if stats is not None:
+		stats['cells'] = len(inverse)
+		stats['unique'] = len(unique_keys)
+		stats['dedup_ratio'] = len(inverse) / max(1, len(unique_keys))
+	return numpy.take(unique_biomes, inverse).reshape(shape)
@@ -138,3 +138,153 @@ def Biome_from_IGBP_cover_type(cover_type: int) -> Biome:
 	elif cover_type == 16: return Biome.SAND_SEA # could be barren, but 90+% is sand sea
 	elif cover_type == 17: return Biome.FRESHWATER # code 17 is usually ocean, but IGBP is meant for terrestrial analysis only, so if altitude is above sealevel, then it's freshwater
 	else: return Biome.UNKNOWN
+
+## 256-entry lookup table (IGBP land cover code -> biome code) for converting whole uint8 land cover rasters at once
+IGBP_TO_BIOME_LUT = numpy.asarray([Biome_from_IGBP_cover_type(code).value for code in range(0, 256)], dtype=numpy.uint8)
+
+def biomes_from_IGBP_cover_types(cover_types: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	Converts a raster of IGBP land cover types to Plantabyte biome codes (same as Biome_from_IGBP_cover_type(...)
+	for every pixel, but without creating any Biome objects). Codes outside 0-255 (eg fill values) become UNKNOWN.
+	:param cover_types: integer array of IGBP land cover codes
+	:param out: optional uint8 array to write the biome codes to (can be cover_types itself to convert in place, but
+		only if it is a uint8 array)
+	:return: Returns a uint8 array of biome codes
+	"""
+	if out is not None and out.dtype != numpy.uint8:
+		raise TypeError('out must be a uint8 array, not %s (only uint8 codes can be converted in place)' % out.dtype)
+	return numpy.take(IGBP_TO_BIOME_LUT, cover_types, out=out, mode='clip')
+
+
+## BIOME METADATA TABLES
+## 128-entry tables indexed by biome code (biome codes are 7-bit numbers), so that whole uint8 biome maps can be
+## queried or recolored with a single vectorized gather (eg BIOME_PALETTE[biome_map]) instead of one Biome at a time.
+## Codes that are not biomes have an empty name, black color, and are neither valid, terrestrial, nor aquatic.
+
+### biome categories (the yyy bits of 0yyyxxxx)
+CATEGORY_TERRESTRIAL = 0
+CATEGORY_AQUATIC = 1
+CATEGORY_ARTIFICIAL = 2
+CATEGORY_ASTRONOMICAL = 4
+CATEGORY_FICTIONAL = 7
+### returned by biome_categories(...) for codes that are not biomes (UNKNOWN, unused codes, and codes above 127)
+CATEGORY_NONE = 255
+
+_BIOME_COLORS = {
+	Biome.UNKNOWN: (0, 0, 0),
+	Biome.WETLAND: (60, 120, 100),
+	Biome.JUNGLE: (0, 100, 0),
+	Biome.SEASONAL_FOREST: (60, 160, 60),
+	Biome.NEEDLELEAF_FOREST: (20, 80, 60),
+	Biome.GRASSLAND: (170, 200, 90),
+	Biome.DESERT_SHRUBLAND: (200, 180, 110),
+	Biome.TUNDRA: (150, 160, 130),
+	Biome.BARREN: (130, 120, 110),
+	Biome.SAND_SEA: (240, 210, 140),
+	Biome.DEEP_OCEAN: (10, 30, 100),
+	Biome.FRESHWATER: (60, 130, 220),
+	Biome.SEA_FOREST: (40, 110, 90),
+	Biome.TROPICAL_REEF: (0, 200, 190),
+	Biome.ROCKY_SHALLOWS: (70, 110, 150),
+	Biome.SHALLOW_OCEAN: (30, 80, 170),
+	Biome.ICE_SHEET: (235, 245, 255),
+	Biome.BOILING_SEA: (200, 80, 60),
+	Biome.FARMLAND: (230, 200, 60),
+	Biome.URBAN: (160, 160, 160),
+	Biome.RUINS: (110, 100, 80),
+	Biome.MOONSCAPE: (90, 90, 90),
+	Biome.MAGMA_SEA: (255, 80, 0),
+	Biome.CRYOGEN_SEA: (150, 220, 255),
+	Biome.GAS_GIANT: (200, 160, 120),
+	Biome.STAR: (255, 240, 150),
+	Biome.NEUTRON_STAR: (200, 220, 255),
+	Biome.EVENT_HORIZON: (10, 0, 20),
+	Biome.BIOLUMINESCENT: (40, 0, 120),
+	Biome.DEAD: (80, 60, 60),
+	Biome.MAGIC_GARDEN: (255, 120, 220),
+	Biome.ELEMENTAL_CHAOS: (180, 40, 180),
+	Biome.OOZE: (120, 200, 0),
+}
+
+### category of each code (code >> 4)
+BIOME_CATEGORY_TABLE = numpy.right_shift(numpy.arange(128, dtype=numpy.uint8), 4)
+### True for every code that is a biome (other than UNKNOWN)
+BIOME_VALID_TABLE = numpy.zeros((128,), dtype=bool)
+### True for biomes with a land surface (terrestrial and artificial biomes, and moonscapes)
+BIOME_TERRESTRIAL_TABLE = numpy.zeros((128,), dtype=bool)
+### True for biomes with a liquid (or frozen) surface (aquatic biomes, and magma and cryogen seas)
+BIOME_AQUATIC_TABLE = numpy.zeros((128,), dtype=bool)
+### display name of each code
+BIOME_NAME_TABLE = numpy.zeros((128,), dtype='<U24')
+### RGB display color of each code
+BIOME_PALETTE = numpy.zeros((128, 3), dtype=numpy.uint8)
+for _b in Biome:
+	BIOME_VALID_TABLE[_b.value] = _b != Biome.UNKNOWN
+	BIOME_NAME_TABLE[_b.value] = _b.name.replace('_', ' ').title()
+	BIOME_PALETTE[_b.value] = _BIOME_COLORS[_b]
+BIOME_TERRESTRIAL_TABLE[:] = BIOME_VALID_TABLE & ((BIOME_CATEGORY_TABLE == CATEGORY_TERRESTRIAL) | (BIOME_CATEGORY_TABLE == CATEGORY_ARTIFICIAL))
+BIOME_TERRESTRIAL_TABLE[Biome.MOONSCAPE.value] = True
+BIOME_AQUATIC_TABLE[:] = BIOME_VALID_TABLE & (BIOME_CATEGORY_TABLE == CATEGORY_AQUATIC)
+BIOME_AQUATIC_TABLE[[Biome.MAGMA_SEA.value, Biome.CRYOGEN_SEA.value]] = True
+### category of each code, or CATEGORY_NONE if it is not a biome (used by biome_categories(...))
+_BIOME_CATEGORY_OR_NONE_TABLE = numpy.where(BIOME_VALID_TABLE, BIOME_CATEGORY_TABLE, CATEGORY_NONE).astype(numpy.uint8)
+for _table in (BIOME_CATEGORY_TABLE, _BIOME_CATEGORY_OR_NONE_TABLE, BIOME_VALID_TABLE, BIOME_TERRESTRIAL_TABLE, BIOME_AQUATIC_TABLE, BIOME_NAME_TABLE, BIOME_PALETTE):
+	_table.flags.writeable = False
+del _b, _table
+
+def _gather(table: numpy.ndarray, biome_map: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	## codes above 127 are clipped to 127, which is not a biome code (so they get the table's entry for non-biomes)
+	return numpy.take(table, biome_map, axis=0, out=out, mode='clip')
+
+def biome_categories(biome_map: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	Looks up the category (CATEGORY_TERRESTRIAL, CATEGORY_AQUATIC, etc) of every biome code in a biome map. Codes
+	that are not biomes (UNKNOWN, unused codes, and codes above 127) get CATEGORY_NONE.
+	:param biome_map: integer array of biome codes
+	:param out: optional uint8 array to write the categories to
+	:return: Returns a uint8 array of categories
+	"""
+	return _gather(_BIOME_CATEGORY_OR_NONE_TABLE, biome_map, out=out)
+
+def category_mask(biome_map: numpy.ndarray, category: int) -> numpy.ndarray:
+	"""
+	:param biome_map: integer array of biome codes
+	:param category: biome category (eg CATEGORY_AQUATIC)
+	:return: Returns a boolean array that is True where the biome map has a (valid) biome of the given category
+	"""
+	table = BIOME_VALID_TABLE & (BIOME_CATEGORY_TABLE == category)
+	return _gather(table, biome_map)
+
+def valid_mask(biome_map: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	:param biome_map: integer array of biome codes
+	:param out: optional bool array to write the mask to
+	:return: Returns a boolean array that is True where the biome map has a biome (not UNKNOWN or an invalid code)
+	"""
+	return _gather(BIOME_VALID_TABLE, biome_map, out=out)
+
+def terrestrial_mask(biome_map: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	:param biome_map: integer array of biome codes
+	:param out: optional bool array to write the mask to
+	:return: Returns a boolean array that is True where the biome map has a biome with a land surface
+	"""
+	return _gather(BIOME_TERRESTRIAL_TABLE, biome_map, out=out)
+
+def aquatic_mask(biome_map: numpy.ndarray, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	:param biome_map: integer array of biome codes
+	:param out: optional bool array to write the mask to
+	:return: Returns a boolean array that is True where the biome map has a biome with a liquid (or frozen) surface
+	"""
+	return _gather(BIOME_AQUATIC_TABLE, biome_map, out=out)
+
+def colorize_biome_map(biome_map: numpy.ndarray, palette: numpy.ndarray = BIOME_PALETTE, out: numpy.ndarray = None) -> numpy.ndarray:
+	"""
+	Converts a biome map to an RGB image
+	:param biome_map: integer array of biome codes (eg the output of biomecalculator.classify_planet_biomes(...))
+	:param palette: (128 x channels) color table, default is BIOME_PALETTE
+	:param out: optional uint8 array with shape biome_map.shape + (channels,) to write the image to
+	:return: Returns the image, with shape biome_map.shape + (channels,)
+	"""
+	return _gather(palette, biome_map, out=out)
@@ -43,10 +43,12 @@ Biome Code Reference:
      116   OOZE
 """
 
-import cython
-from libc.math cimport sin, cos, exp, log10, log, pow, sqrt
+import cython, os
+from concurrent.futures import ThreadPoolExecutor
+from libc.math cimport sin, cos, exp, log10, log, pow, sqrt, ldexp, INFINITY, NAN
 import numpy
 from ..biomes import Biome
+from ..model import DEFAULT_MODEL
 
 # bits: 0yyyxxxx
 # yyy = biome category (0=terrestrial, 1=aquatic, 2=artificial, 4=astronomical, 7=fictional)
@@ -92,64 +94,33 @@ cdef unsigned char ELEMENTAL_CHAOS = Biome.ELEMENTAL_CHAOS.value
 cdef unsigned char OOZE = Biome.OOZE.value
 
 
-cdef unsigned char[9] ref_classes = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-## order of features: ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
-cdef float[9][5][4] ref_points = [
-## wetlands
-       [[0.97589505, 0.6692817 , 0.09676683, 0.42183435],
-        [0.2872733 , 0.5562218 , 0.21704593, 0.3098737 ],
-        [0.95833284, 0.6877248 , 0.12377492, 0.2995282 ],
-        [0.6171483 , 0.47020113, 0.4836682 , 0.22195342],
-        [0.81850535, 0.60123855, 0.25867933, 0.31303504]],
-## jungle
-       [[0.7665621 , 0.5300055 , 0.2408872 , 0.3123359 ],
-        [0.99121696, 0.6713649 , 0.07588506, 0.40304184],
-        [0.98553646, 0.67212886, 0.08356771, 0.3337861 ],
-        [0.9209426 , 0.59560406, 0.15855226, 0.3750781 ],
-        [0.99228674, 0.67052644, 0.07420062, 0.49766815]],
-## seasonal forest
-       [[0.82307386, 0.54830164, 0.28397045, 0.32422626],
-        [0.95406234, 0.68983954, 0.16054682, 0.29840717],
-        [0.5337313 , 0.44197488, 0.4220576 , 0.24119267],
-        [0.70596063, 0.5029748 , 0.37620285, 0.26919958],
-        [0.65009725, 0.41467762, 0.53735024, 0.24624129]],
-## needleleaf forest
-       [[0.8442506 , 0.513412  , 0.23853904, 0.31593102],
-        [0.4755671 , 0.42182055, 0.32860836, 0.25947723],
-        [0.69879943, 0.5263777 , 0.3583926 , 0.24800086],
-        [0.6385724 , 0.44265494, 0.30205786, 0.41645652],
-        [0.59855306, 0.41948298, 0.4608879 , 0.21030518]],
-## grassland
-       [[0.9590115 , 0.69129807, 0.14321554, 0.33431706],
-        [0.64463437, 0.51307285, 0.6764352 , 0.17131203],
-        [0.75970644, 0.53838587, 0.34264302, 0.25237092],
-        [0.9574419 , 0.76865923, 0.21147878, 0.2162868 ],
-        [0.7787093 , 0.64991206, 0.49281284, 0.1717132 ]],
-## desert
-       [[0.8768907 , 0.68539584, 0.30395174, 0.18175352],
-        [0.85951805, 0.75583154, 0.43008733, 0.13515931],
-        [0.9133944 , 0.80276865, 0.33543584, 0.15386288],
-        [0.95464563, 0.8058968 , 0.2042541 , 0.1794926 ],
-        [0.7509371 , 0.62957406, 0.44375542, 0.1542665 ]],
-## tundra
-       [[0.4441414 , 0.30920148, 0.4959661 , 0.24957538],
-        [0.4513571 , 0.23461857, 0.732274  , 0.2127717 ],
-        [0.6739347 , 0.34742635, 0.41046205, 0.26215446],
-        [0.577827  , 0.32734275, 0.62989986, 0.22067626],
-        [0.37011942, 0.15006503, 0.65958476, 0.18708763]],
-## barren
-       [[0.29481938, 0.09472984, 0.59135556, 0.06860657],
-        [0.86539465, 0.7506361 , 0.37203112, 0.11493613],
-        [0.664666  , 0.6056427 , 0.46542227, 0.14238815],
-        [0.6938545 , 0.43799615, 0.30913985, 0.2867542 ],
-        [0.8466273 , 0.53237015, 0.44636855, 0.16200702]],
-## sandsea
-       [[0.82119286, 0.48783484, 0.44511366, 0.10902377],
-        [0.9354581 , 0.8444746 , 0.28542006, 0.076657  ],
-        [0.75143087, 0.70467633, 0.602095  , 0.09906711],
-        [0.8729486 , 0.81519806, 0.4026484 , 0.0783796 ],
-        [0.24349129, 0.7866096 , 0.45044297, 0.11177942]]
-]
+## terrestrial classifier model (reference points, normalization bounds, and thresholds), see set_model(...)
+cdef const unsigned char[::1] ref_classes
+cdef const float[:, :, ::1] ref_points
+cdef double[4] feature_mins
+cdef double[4] feature_maxs
+cdef double min_rain_limit_mm
+cdef double max_rain_limit_mm # too much rain and we'll call it a wetland instead of a jungle
+cdef double jungle_max_temp_var_C
+
+cpdef set_model(model):
+    """
+Replaces the reference points, normalization bounds, and thresholds used to classify terrestrial biomes
+
+Parameters:
+    model (BiomeModel) - the model to use
+    """
+    global ref_classes, ref_points, min_rain_limit_mm, max_rain_limit_mm, jungle_max_temp_var_C
+    cdef Py_ssize_t f
+    ## (const memoryviews, so that read-only memory-mapped model arrays can be used without copying)
+    ref_classes = numpy.ascontiguousarray(model.classes, dtype=numpy.uint8)
+    ref_points = numpy.ascontiguousarray(model.ref_points, dtype=numpy.float32)
+    for f in range(4):
+        feature_mins[f] = model.feature_mins[f]
+        feature_maxs[f] = model.feature_maxs[f]
+    (min_rain_limit_mm, max_rain_limit_mm, jungle_max_temp_var_C) = model.thresholds
+
+set_model(DEFAULT_MODEL)
 
 cpdef unsigned char _cython_classify_biome(
     double mean_solar_flux_Wpm2,
@@ -158,10 +129,8 @@ cpdef unsigned char _cython_classify_biome(
     double mean_temp_C,
     double temp_var_C,
     double annual_precip_mm
-):
+) noexcept nogil:
     ## constants and variables
-    cdef min_rain_limit_mm = 110
-    cdef max_rain_limit_mm = 6000 # too much rain and we'll call it a wetland instead of a jungle
     cdef double photic_zone_min_solar_flux_Wpm2 = 35
     cdef double wave_disruption_depth_m = -6 # corals, seagrasses, kelps, etc cannot grow above this depth
     cdef double epsilon_water = 0.013333  # Absorption per meter (150m == 1% transmission (0.01 = 10^(-epsilon*150))
@@ -175,25 +144,26 @@ cpdef unsigned char _cython_classify_biome(
     cdef double closest_dist = 1e35 #
     cdef double d = 0
     cdef unsigned char biome_code = UNKNOWN
+    cdef Py_ssize_t bclass, refpt
     if altitude_m > 0:
         if annual_precip_mm > max_rain_limit_mm:
             biome_code = WETLAND
         else:
             ### rescale to normalize so that distance calcs aren't biased
-            norm_sol_flux = rescale(mean_solar_flux_Wpm2, 0.0, 800.)
-            norm_mtemp = rescale(mean_temp_C, -20., 50.)
-            norm_vtemp = rescale(temp_var_C, 0., 35.)
-            norm_precip = rescale(sqrt(annual_precip_mm), 0.0, 75.)
-            for bclass in range(9):
-                for refpt in range(5):
+            norm_sol_flux = rescale(mean_solar_flux_Wpm2, feature_mins[0], feature_maxs[0])
+            norm_mtemp = rescale(mean_temp_C, feature_mins[1], feature_maxs[1])
+            norm_vtemp = rescale(temp_var_C, feature_mins[2], feature_maxs[2])
+            norm_precip = rescale(sqrt(annual_precip_mm), feature_mins[3], feature_maxs[3])
+            for bclass in range(ref_points.shape[0]):
+                for refpt in range(ref_points.shape[1]):
                     d = dist4fd(
-                        ref_points[bclass][refpt][0], ref_points[bclass][refpt][1], ref_points[bclass][refpt][2], ref_points[bclass][refpt][3],
+                        ref_points[bclass, refpt, 0], ref_points[bclass, refpt, 1], ref_points[bclass, refpt, 2], ref_points[bclass, refpt, 3],
                         norm_sol_flux, norm_mtemp, norm_vtemp, norm_precip
                     )
                     if d < closest_dist:
                         closest_dist = d
                         biome_code = ref_classes[bclass]
-        if biome_code == JUNGLE and temp_var_C > 6.0:
+        if biome_code == JUNGLE and temp_var_C > jungle_max_temp_var_C:
             # too much variation for jungle, actually grassland
             biome_code = GRASSLAND
     ## marine biomes
@@ -261,61 +231,113 @@ Returns:
         annual_precip_mm
     )
 
-cpdef unsigned char _cython_classify_biome_on_planet(
+## planet-level constants for classifying locations on a planet, see _init_planet(...)
+cdef struct _Planet:
+    double mass_kg
+    double mean_radius_m
+    double G_mass # gravitational constant x mass
+    double toa_solar_flux_Wpm2
+    double axis_tilt_deg
+    bint tidal_lock
+    double mean_surface_pressure_kPa
+    unsigned char astronomical_biome # result of _astronomical_biome(...) for every location, or ASTRONOMICAL_PER_CELL
+
+cdef enum:
+    ASTRONOMICAL_PER_CELL = 255 # the astronomical biome check depends on the altitude
+
+cdef void _init_planet(
+    _Planet* planet,
     double planet_mass_kg,
     double planet_mean_radius_km,
     double toa_solar_flux_Wpm2,
     double axis_tilt_deg,
     bint tidal_lock,
     double mean_surface_pressure_kPa,
+    double min_altitude_m,
+    double max_altitude_m,
+    bint exoplanet
+) noexcept nogil:
+    ## (the min and max altitude of all locations that will be classified, so that the astronomical biome check can be
+    ## done once for the whole planet instead of once per location when the result is the same for all of them)
+    cdef double G = 6.67430e-11 # N m2 / kg2
+    cdef unsigned char lowest, highest
+    planet.mass_kg = planet_mass_kg
+    planet.mean_radius_m = planet_mean_radius_km * 1000
+    planet.G_mass = G * planet_mass_kg
+    planet.toa_solar_flux_Wpm2 = toa_solar_flux_Wpm2
+    planet.axis_tilt_deg = axis_tilt_deg
+    planet.tidal_lock = tidal_lock
+    planet.mean_surface_pressure_kPa = mean_surface_pressure_kPa
+    planet.astronomical_biome = UNKNOWN
+    if exoplanet:
+        ## (density decreases with radius, so if the lowest and highest locations agree, then so do all the others)
+        lowest = _astronomical_biome(planet_mass_kg, planet.mean_radius_m + min_altitude_m)
+        highest = _astronomical_biome(planet_mass_kg, planet.mean_radius_m + max_altitude_m)
+        if lowest == highest and not isnan(min_altitude_m + max_altitude_m):
+            planet.astronomical_biome = lowest
+        else:
+            planet.astronomical_biome = ASTRONOMICAL_PER_CELL
+
+cdef unsigned char _astronomical_biome(double planet_mass_kg, double radius_m) noexcept nogil:
+    ## returns the astronomical biome for the given mass and radius, or UNKNOWN if the planet is not a star (etc)
+    cdef double pi = 3.14159265358979
+    cdef double min_neutron_star_density_Tpm3 = 1e14# tons per cubic meter (aka g/cc)
+    cdef double max_neutron_star_density_Tpm3 = 2e16 # tons per cubic meter (aka g/cc)
+    cdef double planet_volume_m3 = 4.0/3.0*pi*radius_m*radius_m*radius_m
+    cdef double planet_density_Tpm3 = planet_mass_kg / 1000. / planet_volume_m3
+    cdef double red_dwarf_min_mass_kg = 1.2819e29
+    if planet_density_Tpm3 > max_neutron_star_density_Tpm3:
+        ## BLACK HOLE!
+        return EVENT_HORIZON
+    if planet_density_Tpm3 >= min_neutron_star_density_Tpm3:
+        ## neutron star!
+        return NEUTRON_STAR
+    if planet_mass_kg >= red_dwarf_min_mass_kg:
+        ## big enough to spontaneously start thermonuclear fusion and become a star
+        return STAR
+    return UNKNOWN
+
+cdef unsigned char _classify_location_on_planet(
+    const _Planet* planet,
     double altitude_m,
     double mean_temp_C,
     double temp_var_C,
     double annual_precip_mm,
     double latitude,
     double longitude,
-    bint exoplanet,
-):
+    bint exoplanet
+) noexcept nogil:
     cdef double pi = 3.14159265358979
     cdef double two_over_pi = 0.5 * pi
     cdef double deg2Rad = pi / 180
     #
-    cdef double G = 6.67430e-11 # N m2 / kg2
-    cdef radius_m = (planet_mean_radius_km * 1000) + altitude_m
-    cdef double gravity_m_per_s2 = G * planet_mass_kg / (radius_m * radius_m)
-    cdef above_sealevel_m = altitude_m
+    cdef double radius_m = planet.mean_radius_m + altitude_m
+    cdef double gravity_m_per_s2 = planet.G_mass / (radius_m * radius_m)
+    cdef double above_sealevel_m = altitude_m
     if above_sealevel_m < 0:
         above_sealevel_m = 0
-    cdef double pressure_kPa = pressure_at_altitude(gravity_m_per_s2, mean_surface_pressure_kPa, mean_temp_C, above_sealevel_m)
+    cdef double pressure_kPa = pressure_at_altitude(gravity_m_per_s2, planet.mean_surface_pressure_kPa, mean_temp_C, above_sealevel_m)
     cdef double epsilon_air = 3.46391e-5 # Absorption per kPa (1360 = 1371 * 10^(-eps * 101) )
-    cdef max_flux = toa_solar_flux_Wpm2 * pow(10, -epsilon_air * pressure_kPa)
+    cdef double max_flux = planet.toa_solar_flux_Wpm2 * pow(10, -epsilon_air * pressure_kPa)
     cdef double mean_solar_flux_Wpm2 = 0
-    if tidal_lock:
+    if planet.tidal_lock:
         mean_solar_flux_Wpm2 = max_flux * two_over_pi * cos(latitude) * clip(cos(longitude), 0, 1)
     else:
         mean_solar_flux_Wpm2 = max_flux * two_over_pi * 0.5 * (
-                clip(cos(deg2Rad * (latitude - axis_tilt_deg)), 0, 1)
-                + clip(cos(deg2Rad * (latitude + axis_tilt_deg)), 0, 1)
+                clip(cos(deg2Rad * (latitude - planet.axis_tilt_deg)), 0, 1)
+                + clip(cos(deg2Rad * (latitude + planet.axis_tilt_deg)), 0, 1)
         )
     ## if doing expoplanet calcualtion, first check astronomical biomes
-    cdef double min_neutron_star_density_Tpm3 = 1e14# tons per cubic meter (aka g/cc)
-    cdef double max_neutron_star_density_Tpm3 = 2e16 # tons per cubic meter (aka g/cc)
-    cdef double planet_volume_m3 = 4.0/3.0*pi*radius_m*radius_m*radius_m
-    cdef double planet_density_Tpm3 = planet_mass_kg / 1000. / planet_volume_m3
-    cdef double red_dwarf_min_mass_kg = 1.2819e29
+    cdef unsigned char astronomical_biome
     if exoplanet: ## try to detect extreme conditions of a non-goldilocks-zone planet
-        if planet_density_Tpm3 > max_neutron_star_density_Tpm3:
-            ## BLACK HOLE!
-            return EVENT_HORIZON
-        if planet_density_Tpm3 >= min_neutron_star_density_Tpm3:
-            ## neutron star!
-            return NEUTRON_STAR
-        if planet_mass_kg >= red_dwarf_min_mass_kg:
-            ## big enough to spontaneously start thermonuclear fusion and become a star
-            return STAR
+        astronomical_biome = planet.astronomical_biome
+        if astronomical_biome == ASTRONOMICAL_PER_CELL or isnan(altitude_m):
+            astronomical_biome = _astronomical_biome(planet.mass_kg, radius_m)
+        if astronomical_biome != UNKNOWN:
+            return astronomical_biome
     return _cython_classify_biome_on_planet_surface(
         gravity_m_per_s2,
-        mean_surface_pressure_kPa,
+        planet.mean_surface_pressure_kPa,
         mean_solar_flux_Wpm2,
         altitude_m,
         mean_temp_C,
@@ -324,6 +346,30 @@ cpdef unsigned char _cython_classify_biome_on_planet(
         exoplanet
     )
 
+cpdef unsigned char _cython_classify_biome_on_planet(
+    double planet_mass_kg,
+    double planet_mean_radius_km,
+    double toa_solar_flux_Wpm2,
+    double axis_tilt_deg,
+    bint tidal_lock,
+    double mean_surface_pressure_kPa,
+    double altitude_m,
+    double mean_temp_C,
+    double temp_var_C,
+    double annual_precip_mm,
+    double latitude,
+    double longitude,
+    bint exoplanet,
+):
+    cdef _Planet planet
+    _init_planet(
+        &planet, planet_mass_kg, planet_mean_radius_km, toa_solar_flux_Wpm2, axis_tilt_deg, tidal_lock,
+        mean_surface_pressure_kPa, altitude_m, altitude_m, exoplanet
+    )
+    return _classify_location_on_planet(
+        &planet, altitude_m, mean_temp_C, temp_var_C, annual_precip_mm, latitude, longitude, exoplanet
+    )
+
 cpdef unsigned char classify_biome_on_planet(
     double planet_mass_kg,
     double planet_mean_radius_km,
@@ -382,7 +428,7 @@ Returns:
         exoplanet,
     )
 
-cpdef _cython_classify_biome_on_planet_surface(
+cpdef unsigned char _cython_classify_biome_on_planet_surface(
     double gravity_m_per_s2,
     double mean_surface_pressure_kPa,
     double mean_solar_flux_Wpm2,
@@ -391,7 +437,7 @@ cpdef _cython_classify_biome_on_planet_surface(
     double temp_var_C,
     double annual_precip_mm,
     bint exoplanet
-):
+) noexcept nogil:
     if isnan(gravity_m_per_s2 + mean_surface_pressure_kPa + mean_solar_flux_Wpm2 + altitude_m + mean_temp_C + temp_var_C + annual_precip_mm):
         return UNKNOWN
     cdef double water_supercritical_pressure = 22000 # kPa
@@ -407,7 +453,7 @@ cpdef _cython_classify_biome_on_planet_surface(
     cdef double goldilocks_max_atmosphere = 3350 # kPa, no super-critical gasses allowed for earth-like geography
     # cdef double cryo_triple_pressure = 12.5 # kPa
     cdef double vapor_pressure_kPa = 0.61094 * exp((17.625 * (mean_temp_C + temp_var_C)) / ((mean_temp_C + temp_var_C) + 243.04)) # Magnus formula
-    cdef above_sealevel_m = altitude_m
+    cdef double above_sealevel_m = altitude_m
     if above_sealevel_m < 0:
         above_sealevel_m = 0
     cdef double pressure_kPa = pressure_at_altitude(gravity_m_per_s2, mean_surface_pressure_kPa, mean_temp_C, above_sealevel_m)
@@ -490,7 +536,7 @@ Returns:
     )
 
 
-cdef double boiling_point(double pressure_kPa):
+cdef double boiling_point(double pressure_kPa) noexcept nogil:
     cdef double ln_mbar = log(pressure_kPa*10)
     cdef double x = ln_mbar
     cdef double x2 = x*ln_mbar
@@ -502,24 +548,24 @@ cdef double boiling_point(double pressure_kPa):
     else:
         return hp
 
-cpdef double pressure_at_altitude(double gravity_m_per_s2, double mean_surface_pressure_kPa, double mean_temp_C, double above_sealevel_m):
+cpdef double pressure_at_altitude(double gravity_m_per_s2, double mean_surface_pressure_kPa, double mean_temp_C, double above_sealevel_m) noexcept nogil:
     cdef double K = mean_temp_C + 273.15
     cdef double R = 8.314510  # j/K/mole
     cdef double air_molar_mass = 0.02897  # kg/mol
     cdef double pressure_kPa = mean_surface_pressure_kPa * exp(-(air_molar_mass * gravity_m_per_s2 * above_sealevel_m)/(R*K))
     return pressure_kPa
 
-cpdef double clip(double x, double xmin, double xmax):
+cpdef double clip(double x, double xmin, double xmax) noexcept nogil:
     if x < xmin:
         return xmin
     if x > xmax:
         return xmax
     return x
 
-cpdef double rescale(double x, double xmin, double xmax):
+cpdef double rescale(double x, double xmin, double xmax) noexcept nogil:
     return (x - xmin) / (xmax - xmin)
 
-cdef double dist4fd(float a1, float b1, float c1, float d1, double a2, double b2, double c2, double d2):
+cdef double dist4fd(float a1, float b1, float c1, float d1, double a2, double b2, double c2, double d2) noexcept nogil:
     cdef double da = a2-a1
     cdef double db = b2-b1
     cdef double dc = c2-c1
@@ -527,60 +573,524 @@ cdef double dist4fd(float a1, float b1, float c1, float d1, double a2, double b2
     return sqrt(da*da + db*db + dc*dc + dd*dd)
 
 
+## raster element types that the batch classifier can read without conversion
+cdef enum:
+    RASTER_FLOAT32
+    RASTER_FLOAT64
+    RASTER_FLOAT16
+    RASTER_INT16
+    RASTER_UINT16
+    RASTER_INT8
+    RASTER_UINT8
+    RASTER_INT32
+
+_RASTER_KINDS = {
+    numpy.dtype(numpy.float32): RASTER_FLOAT32,
+    numpy.dtype(numpy.float64): RASTER_FLOAT64,
+    numpy.dtype(numpy.float16): RASTER_FLOAT16,
+    numpy.dtype(numpy.int16): RASTER_INT16,
+    numpy.dtype(numpy.uint16): RASTER_UINT16,
+    numpy.dtype(numpy.int8): RASTER_INT8,
+    numpy.dtype(numpy.uint8): RASTER_UINT8,
+    numpy.dtype(numpy.int32): RASTER_INT32,
+}
+
+cdef struct _Raster:
+    ## 2D view of an input array, read as (value * scale) + offset (broadcast arrays have a stride of 0)
+    const char* data
+    Py_ssize_t row_stride
+    Py_ssize_t col_stride
+    int kind
+    double scale
+    double offset
+
+cdef double _half_to_double(unsigned short h) noexcept nogil:
+    cdef int exponent = (h >> 10) & 0x1f
+    cdef double mantissa = h & 0x3ff
+    cdef double x
+    if exponent == 0:
+        x = ldexp(mantissa, -24) # subnormal
+    elif exponent == 0x1f:
+        x = INFINITY if mantissa == 0 else NAN
+    else:
+        x = ldexp(mantissa + 1024, exponent - 25)
+    return -x if (h & 0x8000) else x
+
+cdef inline double _raster_value(const _Raster* r, Py_ssize_t row, Py_ssize_t col) noexcept nogil:
+    cdef const char* p = r.data + row * r.row_stride + col * r.col_stride
+    cdef double x
+    if r.kind == RASTER_FLOAT32:
+        x = (<const float*>p)[0]
+    elif r.kind == RASTER_FLOAT64:
+        x = (<const double*>p)[0]
+    elif r.kind == RASTER_FLOAT16:
+        x = _half_to_double((<const unsigned short*>p)[0])
+    elif r.kind == RASTER_INT16:
+        x = (<const short*>p)[0]
+    elif r.kind == RASTER_UINT16:
+        x = (<const unsigned short*>p)[0]
+    elif r.kind == RASTER_INT8:
+        x = (<const signed char*>p)[0]
+    elif r.kind == RASTER_UINT8:
+        x = (<const unsigned char*>p)[0]
+    else:
+        x = (<const int*>p)[0]
+    return x * r.scale + r.offset
+
+cdef _as_raster(array, double scale, double offset, _Raster* r):
+    ## fills in r to read the given 2D array in place (the array must be kept alive while r is in use)
+    if array.ndim != 2:
+        raise ValueError('expected a two-dimensional array, not shape %s' % (array.shape,))
+    r.data = <const char*><size_t>array.ctypes.data
+    r.row_stride = array.strides[0]
+    r.col_stride = array.strides[1]
+    r.kind = _RASTER_KINDS[array.dtype]
+    r.scale = scale
+    r.offset = offset
+
+cdef _as_raster_input(x):
+    ## numpy array of a supported type (converting only if necessary, before any broadcasting)
+    x = numpy.asarray(x)
+    if x.dtype not in _RASTER_KINDS or not x.dtype.isnative:
+        x = x.astype(numpy.float64)
+    return x
+
+RASTER_INPUTS = [
+    'gravity_m_per_s2', 'mean_surface_pressure_kPa', 'mean_solar_flux_Wpm2', 'altitude_m', 'mean_temp_C', 'temp_var_C',
+    'annual_precip_mm'
+]
+
 cpdef classify_planet_biomes(
-    double gravity_m_per_s2,
-    double mean_surface_pressure_kPa,
-    float[:] mean_solar_flux_Wpm2,
-    float[:] altitude_m,
-    float[:] mean_temp_C,
-    float[:] temp_var_C,
-    float[:] annual_precip_mm,
+    gravity_m_per_s2,
+    mean_surface_pressure_kPa,
+    mean_solar_flux_Wpm2,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
     bint exoplanet,
+    input_scaling = None
 ):
     """
 This function estimates the biome codes for an array of planet and climate parameters, with the option to include
 extreme exoplanet biomes that do not exist on Earth
 
+The input arrays are read in place if they are float32, float64, float16, int16, uint16, int8, uint8, or int32 arrays
+(other types are converted to float64 first), optionally with a scale and offset applied to each value (eg to read
+temperatures stored as an integer number of tenths of a degree C). The inputs only need to be broadcastable to the
+same shape (by the usual numpy rules), so constant inputs can be given as scalars, and inputs that only vary with
+latitude as a column vector, without making full-size copies of them.
+
 Parameters:
-    gravity_m_per_s2 (float) - gravity at the surface of the planet, in meters per second per second
-    mean_surface_pressure_kPa (float) - atmospheric pressure at sea-level, in kPa
-    mean_solar_flux_Wpm2 (numpy.ndarray with one dimension) - annual mean solar flux, in watts per square meter
-    altitude_m (numpy.ndarray with one dimension) - altitude above (or below, if negative) sea-level, in meters
-    mean_temp_C (numpy.ndarray with one dimension) - annual mean temperature, in degrees C
-    temp_var_C (numpy.ndarray with one dimension) - the +/- range of the temperature throughout the year (1.5 standard
-                                                    deviations), in degrees C
-    annual_precip_mm (numpy.ndarray with one dimension) - the annual mean precipitation, in mm rainfall (10 mm snowfall
-                                                          = 1 mm rainfall)
+    gravity_m_per_s2 (numpy.ndarray or float) - gravity at the surface of the planet, in meters per second per second
+    mean_surface_pressure_kPa (numpy.ndarray or float) - atmospheric pressure at sea-level, in kPa
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
     exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
                        biomes
+    input_scaling (dict) - optional (scale, offset) for any of the above array inputs (by parameter name), such that
+                           the value used is (array value * scale) + offset
 
 Returns:
-    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes
+    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes, with the broadcast
+    shape of the inputs
 
     """
     # for use with Numpy arrays
-    assert tuple(mean_solar_flux_Wpm2.shape) == tuple(altitude_m.shape)
-    assert tuple(mean_temp_C.shape) == tuple(altitude_m.shape)
-    assert tuple(temp_var_C.shape) == tuple(altitude_m.shape)
-    assert tuple(annual_precip_mm.shape) == tuple(altitude_m.shape)
-    #
-    array_size = altitude_m.shape[0]
-    result = numpy.zeros((array_size, ), dtype=numpy.uint8)
-    #
-    cdef unsigned char[:] result_view = result
-    cdef Py_ssize_t i # define index as native type
-    for i in range(array_size):
-        result_view[i] = _cython_classify_biome_on_planet_surface(
-            gravity_m_per_s2,
-            mean_surface_pressure_kPa,
-            mean_solar_flux_Wpm2[i],
-            altitude_m[i],
-            mean_temp_C[i],
-            temp_var_C[i],
-            annual_precip_mm[i],
+    return _classify_rasters(
+        KERNEL_PLANET_SURFACE, RASTER_INPUTS,
+        [gravity_m_per_s2, mean_surface_pressure_kPa, mean_solar_flux_Wpm2, altitude_m, mean_temp_C, temp_var_C,
+         annual_precip_mm],
+        input_scaling, exoplanet
+    )
+
+PRESSURE_RASTER_INPUTS = [
+    'mean_solar_flux_Wpm2', 'pressure_kPa', 'altitude_m', 'mean_temp_C', 'temp_var_C', 'annual_precip_mm'
+]
+
+cpdef classify_biomes_with_pressure(
+    mean_solar_flux_Wpm2,
+    pressure_kPa,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    input_scaling = None
+):
+    """
+This function estimates the biome codes for arrays of climate parameters where the local atmospheric pressure is
+already known (eg from an atmosphere model), only considering earthly biomes. This is the array version of
+classify_biome(...), and accepts the same kinds of arrays (and scalars) as classify_planet_biomes(...)
+
+Parameters:
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    pressure_kPa (numpy.ndarray or float) - atmospheric pressure at the surface (use sea-level pressure for underwater
+                                            classification), in kPa
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
+    input_scaling (dict) - optional (scale, offset) for any of the above array inputs (by parameter name), such that
+                           the value used is (array value * scale) + offset
+
+Returns:
+    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes, with the broadcast
+    shape of the inputs
+
+    """
+    return _classify_rasters(
+        KERNEL_WITH_PRESSURE, PRESSURE_RASTER_INPUTS,
+        [mean_solar_flux_Wpm2, pressure_kPa, altitude_m, mean_temp_C, temp_var_C, annual_precip_mm],
+        input_scaling, False
+    )
+
+## per-cell classification function used by _classify_plane(...)
+cdef enum:
+    KERNEL_PLANET_SURFACE # _cython_classify_biome_on_planet_surface(...), inputs in the order of RASTER_INPUTS
+    KERNEL_WITH_PRESSURE # _cython_classify_biome(...), inputs in the order of PRESSURE_RASTER_INPUTS
+
+cdef _broadcast_rasters(list names, list inputs, input_scaling):
+    ## returns the broadcast shape, the (scale, offset) of each input, and broadcast views of the inputs
+    scaling = dict(input_scaling or {})
+    for name in scaling:
+        if name not in names:
+            raise ValueError('Unknown input for scaling: %s (expected one of %s)' % (name, names))
+    scales = [scaling.get(name, (1.0, 0.0)) for name in names]
+    arrays = [_as_raster_input(x) for x in inputs]
+    shape = numpy.broadcast_shapes(*[x.shape for x in arrays])
+    ## (stride 0 along broadcast axes, so nothing is copied)
+    views = [numpy.broadcast_to(x, shape) for x in arrays]
+    return (shape, scales, views)
+
+cdef _planes(shape):
+    ## indices of the 2D (rows x columns) planes of an array of the given shape, and the shape of each plane
+    plane_shape = (shape[-2] if len(shape) > 1 else 1, shape[-1] if len(shape) > 0 else 1)
+    return ([index + (Ellipsis,) for index in numpy.ndindex(*shape[:-2])], plane_shape)
+
+cdef _classify_rasters(int kernel, list names, list inputs, input_scaling, bint exoplanet):
+    (shape, scales, views) = _broadcast_rasters(names, inputs, input_scaling)
+    (indices, plane_shape) = _planes(shape)
+    result = numpy.zeros(shape, dtype=numpy.uint8)
+    for index in indices:
+        _classify_plane(
+            kernel, [v[index].reshape(plane_shape) for v in views], scales, result[index].reshape(plane_shape),
             exoplanet
         )
     return result
 
+cdef _classify_plane(
+    int kernel,
+    list planes,
+    list scales,
+    unsigned char[:, ::1] result_view,
+    bint exoplanet
+):
+    cdef _Raster[7] rasters
+    cdef Py_ssize_t n
+    for n in range(len(planes)):
+        _as_raster(planes[n], scales[n][0], scales[n][1], &rasters[n])
+    cdef Py_ssize_t row, col # define indices as native type
+    if kernel == KERNEL_WITH_PRESSURE:
+        for row in range(result_view.shape[0]):
+            for col in range(result_view.shape[1]):
+                result_view[row, col] = _cython_classify_biome(
+                    _raster_value(&rasters[0], row, col),
+                    _raster_value(&rasters[1], row, col),
+                    _raster_value(&rasters[2], row, col),
+                    _raster_value(&rasters[3], row, col),
+                    _raster_value(&rasters[4], row, col),
+                    _raster_value(&rasters[5], row, col)
+                )
+        return
+    for row in range(result_view.shape[0]):
+        for col in range(result_view.shape[1]):
+            result_view[row, col] = _cython_classify_biome_on_planet_surface(
+                _raster_value(&rasters[0], row, col),
+                _raster_value(&rasters[1], row, col),
+                _raster_value(&rasters[2], row, col),
+                _raster_value(&rasters[3], row, col),
+                _raster_value(&rasters[4], row, col),
+                _raster_value(&rasters[5], row, col),
+                _raster_value(&rasters[6], row, col),
+                exoplanet
+            )
+
+cpdef summarize_planet_biomes(
+    gravity_m_per_s2,
+    mean_surface_pressure_kPa,
+    mean_solar_flux_Wpm2,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    bint exoplanet,
+    weights = None,
+    labels = None,
+    Py_ssize_t num_labels = 0,
+    input_scaling = None,
+    threads = None
+):
+    """
+This function counts the predicted biome codes for arrays of planet and climate parameters (the same inputs as
+classify_planet_biomes(...)) without making a map of the biomes, optionally weighting each location (eg by its area)
+and/or grouping the locations by a region label (eg latitude band or continent). The work is split between multiple
+threads.
+
+Parameters:
+    (gravity_m_per_s2 ... exoplanet) - see classify_planet_biomes(...)
+    weights (numpy.ndarray or float) - optional weight of each location, broadcastable to the shape of the inputs (eg
+                                       the cosine of the latitude as a column vector)
+    labels (numpy.ndarray or int) - optional region label of each location (0 to num_labels-1), broadcastable to the
+                                    shape of the inputs; locations with labels outside this range are not counted
+    num_labels (int) - number of region labels (default: 1 + the largest label)
+    input_scaling (dict) - optional (scale, offset) for any of the classify_planet_biomes(...) array inputs (by
+                           parameter name), such that the value used is (array value * scale) + offset
+    threads (int) - number of threads to use (default: number of CPUs)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or count) of each biome code as an array of shape
+    (128,), or (num_labels, 128) if labels are given
+
+    """
+    return _summarize_rasters(
+        KERNEL_PLANET_SURFACE, RASTER_INPUTS,
+        [gravity_m_per_s2, mean_surface_pressure_kPa, mean_solar_flux_Wpm2, altitude_m, mean_temp_C, temp_var_C,
+         annual_precip_mm],
+        input_scaling, exoplanet, weights, labels, num_labels, threads
+    )
+
+## target number of cells in each block of work for the summary threads
+SUMMARY_BLOCK_SIZE = 65536
+
+cdef _summarize_rasters(
+    int kernel, list names, list inputs, input_scaling, bint exoplanet, weights, labels, Py_ssize_t num_labels,
+    threads
+):
+    if labels is not None and num_labels <= 0:
+        num_labels = int(numpy.max(labels)) + 1 if numpy.size(labels) > 0 else 1
+    ## the weights and labels are read like the other inputs, but never scaled
+    (shape, scales, views) = _broadcast_rasters(
+        names + ['', ''], inputs + [1.0 if weights is None else weights, 0 if labels is None else labels], input_scaling
+    )
+    (indices, plane_shape) = _planes(shape)
+    ## split the planes into blocks of rows and columns
+    (rows, cols) = plane_shape
+    block_cols = max(1, min(cols, SUMMARY_BLOCK_SIZE))
+    block_rows = max(1, SUMMARY_BLOCK_SIZE // block_cols)
+    blocks = []
+    for index in indices:
+        planes = [v[index].reshape(plane_shape) for v in views]
+        blocks += [
+            [plane[r:r+block_rows, c:c+block_cols] for plane in planes]
+            for r in range(0, rows, block_rows) for c in range(0, cols, block_cols)
+        ]
+    threads = max(1, min(len(blocks), threads or os.cpu_count() or 1))
+    ## each thread sums into its own histogram, and then the histograms are added together
+    histograms = numpy.zeros((threads, max(1, num_labels), 128), dtype=numpy.float64)
+    if threads == 1:
+        _summarize_blocks(kernel, blocks, scales, histograms[0], exoplanet)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for job in [
+                pool.submit(_summarize_blocks, kernel, blocks[t::threads], scales, histograms[t], exoplanet)
+                for t in range(threads)
+            ]:
+                job.result()
+    histogram = histograms.sum(axis=0)
+    return histogram[0] if labels is None else histogram
+
+def _summarize_blocks(int kernel, list blocks, list scales, double[:, ::1] histogram, bint exoplanet):
+    for planes in blocks:
+        _summarize_plane(kernel, planes, scales, histogram, exoplanet)
+
+cdef _summarize_plane(int kernel, list planes, list scales, double[:, ::1] histogram, bint exoplanet):
+    ## like _classify_plane(...), but adds the weight of each cell (the second-to-last plane) to the histogram row of
+    ## its label (the last plane) instead of writing the biome codes to an array
+    cdef _Raster[9] rasters
+    cdef Py_ssize_t n
+    for n in range(len(planes)):
+        _as_raster(planes[n], scales[n][0], scales[n][1], &rasters[n])
+    cdef Py_ssize_t num_inputs = len(planes) - 2
+    cdef Py_ssize_t rows = planes[0].shape[0]
+    cdef Py_ssize_t cols = planes[0].shape[1]
+    cdef Py_ssize_t num_labels = histogram.shape[0]
+    cdef Py_ssize_t row, col, label
+    cdef double label_value
+    cdef unsigned char code
+    with nogil:
+        for row in range(rows):
+            for col in range(cols):
+                label_value = _raster_value(&rasters[num_inputs + 1], row, col)
+                if not (label_value >= 0 and label_value < num_labels):
+                    continue
+                label = <Py_ssize_t>label_value
+                if kernel == KERNEL_WITH_PRESSURE:
+                    code = _cython_classify_biome(
+                        _raster_value(&rasters[0], row, col),
+                        _raster_value(&rasters[1], row, col),
+                        _raster_value(&rasters[2], row, col),
+                        _raster_value(&rasters[3], row, col),
+                        _raster_value(&rasters[4], row, col),
+                        _raster_value(&rasters[5], row, col)
+                    )
+                else:
+                    code = _cython_classify_biome_on_planet_surface(
+                        _raster_value(&rasters[0], row, col),
+                        _raster_value(&rasters[1], row, col),
+                        _raster_value(&rasters[2], row, col),
+                        _raster_value(&rasters[3], row, col),
+                        _raster_value(&rasters[4], row, col),
+                        _raster_value(&rasters[5], row, col),
+                        _raster_value(&rasters[6], row, col),
+                        exoplanet
+                    )
+                histogram[label, code & 0x7f] += _raster_value(&rasters[num_inputs], row, col)
+
+PLANET_INPUTS = [
+    'planet_mass_kg', 'planet_mean_radius_km', 'toa_solar_flux_Wpm2', 'axis_tilt_deg', 'tidal_lock',
+    'mean_surface_pressure_kPa'
+]
+LOCATION_RASTER_INPUTS = ['altitude_m', 'mean_temp_C', 'temp_var_C', 'annual_precip_mm', 'latitude', 'longitude']
+
+cpdef sweep_planet_biomes(
+    planet_mass_kg,
+    planet_mean_radius_km,
+    toa_solar_flux_Wpm2,
+    axis_tilt_deg,
+    tidal_lock,
+    mean_surface_pressure_kPa,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    latitude,
+    longitude,
+    bint exoplanet,
+    weights = None,
+    input_scaling = None,
+    threads = None
+):
+    """
+This function counts the predicted biome codes (as classify_biome_on_planet(...) would predict them) for every
+combination of a set of planets and a shared set of locations (climate template), without making any biome maps.
+Planet-level constants (eg checking for stars and black holes) are calculated once per planet, and the work is split
+between multiple threads.
+
+Parameters:
+    (planet_mass_kg ... mean_surface_pressure_kPa) - planet parameters (see classify_biome_on_planet(...)), as arrays
+                                                     that are broadcastable to the same shape (the planet shape)
+    (altitude_m ... longitude) - location parameters (see classify_biome_on_planet(...)), as arrays that are
+                                 broadcastable to the same shape (the template shape)
+    exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
+                       biomes
+    weights (numpy.ndarray or float) - optional weight of each location, broadcastable to the template shape
+    input_scaling (dict) - optional (scale, offset) for any of the location parameters (by parameter name), such that
+                           the value used is (array value * scale) + offset
+    threads (int) - number of threads to use (default: number of CPUs)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or count) of each biome code for each planet, as an
+    array with the planet shape + (128,)
+
+    """
+    planet_params = numpy.broadcast_arrays(*[numpy.asarray(x, dtype=numpy.float64) for x in (
+        planet_mass_kg, planet_mean_radius_km, toa_solar_flux_Wpm2, axis_tilt_deg, tidal_lock, mean_surface_pressure_kPa
+    )])
+    planet_shape = planet_params[0].shape
+    planets = numpy.ascontiguousarray(numpy.stack([x.reshape((-1,)) for x in planet_params], axis=1))
+    num_planets = planets.shape[0]
+    ## the weights are read like the other inputs, but never scaled
+    (shape, scales, views) = _broadcast_rasters(
+        LOCATION_RASTER_INPUTS + [''],
+        [altitude_m, mean_temp_C, temp_var_C, annual_precip_mm, latitude, longitude, 1.0 if weights is None else weights],
+        input_scaling
+    )
+    ## altitude range, for deciding which astronomical biome checks can be done once per planet
+    altitudes = numpy.asarray(altitude_m)
+    (min_altitude_m, max_altitude_m) = (numpy.nan, numpy.nan)
+    if altitudes.size > 0 and not numpy.isnan(numpy.min(altitudes)):
+        (scale, offset) = scales[0]
+        (min_altitude_m, max_altitude_m) = sorted([
+            float(numpy.min(altitudes)) * scale + offset, float(numpy.max(altitudes)) * scale + offset
+        ])
+    (indices, plane_shape) = _planes(shape)
+    (rows, cols) = plane_shape
+    block_cols = max(1, min(cols, SUMMARY_BLOCK_SIZE))
+    block_rows = max(1, SUMMARY_BLOCK_SIZE // block_cols)
+    blocks = []
+    for index in indices:
+        planes = [v[index].reshape(plane_shape) for v in views]
+        blocks += [
+            [plane[r:r+block_rows, c:c+block_cols] for plane in planes]
+            for r in range(0, rows, block_rows) for c in range(0, cols, block_cols)
+        ]
+    threads = max(1, threads or os.cpu_count() or 1)
+    histogram = numpy.zeros((num_planets, 128), dtype=numpy.float64)
+    all_planets = numpy.arange(num_planets, dtype=numpy.intp)
+    if threads == 1 or num_planets == 0 or len(blocks) == 0:
+        _sweep_blocks(all_planets, planets, blocks, scales, min_altitude_m, max_altitude_m, histogram, exoplanet)
+    elif num_planets >= threads:
+        ## each thread does every location of its share of the planets (writing to separate rows of the histogram)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for job in [pool.submit(
+                _sweep_blocks, all_planets[t::threads], planets, blocks, scales, min_altitude_m, max_altitude_m,
+                histogram, exoplanet
+            ) for t in range(threads)]:
+                job.result()
+    else:
+        ## each thread does its share of the locations for every planet, then the histograms are added together
+        threads = min(threads, len(blocks))
+        histograms = numpy.zeros((threads, num_planets, 128), dtype=numpy.float64)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for job in [pool.submit(
+                _sweep_blocks, all_planets, planets, blocks[t::threads], scales, min_altitude_m, max_altitude_m,
+                histograms[t], exoplanet
+            ) for t in range(threads)]:
+                job.result()
+        histograms.sum(axis=0, out=histogram)
+    return histogram.reshape(planet_shape + (128,))
+
+def _sweep_blocks(
+    const Py_ssize_t[:] planet_indices, const double[:, ::1] planets, list blocks, list scales,
+    double min_altitude_m, double max_altitude_m, double[:, ::1] histogram, bint exoplanet
+):
+    ## (every planet is done for one block of locations before moving on to the next, so that the block stays in cache)
+    cdef _Raster[7] rasters
+    cdef _Planet planet
+    cdef Py_ssize_t n, i, p, row, col, rows, cols
+    cdef unsigned char code
+    for planes in blocks:
+        for n in range(7):
+            _as_raster(planes[n], scales[n][0], scales[n][1], &rasters[n])
+        rows = planes[0].shape[0]
+        cols = planes[0].shape[1]
+        with nogil:
+            for i in range(planet_indices.shape[0]):
+                p = planet_indices[i]
+                _init_planet(
+                    &planet, planets[p, 0], planets[p, 1], planets[p, 2], planets[p, 3], planets[p, 4] != 0,
+                    planets[p, 5], min_altitude_m, max_altitude_m, exoplanet
+                )
+                for row in range(rows):
+                    for col in range(cols):
+                        code = _classify_location_on_planet(
+                            &planet,
+                            _raster_value(&rasters[0], row, col),
+                            _raster_value(&rasters[1], row, col),
+                            _raster_value(&rasters[2], row, col),
+                            _raster_value(&rasters[3], row, col),
+                            _raster_value(&rasters[4], row, col),
+                            _raster_value(&rasters[5], row, col),
+                            exoplanet
+                        )
+                        histogram[p, code & 0x7f] += _raster_value(&rasters[6], row, col)
+
 cdef extern from "math.h":
-    bint isnan(double x)
\ No newline at end of file
+    bint isnan(double x) nogil
\ No newline at end of file
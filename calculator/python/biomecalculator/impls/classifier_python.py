@@ -5,66 +5,30 @@ Pure python implementation of the classifier
 import numpy
 from numpy import ndarray
 from ..biomes import Biome
+from ..model import BiomeModel, DEFAULT_MODEL
 
 
-ref_classes = [1, 2, 3, 4, 5, 6, 7, 8, 9]
-## order of features: ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
-ref_points = numpy.asarray([
-## wetlands
-       [[0.97589505, 0.6692817 , 0.09676683, 0.42183435],
-        [0.2872733 , 0.5562218 , 0.21704593, 0.3098737 ],
-        [0.95833284, 0.6877248 , 0.12377492, 0.2995282 ],
-        [0.6171483 , 0.47020113, 0.4836682 , 0.22195342],
-        [0.81850535, 0.60123855, 0.25867933, 0.31303504]],
-## jungle
-       [[0.7665621 , 0.5300055 , 0.2408872 , 0.3123359 ],
-        [0.99121696, 0.6713649 , 0.07588506, 0.40304184],
-        [0.98553646, 0.67212886, 0.08356771, 0.3337861 ],
-        [0.9209426 , 0.59560406, 0.15855226, 0.3750781 ],
-        [0.99228674, 0.67052644, 0.07420062, 0.49766815]],
-## seasonal forest
-       [[0.82307386, 0.54830164, 0.28397045, 0.32422626],
-        [0.95406234, 0.68983954, 0.16054682, 0.29840717],
-        [0.5337313 , 0.44197488, 0.4220576 , 0.24119267],
-        [0.70596063, 0.5029748 , 0.37620285, 0.26919958],
-        [0.65009725, 0.41467762, 0.53735024, 0.24624129]],
-## needleleaf forest
-       [[0.8442506 , 0.513412  , 0.23853904, 0.31593102],
-        [0.4755671 , 0.42182055, 0.32860836, 0.25947723],
-        [0.69879943, 0.5263777 , 0.3583926 , 0.24800086],
-        [0.6385724 , 0.44265494, 0.30205786, 0.41645652],
-        [0.59855306, 0.41948298, 0.4608879 , 0.21030518]],
-## grassland
-       [[0.9590115 , 0.69129807, 0.14321554, 0.33431706],
-        [0.64463437, 0.51307285, 0.6764352 , 0.17131203],
-        [0.75970644, 0.53838587, 0.34264302, 0.25237092],
-        [0.9574419 , 0.76865923, 0.21147878, 0.2162868 ],
-        [0.7787093 , 0.64991206, 0.49281284, 0.1717132 ]],
-## desert
-       [[0.8768907 , 0.68539584, 0.30395174, 0.18175352],
-        [0.85951805, 0.75583154, 0.43008733, 0.13515931],
-        [0.9133944 , 0.80276865, 0.33543584, 0.15386288],
-        [0.95464563, 0.8058968 , 0.2042541 , 0.1794926 ],
-        [0.7509371 , 0.62957406, 0.44375542, 0.1542665 ]],
-## tundra
-       [[0.4441414 , 0.30920148, 0.4959661 , 0.24957538],
-        [0.4513571 , 0.23461857, 0.732274  , 0.2127717 ],
-        [0.6739347 , 0.34742635, 0.41046205, 0.26215446],
-        [0.577827  , 0.32734275, 0.62989986, 0.22067626],
-        [0.37011942, 0.15006503, 0.65958476, 0.18708763]],
-## barren
-       [[0.29481938, 0.09472984, 0.59135556, 0.06860657],
-        [0.86539465, 0.7506361 , 0.37203112, 0.11493613],
-        [0.664666  , 0.6056427 , 0.46542227, 0.14238815],
-        [0.6938545 , 0.43799615, 0.30913985, 0.2867542 ],
-        [0.8466273 , 0.53237015, 0.44636855, 0.16200702]],
-## sandsea
-       [[0.82119286, 0.48783484, 0.44511366, 0.10902377],
-        [0.9354581 , 0.8444746 , 0.28542006, 0.076657  ],
-        [0.75143087, 0.70467633, 0.602095  , 0.09906711],
-        [0.8729486 , 0.81519806, 0.4026484 , 0.0783796 ],
-        [0.24349129, 0.7866096 , 0.45044297, 0.11177942]]
-])
+## terrestrial classifier model (reference points, normalization bounds, and thresholds), see set_model(...)
+ref_classes = DEFAULT_MODEL.classes
+ref_points = DEFAULT_MODEL.ref_points.astype(numpy.float64)
+feature_mins = DEFAULT_MODEL.feature_mins
+feature_maxs = DEFAULT_MODEL.feature_maxs
+min_rain_limit_mm = DEFAULT_MODEL.min_rain_limit_mm
+max_rain_limit_mm = DEFAULT_MODEL.max_rain_limit_mm # too much rain and we'll call it a wetland instead of a jungle
+jungle_max_temp_var_C = DEFAULT_MODEL.jungle_max_temp_var_C
+
+def set_model(model: BiomeModel):
+    """
+Replaces the reference points, normalization bounds, and thresholds used to classify terrestrial biomes
+
+Parameters:
+    model (BiomeModel) - the model to use
+    """
+    global ref_classes, ref_points, feature_mins, feature_maxs, min_rain_limit_mm, max_rain_limit_mm, jungle_max_temp_var_C
+    (ref_classes, ref_points, feature_mins, feature_maxs, min_rain_limit_mm, max_rain_limit_mm, jungle_max_temp_var_C) = (
+        numpy.array(model.classes), numpy.array(model.ref_points, dtype=numpy.float64),
+        numpy.array(model.feature_mins), numpy.array(model.feature_maxs), *model.thresholds
+    )
 
 def classify_biome(
     mean_solar_flux_Wpm2: float,
@@ -90,8 +54,6 @@ Returns:
     (int) returns the DrPlantabyte Biome enum value for the predicted biome
     """
     ## constants and variables
-    min_rain_limit_mm = 110
-    max_rain_limit_mm = 6000 # too much rain and we'll call it a wetland instead of a jungle
     photic_zone_min_solar_flux_Wpm2 = 35
     wave_disruption_depth_m = -6 # corals, seagrasses, kelps, etc cannot grow above this depth
     epsilon_water = 0.013333  # Absorption per meter (150m == 1% transmission (0.01 = 10^(-epsilon*150))
@@ -106,20 +68,20 @@ Returns:
             biome_code = Biome.WETLAND
         else:
             ### rescale to normalize so that distance calcs aren't biased
-            norm_sol_flux = rescale(mean_solar_flux_Wpm2, 0.0, 800.)
-            norm_mtemp = rescale(mean_temp_C, -20., 50.)
-            norm_vtemp = rescale(temp_var_C, 0., 35.)
-            norm_precip = rescale(numpy.sqrt(annual_precip_mm), 0.0, 75.)
-            for bclass in range(9):
-                for refpt in range(5):
+            norm_sol_flux = rescale(mean_solar_flux_Wpm2, feature_mins[0], feature_maxs[0])
+            norm_mtemp = rescale(mean_temp_C, feature_mins[1], feature_maxs[1])
+            norm_vtemp = rescale(temp_var_C, feature_mins[2], feature_maxs[2])
+            norm_precip = rescale(numpy.sqrt(annual_precip_mm), feature_mins[3], feature_maxs[3])
+            for bclass in range(ref_points.shape[0]):
+                for refpt in range(ref_points.shape[1]):
                     d = dist4f(
                         ref_points[bclass][refpt][0], ref_points[bclass][refpt][1], ref_points[bclass][refpt][2], ref_points[bclass][refpt][3],
                         norm_sol_flux, norm_mtemp, norm_vtemp, norm_precip
                     )
                     if d < closest_dist:
                         closest_dist = d
-                        biome_code = ref_classes[bclass]
-        if biome_code == Biome.JUNGLE and temp_var_C > 6.0:
+                        biome_code = int(ref_classes[bclass])
+        if biome_code == Biome.JUNGLE and temp_var_C > jungle_max_temp_var_C:
             # too much variation for jungle, actually grassland
             biome_code = Biome.GRASSLAND
     ## marine biomes
@@ -364,25 +326,31 @@ def dist4f(a1: float, b1: float, c1: float, d1: float, a2: float, b2: float, c2:
     dd = d2-d1
     return numpy.sqrt(da*da + db*db + dc*dc + dd*dd)
 
+RASTER_INPUTS = [
+    'gravity_m_per_s2', 'mean_surface_pressure_kPa', 'mean_solar_flux_Wpm2', 'altitude_m', 'mean_temp_C', 'temp_var_C',
+    'annual_precip_mm'
+]
+
 def classify_planet_biomes(
-    gravity_m_per_s2: float,
-    mean_surface_pressure_kPa: float,
+    gravity_m_per_s2,
+    mean_surface_pressure_kPa,
     mean_solar_flux_Wpm2: ndarray,
     altitude_m: ndarray,
     mean_temp_C: ndarray,
     temp_var_C: ndarray,
     annual_precip_mm: ndarray,
-    exoplanet: bool
+    exoplanet: bool,
+    input_scaling: dict = None
 ) -> ndarray:
     """
 This function estimates the biome codes for an array of planet and climate parameters, with the option to include
 extreme exoplanet biomes that do not exist on Earth
 
-Note that all ndarray parameters must have identical shapes
+Note that all ndarray (and float) parameters must be broadcastable to the same shape
 
 Parameters:
-    gravity_m_per_s2 (float) - gravity at the surface of the planet, in meters per second per second
-    mean_surface_pressure_kPa (float) - atmospheric pressure at sea-level, in kPa
+    gravity_m_per_s2 (numpy.ndarray or float) - gravity at the surface of the planet, in meters per second per second
+    mean_surface_pressure_kPa (numpy.ndarray or float) - atmospheric pressure at sea-level, in kPa
     mean_solar_flux_Wpm2 (numpy.ndarray) - annual mean solar flux, in watts per square meter
     altitude_m (numpy.ndarray) - altitude above (or below, if negative) sea-level, in meters
     mean_temp_C (numpy.ndarray) - annual mean temperature, in degrees C
@@ -391,6 +359,8 @@ Parameters:
     annual_precip_mm (numpy.ndarray) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm rainfall)
     exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
                        biomes
+    input_scaling (dict) - optional (scale, offset) for any of the above array inputs (by parameter name), such that
+                           the value used is (array value * scale) + offset
 
 Returns:
     (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes
@@ -436,30 +406,198 @@ Biome Code Reference:
      116   OOZE
     """
     # for use with Numpy arrays
-    assert tuple(mean_solar_flux_Wpm2.shape) == tuple(altitude_m.shape)
-    assert tuple(mean_temp_C.shape) == tuple(altitude_m.shape)
-    assert tuple(temp_var_C.shape) == tuple(altitude_m.shape)
-    assert tuple(annual_precip_mm.shape) == tuple(altitude_m.shape)
-    #
-    _shape = mean_temp_C.shape
-    _mean_solar_flux_Wpm2 = mean_solar_flux_Wpm2.reshape((-1,))
-    _altitude_m = altitude_m.reshape((-1,))
-    _mean_temp_C = mean_temp_C.reshape((-1,))
-    _temp_var_C = temp_var_C.reshape((-1,))
-    _annual_precip_mm = annual_precip_mm.reshape((-1,))
-    result_view = numpy.zeros_like(mean_temp_C, dtype=numpy.uint8).reshape((-1,))
+    scaling = dict(input_scaling or {})
+    for name in scaling:
+        if name not in RASTER_INPUTS:
+            raise ValueError('Unknown input for scaling: %s (expected one of %s)' % (name, RASTER_INPUTS))
+    ## (scale, offset) of each input, applied in double precision like the Cython implementation
+    scales = [scaling.get(name, (1.0, 0.0)) for name in RASTER_INPUTS]
+    ## iterate over the broadcast inputs without making full-size copies of them
+    cells = numpy.broadcast(
+        gravity_m_per_s2, mean_surface_pressure_kPa, mean_solar_flux_Wpm2, altitude_m, mean_temp_C, temp_var_C,
+        annual_precip_mm
+    )
+    result = numpy.zeros(cells.shape, dtype=numpy.uint8)
+    result_view = result.reshape((-1,))
     #
-    for i in range(result_view.shape[0]):
+    for (i, cell) in enumerate(cells):
         result_view[i] = classify_biome_on_planet_surface(
-            gravity_m_per_s2,
-            mean_surface_pressure_kPa,
-            _mean_solar_flux_Wpm2[i],
-            _altitude_m[i],
-            _mean_temp_C[i],
-            _temp_var_C[i],
-            _annual_precip_mm[i],
+            *[float(x) * scale + offset for (x, (scale, offset)) in zip(cell, scales)],
+            exoplanet
+        )
+    return result
+
+def summarize_planet_biomes(
+    gravity_m_per_s2,
+    mean_surface_pressure_kPa,
+    mean_solar_flux_Wpm2,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    exoplanet: bool,
+    weights = None,
+    labels = None,
+    num_labels: int = 0,
+    input_scaling: dict = None,
+    threads: int = None
+) -> ndarray:
+    """
+This function counts the predicted biome codes for arrays of planet and climate parameters (the same inputs as
+classify_planet_biomes(...)) without making a map of the biomes, optionally weighting each location (eg by its area)
+and/or grouping the locations by a region label (eg latitude band or continent)
+
+Parameters:
+    (gravity_m_per_s2 ... exoplanet) - see classify_planet_biomes(...)
+    weights (numpy.ndarray or float) - optional weight of each location, broadcastable to the shape of the inputs (eg
+                                       the cosine of the latitude as a column vector)
+    labels (numpy.ndarray or int) - optional region label of each location (0 to num_labels-1), broadcastable to the
+                                    shape of the inputs; locations with labels outside this range are not counted
+    num_labels (int) - number of region labels (default: 1 + the largest label)
+    input_scaling (dict) - optional (scale, offset) for any of the classify_planet_biomes(...) array inputs (by
+                           parameter name), such that the value used is (array value * scale) + offset
+    threads (int) - ignored (the pure python implementation is single-threaded)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or count) of each biome code as an array of shape
+    (128,), or (num_labels, 128) if labels are given
+    """
+    scaling = dict(input_scaling or {})
+    for name in scaling:
+        if name not in RASTER_INPUTS:
+            raise ValueError('Unknown input for scaling: %s (expected one of %s)' % (name, RASTER_INPUTS))
+    scales = [scaling.get(name, (1.0, 0.0)) for name in RASTER_INPUTS]
+    if labels is not None and num_labels <= 0:
+        num_labels = int(numpy.max(labels)) + 1 if numpy.size(labels) > 0 else 1
+    histogram = numpy.zeros((max(1, num_labels), 128), dtype=numpy.float64)
+    cells = numpy.broadcast(
+        gravity_m_per_s2, mean_surface_pressure_kPa, mean_solar_flux_Wpm2, altitude_m, mean_temp_C, temp_var_C,
+        annual_precip_mm, 1.0 if weights is None else weights, 0 if labels is None else labels
+    )
+    for cell in cells:
+        label = float(cell[8])
+        if not (label >= 0 and label < histogram.shape[0]):
+            continue
+        code = classify_biome_on_planet_surface(
+            *[float(x) * scale + offset for (x, (scale, offset)) in zip(cell[0:7], scales)],
             exoplanet
         )
-    result = result_view.reshape(_shape)
+        histogram[int(label), int(code) & 0x7f] += float(cell[7])
+    return histogram[0] if labels is None else histogram
+
+PRESSURE_RASTER_INPUTS = [
+    'mean_solar_flux_Wpm2', 'pressure_kPa', 'altitude_m', 'mean_temp_C', 'temp_var_C', 'annual_precip_mm'
+]
+
+def classify_biomes_with_pressure(
+    mean_solar_flux_Wpm2,
+    pressure_kPa,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    input_scaling: dict = None
+) -> ndarray:
+    """
+This function estimates the biome codes for arrays of climate parameters where the local atmospheric pressure is
+already known (eg from an atmosphere model), only considering earthly biomes. This is the array version of
+classify_biome(...)
+
+Note that all ndarray (and float) parameters must be broadcastable to the same shape
+
+Parameters:
+    mean_solar_flux_Wpm2 (numpy.ndarray or float) - annual mean solar flux, in watts per square meter
+    pressure_kPa (numpy.ndarray or float) - atmospheric pressure at the surface (use sea-level pressure for underwater
+                                            classification), in kPa
+    altitude_m (numpy.ndarray or float) - altitude above (or below, if negative) sea-level, in meters
+    mean_temp_C (numpy.ndarray or float) - annual mean temperature, in degrees C
+    temp_var_C (numpy.ndarray or float) - the +/- range of the temperature throughout the year (1.5 standard
+                                          deviations), in degrees C
+    annual_precip_mm (numpy.ndarray or float) - the annual mean precipitation, in mm rainfall (10 mm snowfall = 1 mm
+                                                rainfall)
+    input_scaling (dict) - optional (scale, offset) for any of the above array inputs (by parameter name), such that
+                           the value used is (array value * scale) + offset
+
+Returns:
+    (numpy.ndarray with dtype=uint8) returns the DrPlantabyte Biome codes for the predicted biomes
+    """
+    scaling = dict(input_scaling or {})
+    for name in scaling:
+        if name not in PRESSURE_RASTER_INPUTS:
+            raise ValueError('Unknown input for scaling: %s (expected one of %s)' % (name, PRESSURE_RASTER_INPUTS))
+    scales = [scaling.get(name, (1.0, 0.0)) for name in PRESSURE_RASTER_INPUTS]
+    cells = numpy.broadcast(mean_solar_flux_Wpm2, pressure_kPa, altitude_m, mean_temp_C, temp_var_C, annual_precip_mm)
+    result = numpy.zeros(cells.shape, dtype=numpy.uint8)
+    result_view = result.reshape((-1,))
+    for (i, cell) in enumerate(cells):
+        result_view[i] = classify_biome(
+            *[float(x) * scale + offset for (x, (scale, offset)) in zip(cell, scales)]
+        )
     return result
 
+PLANET_INPUTS = [
+    'planet_mass_kg', 'planet_mean_radius_km', 'toa_solar_flux_Wpm2', 'axis_tilt_deg', 'tidal_lock',
+    'mean_surface_pressure_kPa'
+]
+LOCATION_RASTER_INPUTS = ['altitude_m', 'mean_temp_C', 'temp_var_C', 'annual_precip_mm', 'latitude', 'longitude']
+
+def sweep_planet_biomes(
+    planet_mass_kg,
+    planet_mean_radius_km,
+    toa_solar_flux_Wpm2,
+    axis_tilt_deg,
+    tidal_lock,
+    mean_surface_pressure_kPa,
+    altitude_m,
+    mean_temp_C,
+    temp_var_C,
+    annual_precip_mm,
+    latitude,
+    longitude,
+    exoplanet: bool,
+    weights = None,
+    input_scaling: dict = None,
+    threads: int = None
+) -> ndarray:
+    """
+This function counts the predicted biome codes (as classify_biome_on_planet(...) would predict them) for every
+combination of a set of planets and a shared set of locations (climate template), without making any biome maps
+
+Parameters:
+    (planet_mass_kg ... mean_surface_pressure_kPa) - planet parameters (see classify_biome_on_planet(...)), as arrays
+                                                     that are broadcastable to the same shape (the planet shape)
+    (altitude_m ... longitude) - location parameters (see classify_biome_on_planet(...)), as arrays that are
+                                 broadcastable to the same shape (the template shape)
+    exoplanet (bool) - set to true to include more exotic biomes not found on Earth, set to false to only use Earthly
+                       biomes
+    weights (numpy.ndarray or float) - optional weight of each location, broadcastable to the template shape
+    input_scaling (dict) - optional (scale, offset) for any of the location parameters (by parameter name), such that
+                           the value used is (array value * scale) + offset
+    threads (int) - ignored (the pure python implementation is single-threaded)
+
+Returns:
+    (numpy.ndarray with dtype=float64) returns the total weight (or count) of each biome code for each planet, as an
+    array with the planet shape + (128,)
+    """
+    scaling = dict(input_scaling or {})
+    for name in scaling:
+        if name not in LOCATION_RASTER_INPUTS:
+            raise ValueError('Unknown input for scaling: %s (expected one of %s)' % (name, LOCATION_RASTER_INPUTS))
+    scales = [scaling.get(name, (1.0, 0.0)) for name in LOCATION_RASTER_INPUTS]
+    planets = numpy.broadcast(
+        planet_mass_kg, planet_mean_radius_km, toa_solar_flux_Wpm2, axis_tilt_deg, tidal_lock, mean_surface_pressure_kPa
+    )
+    histogram = numpy.zeros((planets.size, 128), dtype=numpy.float64)
+    for (p, planet) in enumerate(planets):
+        (mass, radius, toa_flux, tilt, locked, pressure) = [float(x) for x in planet]
+        locations = numpy.broadcast(
+            altitude_m, mean_temp_C, temp_var_C, annual_precip_mm, latitude, longitude, 1.0 if weights is None else weights
+        )
+        for location in locations:
+            code = classify_biome_on_planet(
+                mass, radius, toa_flux, tilt, locked != 0, pressure,
+                *[float(x) * scale + offset for (x, (scale, offset)) in zip(location[0:6], scales)],
+                exoplanet
+            )
+            histogram[p, int(code) & 0x7f] += float(location[6])
+    return histogram.reshape(planets.shape + (128,))
@@ -0,0 +1,181 @@
+"""
+Reference point model used by the biome calculator to classify terrestrial biomes.
+
+Terrestrial biomes are predicted by normalizing the climate at a location (mean solar flux, mean temperature,
+temperature range, and square-root of annual precipitation) to 0-1 and then picking the biome of the nearest reference
+point. The reference points, the normalization bounds, and the rainfall and temperature thresholds make up a
+BiomeModel, which can be saved to and memory-mapped from a compact binary file, so that custom-tuned models can be
+used without editing the calculator source code (see biomecalculator.use_model(...)).
+
+Model file format (all values little-endian, every section starts on an 8-byte boundary):
+| offset |type                          |content                                           |
+|--------|------------------------------|--------------------------------------------------|
+|      0 |8 bytes                       |magic number b'BIOMMDL\\0'                        |
+|      8 |uint32                        |format version (1)                                |
+|     12 |uint32                        |number of classes (C)                             |
+|     16 |uint32                        |number of reference points per class (P)          |
+|     20 |uint32                        |number of features (F, must be 4)                 |
+|     24 |float64 x 3                   |min rain limit (mm), max rain limit (mm), and     |
+|        |                              |max jungle temperature variation (C)              |
+|     48 |float64 x F                   |feature normalization minimums                    |
+|        |float64 x F                   |feature normalization maximums                    |
+|        |uint8 x C (padded to 8 bytes) |biome code of each class                          |
+|        |float32 x C x P x F           |normalized reference points                       |
+
+"""
+
+import struct, numpy
+from numpy import ndarray
+
+## NOTE: research/src/model_building.py writes model files with its own copy of these constants (see
+## export_calculator_model(...)), so change both when bumping the format
+MODEL_MAGIC = b'BIOMMDL\x00'
+MODEL_VERSION = 1
+MODEL_FEATURES = ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
+_HEADER = struct.Struct('<8sIIII3d')
+
+
+class BiomeModel:
+	"""
+	Reference points, normalization bounds, and thresholds of the terrestrial biome classifier.
+
+	:param classes: biome code of each class of reference points (C)
+	:param ref_points: normalized reference points (C x P x 4), features in the order of MODEL_FEATURES
+	:param feature_mins: value of each feature that is normalized to 0 (precipitation as sqrt(mm))
+	:param feature_maxs: value of each feature that is normalized to 1 (precipitation as sqrt(mm))
+	:param min_rain_limit_mm: land with less annual precipitation than this is barren or sand sea
+	:param max_rain_limit_mm: land with more annual precipitation than this is wetland
+	:param jungle_max_temp_var_C: jungle with more temperature variation than this is grassland instead
+	"""
+	def __init__(
+			self, classes, ref_points, feature_mins=(0., -20., 0., 0.), feature_maxs=(800., 50., 35., 75.),
+			min_rain_limit_mm=110., max_rain_limit_mm=6000., jungle_max_temp_var_C=6.0
+	):
+		self.classes = numpy.asarray(classes, dtype=numpy.uint8)
+		self.ref_points = numpy.asarray(ref_points, dtype=numpy.float32)
+		self.feature_mins = numpy.asarray(feature_mins, dtype=numpy.float64)
+		self.feature_maxs = numpy.asarray(feature_maxs, dtype=numpy.float64)
+		self.min_rain_limit_mm = float(min_rain_limit_mm)
+		self.max_rain_limit_mm = float(max_rain_limit_mm)
+		self.jungle_max_temp_var_C = float(jungle_max_temp_var_C)
+		if self.ref_points.ndim != 3 or self.ref_points.shape[2] != len(MODEL_FEATURES):
+			raise ValueError('ref_points must have shape (classes, points per class, %s), not %s' % (len(MODEL_FEATURES), self.ref_points.shape))
+		if self.ref_points.shape[0] != len(self.classes):
+			raise ValueError('Got %s classes for %s groups of reference points' % (len(self.classes), self.ref_points.shape[0]))
+		if self.feature_mins.shape != (len(MODEL_FEATURES),) or self.feature_maxs.shape != (len(MODEL_FEATURES),):
+			raise ValueError('feature_mins and feature_maxs must have %s values each' % len(MODEL_FEATURES))
+
+	@property
+	def thresholds(self) -> (float, float, float):
+		return (self.min_rain_limit_mm, self.max_rain_limit_mm, self.jungle_max_temp_var_C)
+
+	def save(self, filepath: str):
+		"""
+		Writes this model to a binary model file (see the module documentation for the format)
+		:param filepath: destination file
+		"""
+		(num_classes, pts_per_class, num_features) = self.ref_points.shape
+		with open(filepath, 'wb') as fout:
+			fout.write(_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, num_classes, pts_per_class, num_features, *self.thresholds))
+			fout.write(self.feature_mins.astype('<f8').tobytes())
+			fout.write(self.feature_maxs.astype('<f8').tobytes())
+			fout.write(self.classes.tobytes())
+			fout.write(bytes(-num_classes % 8))
+			fout.write(numpy.ascontiguousarray(self.ref_points, dtype='<f4').tobytes())
+
+	@staticmethod
+	def load(filepath: str, mmap=True):
+		"""
+		Reads a binary model file
+		:param filepath: model file (see the module documentation for the format)
+		:param mmap: if True, the reference points are memory-mapped instead of read into memory
+		:return: Returns the BiomeModel
+		"""
+		with open(filepath, 'rb') as fin:
+			header = fin.read(_HEADER.size)
+		if len(header) < _HEADER.size or header[0:8] != MODEL_MAGIC:
+			raise ValueError('%s is not a biome calculator model file' % filepath)
+		(_, version, num_classes, pts_per_class, num_features, min_rain, max_rain, jungle_var) = _HEADER.unpack(header)
+		if version != MODEL_VERSION:
+			raise ValueError('Unsupported model file version %s (expected %s)' % (version, MODEL_VERSION))
+		offset = _HEADER.size
+		bounds = numpy.fromfile(filepath, dtype='<f8', count=2*num_features, offset=offset)
+		offset += bounds.nbytes
+		classes = numpy.fromfile(filepath, dtype=numpy.uint8, count=num_classes, offset=offset)
+		offset += num_classes + (-num_classes % 8)
+		shape = (num_classes, pts_per_class, num_features)
+		if mmap:
+			ref_points = numpy.memmap(filepath, dtype='<f4', mode='r', offset=offset, shape=shape)
+		else:
+			ref_points = numpy.fromfile(filepath, dtype='<f4', count=numpy.prod(shape), offset=offset).reshape(shape)
+		return BiomeModel(
+			classes=classes, ref_points=ref_points, feature_mins=bounds[0:num_features],
+			feature_maxs=bounds[num_features:], min_rain_limit_mm=min_rain, max_rain_limit_mm=max_rain,
+			jungle_max_temp_var_C=jungle_var
+		)
+
+	def __repr__(self):
+		return 'BiomeModel(%s classes x %s reference points)' % self.ref_points.shape[0:2]
+
+
+## the built-in model (used unless another model is selected with biomecalculator.use_model(...))
+DEFAULT_MODEL = BiomeModel(
+	classes=[1, 2, 3, 4, 5, 6, 7, 8, 9],
+	## order of features: ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
+	ref_points=[
+## wetlands
+       [[0.97589505, 0.6692817 , 0.09676683, 0.42183435],
+        [0.2872733 , 0.5562218 , 0.21704593, 0.3098737 ],
+        [0.95833284, 0.6877248 , 0.12377492, 0.2995282 ],
+        [0.6171483 , 0.47020113, 0.4836682 , 0.22195342],
+        [0.81850535, 0.60123855, 0.25867933, 0.31303504]],
+## jungle
+       [[0.7665621 , 0.5300055 , 0.2408872 , 0.3123359 ],
+        [0.99121696, 0.6713649 , 0.07588506, 0.40304184],
+        [0.98553646, 0.67212886, 0.08356771, 0.3337861 ],
+        [0.9209426 , 0.59560406, 0.15855226, 0.3750781 ],
+        [0.99228674, 0.67052644, 0.07420062, 0.49766815]],
+## seasonal forest
+       [[0.82307386, 0.54830164, 0.28397045, 0.32422626],
+        [0.95406234, 0.68983954, 0.16054682, 0.29840717],
+        [0.5337313 , 0.44197488, 0.4220576 , 0.24119267],
+        [0.70596063, 0.5029748 , 0.37620285, 0.26919958],
+        [0.65009725, 0.41467762, 0.53735024, 0.24624129]],
+## needleleaf forest
+       [[0.8442506 , 0.513412  , 0.23853904, 0.31593102],
+        [0.4755671 , 0.42182055, 0.32860836, 0.25947723],
+        [0.69879943, 0.5263777 , 0.3583926 , 0.24800086],
+        [0.6385724 , 0.44265494, 0.30205786, 0.41645652],
+        [0.59855306, 0.41948298, 0.4608879 , 0.21030518]],
+## grassland
+       [[0.9590115 , 0.69129807, 0.14321554, 0.33431706],
+        [0.64463437, 0.51307285, 0.6764352 , 0.17131203],
+        [0.75970644, 0.53838587, 0.34264302, 0.25237092],
+        [0.9574419 , 0.76865923, 0.21147878, 0.2162868 ],
+        [0.7787093 , 0.64991206, 0.49281284, 0.1717132 ]],
+## desert
+       [[0.8768907 , 0.68539584, 0.30395174, 0.18175352],
+        [0.85951805, 0.75583154, 0.43008733, 0.13515931],
+        [0.9133944 , 0.80276865, 0.33543584, 0.15386288],
+        [0.95464563, 0.8058968 , 0.2042541 , 0.1794926 ],
+        [0.7509371 , 0.62957406, 0.44375542, 0.1542665 ]],
+## tundra
+       [[0.4441414 , 0.30920148, 0.4959661 , 0.24957538],
+        [0.4513571 , 0.23461857, 0.732274  , 0.2127717 ],
+        [0.6739347 , 0.34742635, 0.41046205, 0.26215446],
+        [0.577827  , 0.32734275, 0.62989986, 0.22067626],
+        [0.37011942, 0.15006503, 0.65958476, 0.18708763]],
+## barren
+       [[0.29481938, 0.09472984, 0.59135556, 0.06860657],
+        [0.86539465, 0.7506361 , 0.37203112, 0.11493613],
+        [0.664666  , 0.6056427 , 0.46542227, 0.14238815],
+        [0.6938545 , 0.43799615, 0.30913985, 0.2867542 ],
+        [0.8466273 , 0.53237015, 0.44636855, 0.16200702]],
+## sandsea
+       [[0.82119286, 0.48783484, 0.44511366, 0.10902377],
+        [0.9354581 , 0.8444746 , 0.28542006, 0.076657  ],
+        [0.75143087, 0.70467633, 0.602095  , 0.09906711],
+        [0.8729486 , 0.81519806, 0.4026484 , 0.0783796 ],
+        [0.24349129, 0.7866096 , 0.45044297, 0.11177942]]
+	]
+)
@@ -0,0 +1,147 @@
+"""
+Export of biome maps as zoomable, tiled multi-resolution image pyramids.
+
+Each zoom level is half the size of the next, with every 2x2 block of biome codes reduced to its most common code
+(rather than averaged, so that categorical biome codes are never blended into other biomes), down to zoom level 0
+which fits in a single tile. Tiles are written as paletted (8-bit indexed color) PNG files in the usual
+{zoom}/{x}/{y}.png layout used by web map viewers, encoded in parallel by a pool of worker threads. A manifest of
+tile hashes is kept in the output folder, so that re-exporting an updated map only re-writes the tiles that changed.
+
+Example usage:
+```
+>>> import biomecalculator
+>>> from biomecalculator.tiles import export_biome_tiles
+>>> biome_map = biomecalculator.classify_planet_biomes(...)  # 10800 x 21600 (1 arc-minute) global map
+>>> export_biome_tiles(biome_map, 'www/biome-tiles')
+{'zoom_levels': 8, 'tiles': 4936, 'written': 4936, 'skipped': 0}
+>>> export_biome_tiles(biome_map, 'www/biome-tiles')  # nothing changed, so nothing is re-written
+{'zoom_levels': 8, 'tiles': 4936, 'written': 0, 'skipped': 4936}
+```
+"""
+
+import os, json, struct, zlib, hashlib, numpy
+from os import path
+from concurrent.futures import ThreadPoolExecutor
+from .biomes import BIOME_PALETTE
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def encode_paletted_png(indices: numpy.ndarray, palette: numpy.ndarray = BIOME_PALETTE, compress_level=6) -> bytes:
+	"""
+	Encodes a 2D array of color indices as an 8-bit paletted PNG image
+	:param indices: 2D uint8 array of palette indices (eg biome codes)
+	:param palette: (N x 3) uint8 RGB palette, N <= 256
+	:param compress_level: zlib compression level (0-9)
+	:return: Returns the PNG file contents
+	"""
+	indices = numpy.asarray(indices, dtype=numpy.uint8)
+	palette = numpy.asarray(palette, dtype=numpy.uint8)
+	(height, width) = indices.shape
+	## every row starts with filter type 0 (no filter)
+	raw = numpy.zeros((height, width + 1), dtype=numpy.uint8)
+	raw[:, 1:] = indices
+	return b''.join([
+		b'\x89PNG\r\n\x1a\n',
+		_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+		_png_chunk(b'PLTE', palette[:, 0:3].tobytes()),
+		_png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)),
+		_png_chunk(b'IEND', b'')
+	])
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+	return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+def downsample_mode(biome_map: numpy.ndarray) -> numpy.ndarray:
+	"""
+	Halves the size of a biome map, replacing each 2x2 block with its most common biome code (ties go to the first
+	of the tied codes in the order top-left, top-right, bottom-left, bottom-right). Maps with an odd number of rows
+	or columns are padded by repeating the last row or column.
+	:param biome_map: 2D integer array of biome codes
+	:return: Returns the downsampled map, with shape (ceil(rows/2), ceil(columns/2))
+	"""
+	(h, w) = biome_map.shape
+	if h % 2 != 0 or w % 2 != 0:
+		biome_map = numpy.pad(biome_map, ((0, h % 2), (0, w % 2)), mode='edge')
+	corners = [biome_map[0::2, 0::2], biome_map[0::2, 1::2], biome_map[1::2, 0::2], biome_map[1::2, 1::2]]
+	## number of times each corner's code appears in its block
+	counts = [sum((c == other).astype(numpy.uint8) for other in corners) for c in corners]
+	out = corners[0].copy()
+	best = counts[0]
+	for (c, n) in zip(corners[1:], counts[1:]):
+		better = n > best
+		numpy.copyto(out, c, where=better)
+		best = numpy.maximum(best, n)
+	return out
+
+def export_biome_tiles(
+		biome_map: numpy.ndarray, output_dir: str, tile_size=256, palette: numpy.ndarray = BIOME_PALETTE,
+		compress_level=6, threads=None
+) -> dict:
+	"""
+	Writes a biome map as a pyramid of paletted PNG tiles ({output_dir}/{zoom}/{x}/{y}.png), skipping the tiles that
+	are unchanged since the previous export to the same folder. Partial tiles at the right and bottom edges are
+	padded with UNKNOWN (code 0).
+	:param biome_map: 2D uint8 array of biome codes (eg the output of biomecalculator.classify_planet_biomes(...))
+	:param output_dir: folder to write the tiles (and the tile manifest) to
+	:param tile_size: width and height of each tile, in pixels
+	:param palette: (N x 3) uint8 RGB palette indexed by biome code, default is biomes.BIOME_PALETTE
+	:param compress_level: zlib compression level (0-9)
+	:param threads: number of tile encoding threads (default: number of CPUs)
+	:return: Returns a dictionary with the number of zoom levels and of tiles written and skipped
+	"""
+	biome_map = numpy.asarray(biome_map)
+	if biome_map.ndim != 2:
+		raise ValueError('biome_map must be a 2D array, not shape %s' % (biome_map.shape,))
+	palette = numpy.asarray(palette, dtype=numpy.uint8)
+	max_code = len(palette) - 1
+	levels = [numpy.minimum(biome_map, max_code).astype(numpy.uint8, copy=False)]
+	while max(levels[-1].shape) > tile_size:
+		levels.append(downsample_mode(levels[-1]))
+	levels.reverse()
+	os.makedirs(output_dir, exist_ok=True)
+	manifest_path = path.join(output_dir, MANIFEST_FILENAME)
+	old_manifest = {}
+	if path.exists(manifest_path):
+		with open(manifest_path, 'r') as fin:
+			old_manifest = json.load(fin)
+	## tiles only count as unchanged if they were made with the same palette, size, and compression
+	settings_hash = hashlib.blake2b(palette.tobytes() + struct.pack('<II', tile_size, compress_level), digest_size=8).hexdigest()
+	old_tiles = old_manifest.get('tiles', {}) if old_manifest.get('settings') == settings_hash else {}
+
+	def export_tile(zoom: int, tx: int, ty: int) -> (str, str, bool):
+		level = levels[zoom]
+		tile = level[ty*tile_size:(ty+1)*tile_size, tx*tile_size:(tx+1)*tile_size]
+		if tile.shape != (tile_size, tile_size):
+			tile = numpy.pad(tile, ((0, tile_size - tile.shape[0]), (0, tile_size - tile.shape[1])))
+		key = '%s/%s/%s' % (zoom, tx, ty)
+		tile_hash = hashlib.blake2b(numpy.ascontiguousarray(tile).data, digest_size=16).hexdigest()
+		filepath = path.join(output_dir, str(zoom), str(tx), '%s.png' % ty)
+		if old_tiles.get(key) == tile_hash and path.exists(filepath):
+			return (key, tile_hash, False)
+		os.makedirs(path.dirname(filepath), exist_ok=True)
+		tmp_filepath = filepath + '.tmp'
+		with open(tmp_filepath, 'wb') as fout:
+			fout.write(encode_paletted_png(tile, palette=palette, compress_level=compress_level))
+		os.replace(tmp_filepath, filepath)
+		return (key, tile_hash, True)
+
+	tiles = {}
+	written = 0
+	with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+		for (zoom, level) in enumerate(levels):
+			(rows, cols) = (-(-level.shape[0] // tile_size), -(-level.shape[1] // tile_size))
+			jobs = [pool.submit(export_tile, zoom, tx, ty) for ty in range(0, rows) for tx in range(0, cols)]
+			for job in jobs:
+				(key, tile_hash, was_written) = job.result()
+				tiles[key] = tile_hash
+				written += int(was_written)
+	manifest = {
+		'settings': settings_hash, 'tile_size': tile_size, 'zoom_levels': len(levels),
+		'shape': list(biome_map.shape), 'tiles': tiles
+	}
+	tmp_manifest_path = manifest_path + '.tmp'
+	with open(tmp_manifest_path, 'w') as fout:
+		json.dump(manifest, fout)
+	os.replace(tmp_manifest_path, manifest_path)
+	return {'zoom_levels': len(levels), 'tiles': len(tiles), 'written': written, 'skipped': len(tiles) - written}
@@ -532,11 +532,11 @@ cdef float dist4f(float a1, float b1, float c1, float d1, float a2, float b2, fl
 cpdef classify_planet_biomes(
     float gravity_m_per_s2,
     float mean_surface_pressure_kPa,
-    float[:] mean_solar_flux_Wpm2,
-    float[:] altitude_m,
-    float[:] mean_temp_C,
-    float[:] temp_var_C,
-    float[:] annual_precip_mm,
+    const float[:] mean_solar_flux_Wpm2,
+    const float[:] altitude_m,
+    const float[:] mean_temp_C,
+    const float[:] temp_var_C,
+    const float[:] annual_precip_mm,
     bint exoplanet,
 ):
     """
@@ -1,4 +1,7 @@
 from enum import Enum, unique
+import numpy
+from numpy import ndarray
+from landcover_codes import *
 
 @unique
 class Biome(Enum):
@@ -65,4 +68,73 @@ def from_IGBP_cover_type(cover_type: int) -> Biome:
 	elif cover_type == 15: return Biome.ICE_SHEET
 	elif cover_type == 16: return Biome.SAND_SEA # could be barren, but 90+% is sand sea
 	elif cover_type == 17: return Biome.FRESHWATER # code 17 is usually ocean, but IGBP is meant for terrestrial analysis only, so if altitude is above sealevel, then it's freshwater
-	else: return Biome.UNKNOWN
\ No newline at end of file
+	else: return Biome.UNKNOWN
+
+## 256-entry lookup tables (land cover code -> biome code) for converting whole uint8 land cover rasters at once
+IGBP_TO_BIOME = numpy.asarray([from_IGBP_cover_type(code).value for code in range(0, 256)], dtype=numpy.uint8)
+
+FAO_LCCS1_TO_BIOME = numpy.zeros((256,), dtype=numpy.uint8)
+for (_codes, _biome) in [
+	([FAO_LCCS1_BARREN], Biome.SAND_SEA), # same as IGBP barren
+	([FAO_LCCS1_PERMANENT_SNOW_AND_ICE], Biome.ICE_SHEET),
+	([FAO_LCCS1_WATER_BODIES], Biome.FRESHWATER),
+	([FAO_LCCS1_EVERGREEN_NEEDLELEAF_FORESTS], Biome.NEEDLELEAF_FOREST),
+	([FAO_LCCS1_EVERGREEN_BROADLEAF_FORESTS], Biome.JUNGLE),
+	([FAO_LCCS1_DECIDUOUS_NEEDLELEAF_FORESTS, FAO_LCCS1_DECIDUOUS_BROADLEAF_FORESTS,
+	  FAO_LCCS1_MIXED_BROADLEAF_NEEDLELEAF_FORESTS, FAO_LCCS1_MIXED_BROADLEAF_EVERGREEN_DECIDUOUS_FORESTS], Biome.SEASONAL_FOREST),
+	([FAO_LCCS1_OPEN_FORESTS, FAO_LCCS1_SPARSE_FORESTS], Biome.GRASSLAND), # like IGBP (woody) savanna
+	([FAO_LCCS1_DENSE_HERBACEOUS, FAO_LCCS1_SPARSE_HERBACEOUS, FAO_LCCS1_SHRUBLAND_GRASSLAND_MOSAICS], Biome.GRASSLAND),
+	([FAO_LCCS1_DENSE_SHRUBLANDS, FAO_LCCS1_SPARSE_SHRUBLANDS], Biome.DESERT_SHRUBLAND),
+]:
+	FAO_LCCS1_TO_BIOME[_codes] = _biome.value
+
+FAO_HYDRO_TO_BIOME = numpy.zeros((256,), dtype=numpy.uint8)
+for (_codes, _biome) in [
+	([FAO_HYDRO_BARREN], Biome.SAND_SEA), # same as IGBP barren
+	([FAO_HYDRO_PERMANENT_SNOW_AND_ICE], Biome.ICE_SHEET),
+	([FAO_HYDRO_WATER_BODIES], Biome.FRESHWATER),
+	([FAO_HYDRO_DENSE_FORESTS], Biome.SEASONAL_FOREST),
+	([FAO_HYDRO_OPEN_FORESTS, FAO_HYDRO_GRASSLANDS], Biome.GRASSLAND),
+	([FAO_HYDRO_WOODY_WETLANDS, FAO_HYDRO_HERBACEOUS_WETLANDS], Biome.WETLAND),
+	([FAO_HYDRO_SHRUBLANDS], Biome.DESERT_SHRUBLAND),
+	([FAO_HYDRO_TUNDRA], Biome.TUNDRA),
+]:
+	FAO_HYDRO_TO_BIOME[_codes] = _biome.value
+del _codes, _biome
+
+def _convert_with_lut(lut: ndarray, codes: ndarray, out: ndarray) -> ndarray:
+	## codes outside 0-255 (eg fill values) are clipped to 0 or 255, which are both UNKNOWN
+	if out is not None and out.dtype != numpy.uint8:
+		## numpy.take(...) would fail with a confusing casting error (eg when converting an int16 raster in place)
+		raise TypeError('out must be a uint8 array, not %s (only uint8 codes can be converted in place)' % out.dtype)
+	return numpy.take(lut, codes, out=out, mode='clip')
+
+def biomes_from_IGBP_cover_types(cover_types: ndarray, out: ndarray = None) -> ndarray:
+	"""
+	Converts a raster of IGBP land cover types to biome codes (same as from_IGBP_cover_type(...) for every pixel)
+	:param cover_types: integer array of IGBP land cover codes
+	:param out: optional uint8 array to write the biome codes to (can be cover_types itself to convert in place, but only if
+		it is a uint8 array)
+	:return: uint8 array of biome codes
+	"""
+	return _convert_with_lut(IGBP_TO_BIOME, cover_types, out)
+
+def biomes_from_FAO_LCCS1_cover_types(cover_types: ndarray, out: ndarray = None) -> ndarray:
+	"""
+	Converts a raster of FAO-LCCS1 land cover types (MCD12Q1 LC_Prop1) to biome codes
+	:param cover_types: integer array of FAO-LCCS1 land cover codes
+	:param out: optional uint8 array to write the biome codes to (can be cover_types itself to convert in place, but only if
+		it is a uint8 array)
+	:return: uint8 array of biome codes
+	"""
+	return _convert_with_lut(FAO_LCCS1_TO_BIOME, cover_types, out)
+
+def biomes_from_FAO_hydrology_types(hydro_types: ndarray, out: ndarray = None) -> ndarray:
+	"""
+	Converts a raster of FAO-LCCS3 surface hydrology types (MCD12Q1 LC_Prop3) to biome codes
+	:param hydro_types: integer array of FAO-LCCS3 surface hydrology codes
+	:param out: optional uint8 array to write the biome codes to (can be hydro_types itself to convert in place, but only if
+		it is a uint8 array)
+	:return: uint8 array of biome codes
+	"""
+	return _convert_with_lut(FAO_HYDRO_TO_BIOME, hydro_types, out)
@@ -1,6 +1,6 @@
 #!/usr/bin/python3.9
 
-import os, shutil, sys, re, requests, base64, urllib.parse, numpy, pandas, json, pickle, ssl, time
+import os, shutil, sys, re, requests, base64, urllib.parse, numpy, pandas, json, pickle, ssl, time, threading, queue
 import gzip, h5py
 from os import path
 from zipfile import ZipFile
@@ -12,11 +12,15 @@ from numpy import ndarray, nan, float32
 from pandas import DataFrame
 from matplotlib import pyplot
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from streaming_stats import WelfordAccumulator, StreamingStatsCheckpoint
 
 def main():
 	print("Starting %s..." % sys.argv[0])
 	# find and download data
 	data_dir = 'data'
+	stats_checkpoint_interval = 10 # number of days aggregated between checkpoints of the LST and GPM statistics
+	read_threads = os.cpu_count() or 1 # number of threads for reading (and decoding) each downloaded raster
 	secrets = pandas.read_csv('../secrets/pw.csv')
 	username = secrets['username'][0] #input('Earth Data Username: ')
 	password = secrets['password'][0] #input('Earth Data Password: ')
@@ -54,7 +58,7 @@ def main():
 			start_date='2020-01-01', end_date='2020-12-31', dest_dirpath=modis_dir,
 			username=username, password=password, dtype=numpy.uint8, nodata=255,
 			downsample = 4, sample_strat = 'mode', delete_files = True,
-			zpickle_file = None, retry_limit = 5, retry_delay = 10
+			zpickle_file = None, retry_limit = 5, retry_delay = 10, threads = read_threads
 		)
 		igbp_map = numpy.flip(maps[0], axis=0)
 		maps[0] = None # let the GC free up some memory
@@ -143,40 +147,52 @@ def main():
 			LST_mercator_zpickle = path.join(data_dir, 'LST_5km_mercator_singrid.pickle.gz')
 			LST_mercator_rng_zpickle = path.join(data_dir, 'LST_variance_5km_mercator_singrid.pickle.gz')
 			if not path.exists(LST_mercator_zpickle) or not path.exists(LST_mercator_rng_zpickle):
-				std_aggregate = None
 				for year in [2015]:
+					stats_checkpoint = StreamingStatsCheckpoint(
+						path.join(dl_dir, 'LST_stats_agg'), checkpoint_interval=stats_checkpoint_interval
+					)
+					## import progress saved by older versions of this script
 					data_saver = path.join(dl_dir, 'LST_stats_agg.pickle.gz')
 					doy_saver = path.join(dl_dir, 'LST_doy.pickle.gz')
-					if path.exists(doy_saver) and path.exists(data_saver):
-						doy_start = int(zunpickle(doy_saver))
-						std_aggregate = zunpickle(data_saver)
+					if stats_checkpoint.progress is None and path.exists(doy_saver) and path.exists(data_saver):
+						stats_checkpoint.import_aggregate(zunpickle(data_saver), progress=int(zunpickle(doy_saver)))
+					if stats_checkpoint.progress is not None:
+						doy_start = int(stats_checkpoint.progress)
 					else:
 						doy_start = 1
-					for doy in range(doy_start, 366):
+					## download, decode, and aggregate are pipelined so that the next day downloads while the current
+					## day decodes and the previous day is folded into the aggregate (the aggregate and progress are
+					## only updated from this thread and always in day order, so resuming from the checkpoint still works)
+					def download_LST_day(doy):
 						date = datetime(year=year, month=1, day=1) + timedelta(days=doy - 1)
 						date_str = '%s-%s-%s' % (date.year, left_pad(date.month, '0', 2), left_pad(date.day, '0', 2))
 						retries = 3
 						while (retries := retries-1) > 0:
 							try:
-								lst_data: ndarray = numpy.flip(retrieve_MODIS_global_product(
-									'MOD11C1', '006', subset_indices=[0],
+								return doy, download_MODIS_product_files(
+									'MOD11C1', '006',
 									start_date=date_str, end_date=date_str,
 									dest_dirpath=dl_dir, username=username, password=password,
-									delete_files=doy > 3,
-									dtype=numpy.float32, nodata=numpy.nan,
 									retry_limit=5, retry_delay=10
-								)[0], axis=0) - 273.15
-								break
+								)
 							except Exception as e:
 								print(e, file=sys.stderr)
-						lst_data: ndarray = numpy.ma.masked_array(lst_data, lst_data < -200).filled(nan)
-						if std_aggregate is None:
-							std_aggregate = streaming_std_dev_start(shape=lst_data.shape)
-						std_aggregate = streaming_std_dev_update(std_aggregate, lst_data)
-						zpickle(std_aggregate, data_saver)
-						zpickle(doy+1, doy_saver)
+						raise Exception('Failed to download MOD11C1 data for %s' % date_str)
+					def decode_LST_day(doy_files):
+						(doy, filepaths) = doy_files
+						lst_data: ndarray = numpy.flip(read_MODIS_global_product_files(
+							filepaths, 'MOD11C1', '006', subset_indices=[0],
+							dest_dirpath=dl_dir, delete_files=doy > 3,
+							dtype=numpy.float32, nodata=numpy.nan, threads=read_threads
+						)[0], axis=0) - 273.15
+						lst_data[lst_data < -200] = nan
+						return doy, lst_data
+					for doy, lst_data in pipelined(range(doy_start, 366), [download_LST_day, decode_LST_day], queue_size=2):
+						stats_checkpoint.update(lst_data, progress=doy+1)
+						del lst_data
 						#imshow(lst_data)
-				(mean, _variance, sampleVariance) = streaming_std_dev_finalize(std_aggregate)
+					stats_checkpoint.commit()
+				(mean, _variance, sampleVariance) = stats_checkpoint.finalize()
 				del _variance
 				zpickle(mean, LST_mercator_zpickle)
 				zpickle(sampleVariance, LST_mercator_rng_zpickle)
@@ -218,7 +234,7 @@ def main():
 					)
 				dl_dir = path.join(data_dir, 'MODIS_AQUA')
 				os.makedirs(dl_dir, exist_ok=True)
-				std_aggregate = streaming_std_dev_start(shape=(4320, 8640))
+				sst_stats = WelfordAccumulator.zeros(shape=(4320, 8640))
 				for year in [2015]:
 					for doy in range(1,366):
 						date = datetime(year=year, month=1, day=1)+timedelta(days=doy-1)
@@ -235,16 +251,16 @@ def main():
 						sst_ds: gdal.Dataset = gdal.Open(sst_file)
 						sst_index = 0
 						scale = 0.0049999999
-						sst_data = numpy.flip(extract_data_from_ds(sst_ds, sst_index, dtype=float32, nodata=nan), axis=0)
+						sst_data = numpy.flip(extract_data_from_ds(sst_ds, sst_index, dtype=float32, nodata=nan, threads=read_threads), axis=0)
 						sst_data = sst_data * scale
 						sst_data = numpy.ma.masked_array(sst_data, mask=sst_data<-100).filled(nan)
 						#imshow(sst_data[0::10, 0::10])
-						std_aggregate = streaming_std_dev_update(std_aggregate, sst_data)
+						sst_stats.update(sst_data)
 						del sst_data
 						del sst_ds # <- so stupid that THIS is the way you close the file when using GDAL!
 						if doy > 3:
 							os.remove(sst_file) # delete to save HD space
-				(mean, _variance, sampleVariance) = streaming_std_dev_finalize(std_aggregate)
+				(mean, _variance, sampleVariance) = sst_stats.finalize()
 				del _variance
 				zpickle(mean, SST_mercator_zpickle)
 				zpickle(sampleVariance, SST_mercator_rng_zpickle)
@@ -304,16 +320,19 @@ def main():
 			gpm_mean_merc = zunpickle(gpm_mean_zp)
 			gpm_var_merc = zunpickle(gpm_var_zp)
 		else:
+			stats_checkpoint = StreamingStatsCheckpoint(
+				path.join(dl_dir, 'GPM_stats_agg'), checkpoint_interval=stats_checkpoint_interval
+			)
+			## import progress saved by older versions of this script
 			progress_pickle = path.join(dl_dir, 'GPM_progress_year_doy.pickle.gz')
-			if path.exists(progress_pickle):
+			data_saver = path.join(dl_dir, 'GPM_stats_agg.pickle.gz')
+			if stats_checkpoint.progress is None and path.exists(progress_pickle) and path.exists(data_saver):
 				(years, doy_start) = zunpickle(progress_pickle)
+				stats_checkpoint.import_aggregate(zunpickle(data_saver), progress=[list(years), doy_start])
+			if stats_checkpoint.progress is not None:
+				(years, doy_start) = stats_checkpoint.progress
 			else:
 				(years, doy_start) = ([2015], 1)
-				zpickle((years, doy_start), progress_pickle)
-			std_aggregate = None
-			data_saver = path.join(dl_dir, 'GPM_stats_agg.pickle.gz')
-			if path.exists(data_saver):
-				std_aggregate = zunpickle(data_saver)
 			for y in range(0,len(years)):
 				year = years[y]
 				for doy in range(doy_start, 366):
@@ -324,7 +343,7 @@ def main():
 							gpm_data: ndarray = download_GPM_final_product(
 								year=date.year, month=date.month, day=date.day,
 								dest_dirpath=dl_dir, username=username, password=password,
-								delete_file=doy > 3
+								delete_file=doy > 3, threads=read_threads
 							)
 							# imshow(gpm_data)
 							break
@@ -334,13 +353,9 @@ def main():
 					gpm_data: ndarray = numpy.ma.masked_array(gpm_data, mask=gpm_data < 0).filled(nan)
 					# print('gpm_data.shape ==', gpm_data.shape)
 					# NOTE: GPM data is (lon,lat), not (lat,lon)
-					if std_aggregate is None:
-						std_aggregate = streaming_std_dev_start(shape=gpm_data.shape)
-					std_aggregate = streaming_std_dev_update(std_aggregate, gpm_data)
-					zpickle(std_aggregate, data_saver)
-					zpickle((years, doy+1), progress_pickle)
-				zpickle((years[y+1:], 1), progress_pickle)
-			(gpm_mean_merc, _variance, gpm_var_merc) = streaming_std_dev_finalize(std_aggregate)
+					stats_checkpoint.update(gpm_data, progress=[years, doy+1])
+				stats_checkpoint.commit(progress=[years[y+1:], 1])
+			(gpm_mean_merc, _variance, gpm_var_merc) = stats_checkpoint.finalize()
 			del _variance
 			# imshow(gpm_mean_merc.T)
 			# imshow(gpm_var_merc.T)
@@ -397,33 +412,66 @@ def zunpickle(filepath):
 	else:
 		raise FileNotFoundError("file '%s' does not exist" % filepath)
 
-def streaming_std_dev_start(shape, dtype=numpy.float64):
-	count = numpy.zeros(shape, dtype=numpy.int32)
-	mean = numpy.zeros(shape, dtype=dtype)
-	M2 = numpy.zeros(shape, dtype=dtype)
-	return (count, mean, M2)
-
-def streaming_std_dev_update(existingAggregate, newValue):
-	(count, mean, M2) = existingAggregate
-	mask = numpy.logical_not(numpy.isfinite(newValue)) # use mask to avoid changing values where new-val is nan
-	newValue = numpy.ma.masked_array(newValue, mask=mask)
-	count = numpy.ma.masked_array(count, mask=mask)
-	mean = numpy.ma.masked_array(mean, mask=mask)
-	M2 = numpy.ma.masked_array(M2, mask=mask)
-	count += 1
-	delta = newValue - mean
-	mean += delta / count
-	delta2 = newValue - mean
-	M2 += delta * delta2
-	return (numpy.asarray(count), numpy.asarray(mean), numpy.asarray(M2))
-
-def streaming_std_dev_finalize(existingAggregate):
-	(count, mean, M2) = existingAggregate
-	mask = count < 2
-	mean_mask = count <= 0
-	c = numpy.ma.masked_array(count, mask=mask, dtype=float32).filled(nan)
-	(mean, variance, sampleVariance) = (mean, M2 / c, M2 / (c - 1))
-	return (numpy.ma.masked_array(mean, mask=mean_mask).filled(nan), variance, sampleVariance)
+class _PipelineFailure:
+	def __init__(self, ex: BaseException):
+		self.ex = ex
+
+_PIPELINE_END = object()
+
+def pipelined(items, stages, queue_size=2):
+	"""
+	Runs every item through a chain of stage functions (eg download -> decode), with each stage running in its own
+	thread and connected to the next stage by a bounded queue, so that different items are in different stages at the
+	same time. Results of the last stage are yielded in the same order as the input items. If any stage raises an
+	exception, the exception is re-raised by this generator after all previously completed items have been yielded.
+
+	:param items: iterable of inputs for the first stage
+	:param stages: list of single-argument functions, the output of each is the input of the next
+	:param queue_size: max number of finished items waiting between two stages (limits memory use)
+	:return: generator of outputs of the last stage
+	"""
+	stop = threading.Event()
+	queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+	def put(q: queue.Queue, obj) -> bool:
+		while not stop.is_set():
+			try:
+				q.put(obj, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+	def drain(q: queue.Queue):
+		while not stop.is_set():
+			try:
+				obj = q.get(timeout=0.1)
+			except queue.Empty:
+				continue
+			if obj is _PIPELINE_END:
+				return
+			yield obj
+	def run_stage(i):
+		source = iter(items) if i == 0 else drain(queues[i-1])
+		try:
+			for obj in source:
+				if isinstance(obj, _PipelineFailure):
+					put(queues[i], obj)
+					return
+				if not put(queues[i], stages[i](obj)):
+					return
+		except BaseException as e:
+			put(queues[i], _PipelineFailure(e))
+			return
+		put(queues[i], _PIPELINE_END)
+	workers = [threading.Thread(target=run_stage, args=(i,), daemon=True) for i in range(len(stages))]
+	for w in workers:
+		w.start()
+	try:
+		for obj in drain(queues[-1]):
+			if isinstance(obj, _PipelineFailure):
+				raise obj.ex
+			yield obj
+	finally:
+		stop.set()
 
 def lat_lon_to_singrid_YX(lat_lon, height_width):
 	# X(lat,lon) = (w/2)*(1 + cos(lat)*sin(lon))
@@ -547,12 +595,27 @@ def retrieve_MODIS_global_product(
 		dest_dirpath, username, password,
 		delete_files=False,
 		dtype=numpy.float32, nodata=numpy.nan,
-		retry_limit=5, retry_delay=10
+		retry_limit=5, retry_delay=10, threads=1
 ):
 	## NOTE: y=0 is north, positive y is south direction, x=0 is west, positive x is east direction
 	## NOTE: ndarray dimension order = data[y][x]
-	output_maps: [ndarray] = []
+	filepaths = download_MODIS_product_files(
+		short_name, version, start_date, end_date, dest_dirpath, username, password,
+		retry_limit=retry_limit, retry_delay=retry_delay
+	)
+	output_maps = read_MODIS_global_product_files(
+		filepaths, short_name, version, subset_indices, dest_dirpath,
+		delete_files=delete_files, dtype=dtype, nodata=nodata, threads=threads
+	)
+	print('...Download complete!')
+	return output_maps
 
+def download_MODIS_product_files(
+		short_name, version, start_date, end_date, dest_dirpath, username, password,
+		retry_limit=5, retry_delay=10
+) -> [str]:
+	## downloads the granules (if not already downloaded) and returns the list of local file paths
+	filepaths: [str] = []
 	os.makedirs(dest_dirpath, exist_ok=True)
 	modis_session = ModisSession(username=username, password=password)
 	# Query the MODIS catalog for collections
@@ -581,8 +644,19 @@ def retrieve_MODIS_global_product(
 					break
 
 		if not path.exists(filepath):
-			print('failed to download %s' % filename)
-			exit(1)
+			raise IOError('failed to download %s' % filename)
+		filepaths.append(filepath)
+	return filepaths
+
+def read_MODIS_global_product_files(
+		filepaths, short_name, version, subset_indices, dest_dirpath,
+		delete_files=False,
+		dtype=numpy.float32, nodata=numpy.nan, threads=1
+) -> [ndarray]:
+	## NOTE: y=0 is north, positive y is south direction, x=0 is west, positive x is east direction
+	## NOTE: ndarray dimension order = data[y][x]
+	output_maps: [ndarray] = []
+	for filepath in filepaths:
 		ds: gdal.Dataset = gdal.Open(filepath)
 		#print_modis_structure(ds)
 		row=[]
@@ -592,7 +666,9 @@ def retrieve_MODIS_global_product(
 			tile_meta: {} = tile_ds.GetMetadata_Dict()
 			del tile_ds
 			json_fp = path.join(dest_dirpath, '%s_%s_subset-%s.json' % (short_name, version, subset_index))
-			tile_data = extract_data_from_ds(ds, subset_index, metadata_filepath=json_fp, dtype=dtype, nodata=nodata)
+			tile_data = extract_data_from_ds(
+				ds, subset_index, metadata_filepath=json_fp, dtype=dtype, nodata=nodata, threads=threads
+			)
 			if len(subset_indices) == 1:
 				output_maps.append(tile_data)
 			else:
@@ -607,14 +683,12 @@ def retrieve_MODIS_global_product(
 		if delete_files:
 			os.remove(filepath)
 			print('\t','extraction complete, file deleted.')
-	#GranuleHandler.download_from_granules(granules, modis_session, path='data')
-	print('...Download complete!')
 	return output_maps
 
 def retrieve_MODIS_500m_product(short_name, version, subset_indices, start_date, end_date, dest_dirpath, username, password,
 								downsample: int = 10, sample_strat='mean', delete_files=False,
 								dtype=numpy.float32, nodata=numpy.nan,
-								zpickle_file=None, retry_limit=5, retry_delay=10):
+								zpickle_file=None, retry_limit=5, retry_delay=10, threads=1):
 	## NOTE: MODIS tile grid explained at https://modis-land.gsfc.nasa.gov/MODLAND_grid.html
 	if zpickle_file is not None and path.exists(zpickle_file):
 		print('%s already exists. Skipping download.' % zpickle_file)
@@ -695,7 +769,7 @@ def retrieve_MODIS_500m_product(short_name, version, subset_indices, start_date,
 			json_fp = path.join(dest_dirpath, '%s_%s_subset-%s.json' % (short_name, version, subset_index))
 			tile_hori_pos = int(tile_meta['HORIZONTALTILENUMBER'])
 			tile_vert_pos = int(tile_meta['VERTICALTILENUMBER'])
-			tile_data = extract_data_from_ds(ds, subset_index, metadata_filepath=json_fp)
+			tile_data = extract_data_from_ds(ds, subset_index, metadata_filepath=json_fp, threads=threads)
 			#print('Data shape:',tile_data.shape)
 			# pyplot.imshow(tile_data, aspect='auto')
 			# pyplot.show()
@@ -727,8 +801,12 @@ def retrieve_MODIS_500m_product(short_name, version, subset_indices, start_date,
 			print('Saved %s' % zpickle_file)
 	return output_maps
 
-def extract_data_from_ds(ds: gdal.Dataset, subset_index: int, valid_range=(-numpy.inf, numpy.inf), dtype=numpy.float32, nodata=numpy.nan, metadata_filepath=None) -> ndarray:
-	tile_ds: gdal.Dataset = gdal.Open(ds.GetSubDatasets()[subset_index][0])
+def extract_data_from_ds(
+		ds: gdal.Dataset, subset_index: int, valid_range=(-numpy.inf, numpy.inf), dtype=numpy.float32, nodata=numpy.nan,
+		metadata_filepath=None, offset=0, mask_fill_value=False, threads=1, out: ndarray = None
+) -> ndarray:
+	subdataset_name = ds.GetSubDatasets()[subset_index][0]
+	tile_ds: gdal.Dataset = gdal.Open(subdataset_name)
 	tile_meta: {} = tile_ds.GetMetadata_Dict()
 	if metadata_filepath is not None:
 		json_fp = metadata_filepath
@@ -745,15 +823,87 @@ def extract_data_from_ds(ds: gdal.Dataset, subset_index: int, valid_range=(-nump
 			valid_range = [float(n) for n in tile_meta['valid_range'].split(', ')]
 		else:
 			valid_range = [-numpy.inf, numpy.inf]
-	tile_data_raw: ndarray = tile_ds.ReadAsArray()
-	## mask and scale
-	tile_data = numpy.ma.array(
-		tile_data_raw,
-		mask=numpy.logical_or(tile_data_raw < valid_range[0],tile_data_raw > valid_range[1])
-	).astype(dtype).filled(nodata) * scale_factor
-	del tile_data_raw
+	fill_value = None
+	if mask_fill_value:
+		fill_value = tile_ds.GetRasterBand(1).GetNoDataValue()
+		if fill_value is None and '_FillValue' in tile_meta:
+			fill_value = float(tile_meta['_FillValue'])
 	del tile_ds
-	return tile_data
+	## mask and scale block by block
+	return read_band_windowed(
+		subdataset_name, scale=scale_factor, offset=offset, valid_range=valid_range, fill_value=fill_value,
+		dtype=dtype, nodata=nodata, threads=threads, out=out
+	)
+
+def read_band_windowed(
+		dataset_name: str, band_index=1, scale=1, offset=0, valid_range=(-numpy.inf, numpy.inf), fill_value=None,
+		dtype=numpy.float32, nodata=numpy.nan, window_pixels=4194304, threads=1, out: ndarray = None
+) -> ndarray:
+	"""
+	Reads a raster band (eg an HDF subdataset or GeoTIFF) in windows that follow the band's native block (chunk) size,
+	so that the raw data is never held in memory all at once. Each window is masked and scaled as it is read:
+	raw values outside of valid_range or equal to fill_value become nodata, all other values become
+	raw * scale + offset.
+
+	GDAL datasets are not thread-safe, so when threads > 1 each worker thread opens its own handle to the dataset.
+
+	:param dataset_name: file path or GDAL subdataset name
+	:param band_index: raster band number (starting at 1)
+	:param scale: scale factor applied to valid raw values
+	:param offset: offset added to valid scaled values
+	:param valid_range: (min, max) range of valid raw values (inclusive)
+	:param fill_value: raw value that marks missing data (or None)
+	:param dtype: output data type
+	:param nodata: output value for invalid pixels
+	:param window_pixels: approximate max number of pixels to read per window (rounded to whole blocks)
+	:param threads: number of threads to read and process windows with
+	:param out: optional pre-allocated (or memory-mapped) output array to write into
+	:return: 2D array of the band data
+	"""
+	ds: gdal.Dataset = gdal.Open(dataset_name)
+	band: gdal.Band = ds.GetRasterBand(band_index)
+	(width, height) = (band.XSize, band.YSize)
+	(block_w, block_h) = band.GetBlockSize()
+	del band
+	del ds
+	if out is None:
+		out = numpy.empty((height, width), dtype=dtype)
+	elif out.shape != (height, width):
+		raise ValueError('output array shape %s does not match band shape %s' % (out.shape, (height, width)))
+	## windows are whole rows of blocks when that fits the window size, otherwise one row of blocks split into columns
+	block_w = max(1, min(block_w, width))
+	block_h = max(1, min(block_h, height))
+	if block_h * width <= window_pixels:
+		(win_w, win_h) = (width, block_h * max(1, window_pixels // (block_h * width)))
+	else:
+		(win_w, win_h) = (block_w * max(1, window_pixels // (block_h * block_w)), block_h)
+	windows = [
+		(x, y, min(win_w, width - x), min(win_h, height - y))
+		for y in range(0, height, win_h) for x in range(0, width, win_w)
+	]
+	local = threading.local()
+	def read_window(window):
+		(x, y, w, h) = window
+		if not hasattr(local, 'band'):
+			local.ds = gdal.Open(dataset_name)
+			local.band = local.ds.GetRasterBand(band_index)
+		raw: ndarray = local.band.ReadAsArray(x, y, w, h)
+		invalid = numpy.logical_or(raw < valid_range[0], raw > valid_range[1])
+		if fill_value is not None:
+			invalid |= raw == fill_value
+		dest = out[y:y+h, x:x+w]
+		numpy.multiply(raw, scale, out=dest, casting='unsafe')
+		if offset != 0:
+			numpy.add(dest, offset, out=dest, casting='unsafe')
+		dest[invalid] = nodata
+	if threads > 1:
+		with ThreadPoolExecutor(max_workers=threads) as executor:
+			for _ in executor.map(read_window, windows):
+				pass
+	else:
+		for window in windows:
+			read_window(window)
+	return out
 
 
 def print_modis_structure(dataset: gdal.Dataset):
@@ -762,7 +912,9 @@ def print_modis_structure(dataset: gdal.Dataset):
 	print(dataset.GetDescription(), json.dumps(metadata_dict, indent="  "))
 
 
-def download_GPM_final_product(year, month, day, dest_dirpath, username, password, delete_file=False, dtype=float32, nodata=nan):
+def download_GPM_final_product(
+		year, month, day, dest_dirpath, username, password, delete_file=False, dtype=float32, nodata=nan, threads=1
+):
 	# wget --load-cookies /.urs_cookies --save-cookies /root/.urs_cookies --auth-no-challenge=on --user=your_user_name --ask-password --content-disposition -i <url text file>
 	http_session = requests.session()
 	src_url = 'https://gpm1.gesdisc.eosdis.nasa.gov/data/GPM_L3/GPM_3IMERGDF.06/%s/%s/3B-DAY.MS.MRG.3IMERG.%s%s%s-S000000-E235959.V06.nc4' % (
@@ -782,7 +934,7 @@ def download_GPM_final_product(year, month, day, dest_dirpath, username, passwor
 				f.write(chunk)
 	print('...Download complete!')
 	gpm_ds = gdal.Open(dest_filepath)
-	gpm_data = extract_data_from_ds(gpm_ds, subset_index=0, dtype=dtype, nodata=nodata)
+	gpm_data = extract_data_from_ds(gpm_ds, subset_index=0, dtype=dtype, nodata=nodata, threads=threads)
 	del gpm_ds
 	if delete_file:
 		os.remove(dest_filepath)
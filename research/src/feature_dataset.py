@@ -0,0 +1,169 @@
+import os, numpy, pandas
+from os import path
+from numpy import ndarray, uint8, float32
+from pandas import DataFrame
+import pyarrow
+import pyarrow.parquet as parquet
+
+## On-disk columnar (Parquet) data set of per-pixel features and biome labels. Rows are appended one tile at a time,
+## with every tile written as its own row group (with min/max statistics per column), so that the data set can be
+## written without ever holding the whole table in memory, and scanned or sampled one row group at a time.
+
+FEATURE_COLUMNS = [
+	('gravity', float32),
+	('solar_flux', float32),
+	('pressure', float32),
+	('altitude', float32),
+	('temperature_mean', float32),
+	('temperature_range', float32),
+	('precipitation', float32),
+	('biome', uint8)
+]
+
+FEATURE_SCHEMA = pyarrow.schema([(name, pyarrow.from_numpy_dtype(dtype)) for (name, dtype) in FEATURE_COLUMNS])
+
+
+class FeatureDatasetWriter:
+	"""
+	Streams rows of features and labels to a Parquet file. Rows with NaN in any column are dropped as they are
+	appended. The file is written to a temporary path and moved into place when the writer is closed, so an
+	interrupted extraction never leaves a truncated data set behind.
+
+	Usage:
+		with FeatureDatasetWriter('data/Earth_biome_features.parquet') as writer:
+			for tile in tiles:
+				writer.append({'gravity': ..., 'solar_flux': ..., ..., 'biome': ...})
+
+	:param filepath: destination .parquet file
+	:param compression: Parquet compression codec
+	"""
+	def __init__(self, filepath: str, compression='zstd'):
+		self.filepath = filepath
+		self.row_count = 0
+		self._tmp_filepath = filepath + '.tmp'
+		os.makedirs(path.dirname(path.abspath(filepath)), exist_ok=True)
+		self._writer = parquet.ParquetWriter(
+			self._tmp_filepath, FEATURE_SCHEMA, compression=compression, write_statistics=True
+		)
+
+	def append(self, columns: {str: ndarray}) -> int:
+		"""
+		Appends a block of rows (one row per array element) as a new row group.
+
+		:param columns: dictionary of column name -> array for every column in FEATURE_COLUMNS (all the same size)
+		:return: number of rows written (after dropping rows with NaN values)
+		"""
+		arrays = {name: numpy.asarray(columns[name]).reshape((-1,)) for (name, _) in FEATURE_COLUMNS}
+		keep = None
+		for (name, dtype) in FEATURE_COLUMNS:
+			if arrays[name].dtype.kind == 'f':
+				nans = numpy.isnan(arrays[name])
+				keep = nans if keep is None else numpy.logical_or(keep, nans, out=keep)
+		if keep is not None:
+			keep = numpy.logical_not(keep, out=keep)
+		n = int(numpy.count_nonzero(keep)) if keep is not None else len(arrays['biome'])
+		if n == 0:
+			return 0
+		table = pyarrow.table(
+			[pyarrow.array((arrays[name] if keep is None else arrays[name][keep]).astype(dtype, copy=False)) for (name, dtype) in FEATURE_COLUMNS],
+			schema=FEATURE_SCHEMA
+		)
+		self._writer.write_table(table, row_group_size=n)
+		self.row_count += n
+		return n
+
+	def close(self):
+		if self._writer is not None:
+			self._writer.close()
+			self._writer = None
+			os.replace(self._tmp_filepath, self.filepath)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		if exc_type is None:
+			self.close()
+		else:
+			## discard the incomplete data set
+			self._writer.close()
+			self._writer = None
+			os.remove(self._tmp_filepath)
+
+
+def _row_groups_in_range(pfile: parquet.ParquetFile, column_ranges: {str: (float, float)}) -> [int]:
+	## uses the row group statistics to skip row groups that can't contain any values in the given (inclusive) ranges
+	if column_ranges is None or len(column_ranges) == 0:
+		return list(range(0, pfile.num_row_groups))
+	names = pfile.schema_arrow.names
+	selected = []
+	for rg in range(0, pfile.num_row_groups):
+		meta = pfile.metadata.row_group(rg)
+		in_range = True
+		for (name, (lo, hi)) in column_ranges.items():
+			stats = meta.column(names.index(name)).statistics
+			if stats is not None and stats.has_min_max and (stats.max < lo or stats.min > hi):
+				in_range = False
+				break
+		if in_range:
+			selected.append(rg)
+	return selected
+
+def _filter_rows(df: DataFrame, column_ranges: {str: (float, float)}) -> DataFrame:
+	if column_ranges is None or len(column_ranges) == 0:
+		return df
+	mask = numpy.ones((len(df),), dtype=bool)
+	for (name, (lo, hi)) in column_ranges.items():
+		col = df[name].to_numpy()
+		mask &= (col >= lo) & (col <= hi)
+	return df[mask]
+
+def scan_feature_dataset(filepath: str, columns: [str] = None, column_ranges: {str: (float, float)} = None):
+	"""
+	Generator of DataFrames, one per row group, for streaming through a feature data set without loading the whole
+	table.
+
+	:param filepath: .parquet feature data set
+	:param columns: columns to read (default: all)
+	:param column_ranges: optional dictionary of column name -> (min, max) to only return rows within those
+		(inclusive) ranges; row groups that can't contain matching rows (according to their statistics) are skipped
+		without being read
+	"""
+	pfile = parquet.ParquetFile(filepath)
+	read_columns = _read_columns(columns, column_ranges)
+	for rg in _row_groups_in_range(pfile, column_ranges):
+		df = _filter_rows(pfile.read_row_group(rg, columns=read_columns).to_pandas(), column_ranges)
+		yield df if columns is None else df[columns]
+
+def sample_feature_dataset(
+		filepath: str, fraction: float, columns: [str] = None, column_ranges: {str: (float, float)} = None, seed=None
+) -> DataFrame:
+	"""
+	Randomly samples approximately the given fraction of the rows of a feature data set, reading one row group at a
+	time (so only the sampled rows are ever held in memory together).
+
+	:param filepath: .parquet feature data set
+	:param fraction: probability of each row being included in the sample (0-1)
+	:param columns: columns to read (default: all)
+	:param column_ranges: optional row filter, see scan_feature_dataset(...)
+	:param seed: random seed (or numpy Generator) for reproducible sampling
+	:return: DataFrame of the sampled rows
+	"""
+	rng = numpy.random.default_rng(seed)
+	parts = []
+	for df in scan_feature_dataset(filepath, columns=columns, column_ranges=column_ranges):
+		parts.append(df[rng.random(len(df)) < fraction])
+	if len(parts) == 0:
+		return DataFrame({name: numpy.zeros((0,), dtype=dtype) for (name, dtype) in FEATURE_COLUMNS if columns is None or name in columns})
+	return pandas.concat(parts, ignore_index=True)
+
+def feature_dataset_row_count(filepath: str) -> int:
+	return parquet.ParquetFile(filepath).metadata.num_rows
+
+def _read_columns(columns: [str], column_ranges: {str: (float, float)}):
+	if columns is None:
+		return None
+	read_columns = list(columns)
+	if column_ranges is not None:
+		read_columns += [name for name in column_ranges if name not in read_columns]
+	return read_columns
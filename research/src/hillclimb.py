@@ -1,4 +1,5 @@
-import numpy
+import os, time, numpy
+from concurrent.futures import ThreadPoolExecutor
 
 def minimize(
 	f, p0, precision=1e-5, iteration_limit=100000
@@ -98,6 +99,309 @@ def maximize(
 		return -1*f(*params)
 	return minimize(f=wrapper, p0=p0, precision=precision, iteration_limit=iteration_limit)
 
+def minimize_parallel(
+	f, p0, precision=1e-5, iteration_limit=100000, batch_f=None, executor=None, max_workers=None, verbose=True
+):
+	"""
+		Parallel version of minimize(...). Each iteration, all four candidate
+		moves (short and long jumps left and right) of every parameter are
+		generated from the current parameters and evaluated concurrently,
+		either with a batched objective function or with an executor (thread
+		or process pool). Each parameter's step size is then adapted with the
+		same rules as minimize(...) (shrink if no move helped, expand if a long
+		jump was best). All of the improving moves are then tried together and
+		the combined move is kept if it is at least as good as the best single
+		move, otherwise only the best single move is made.
+
+		Assumes ``Y = f(*params)``.
+
+		Parameters
+		----------
+		f : callable
+			The cost function, f(...). It must take the parameters to
+			fit as arguments. It must be safe to call concurrently (and be
+			picklable if executor is a process pool).
+		p0 : array_like
+			Initial guess for the parameters (length N)
+		precision : float (optional, default = 0.00001)
+			Keep tuning the parameters until the parameters are within this
+			epsilon of the local optimum
+		iteration_limit : int (optional, default = 100000)
+			Give up after this many iterations
+		batch_f : callable (optional)
+			Batched cost function, ``Y = batch_f(P)`` where P is a (M, N) array
+			of M parameter vectors and Y is an array of the M costs. If given,
+			it is used instead of f and executor.
+		executor : concurrent.futures.Executor (optional)
+			Executor to evaluate f with (default: a thread pool)
+		max_workers : int (optional)
+			Number of threads for the default thread pool
+		verbose : bool (optional, default = True)
+			Print progress and the evaluation rate
+
+		Returns
+		-------
+		popt : array
+			Optimal values for the parameters so that the result of
+			``f(*popt)`` is minimized.
+		num_iters :int
+			Number of iterations used to reach the optimum parameter values
+	"""
+	p0 = numpy.asarray(p0, dtype=numpy.float64)
+	num_params = len(p0)
+	params = p0.copy()
+	jump_size = numpy.zeros_like(p0) + 16*precision
+	own_executor = None
+	if batch_f is None:
+		if executor is None:
+			executor = own_executor = ThreadPoolExecutor(max_workers=max_workers)
+		workers = getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+		def evaluate(p_stack):
+			chunksize = max(1, len(p_stack) // (4 * workers))
+			return numpy.asarray(list(executor.map(_StarCall(f), p_stack, chunksize=chunksize)), dtype=numpy.float64)
+	else:
+		def evaluate(p_stack):
+			return numpy.asarray(batch_f(p_stack), dtype=numpy.float64).reshape((len(p_stack),))
+	eval_count = 0
+	start_time = time.perf_counter()
+	try:
+		base_val = evaluate(params.reshape((1, num_params)))[0]
+		eval_count += 1
+		iterations = 0
+		## jump multiples of candidate moves, in the same order as minimize(...)
+		jump_multiples = numpy.asarray([-1, 1, -2, 2], dtype=numpy.float64)
+		while (iterations := iterations+1) < iteration_limit and numpy.max(jump_size) > precision:
+			## candidates[i*4 + j] = params with parameter i moved by jump_multiples[j] * jump_size[i]
+			candidates = numpy.repeat(params.reshape((1, num_params)), 4 * num_params, axis=0)
+			rows = numpy.arange(4 * num_params)
+			candidates[rows, rows // 4] += numpy.tile(jump_multiples, num_params) * numpy.repeat(jump_size, 4)
+			vals = evaluate(candidates).reshape((num_params, 4))
+			eval_count += len(candidates)
+			## index 0 = no move, like minimize(...)
+			all_vals = numpy.concatenate((numpy.full((num_params, 1), base_val), vals), axis=1)
+			best_index = numpy.argmin(all_vals, axis=1)
+			best_vals = all_vals[numpy.arange(num_params), best_index]
+			moves = numpy.zeros_like(params)
+			improved = best_index > 0
+			moves[improved] = jump_multiples[best_index[improved] - 1] * jump_size[improved]
+			# existing param already best, shrink step size
+			jump_size[best_index == 0] *= 0.25
+			# long jump gave best result, expand step size
+			jump_size[best_index > 2] *= 4
+			if not numpy.any(improved):
+				continue
+			best_single = numpy.argmin(best_vals)
+			combined_val = numpy.inf
+			if numpy.count_nonzero(improved) > 1:
+				combined = params + moves
+				combined_val = evaluate(combined.reshape((1, num_params)))[0]
+				eval_count += 1
+			if combined_val <= best_vals[best_single]:
+				(params, base_val) = (combined, combined_val)
+			else:
+				params = params.copy()
+				params[best_single] += moves[best_single]
+				base_val = best_vals[best_single]
+			if verbose:
+				elapsed = time.perf_counter() - start_time
+				print('\titeration %s: cost = %s (%s evaluations/s)' % (iterations, base_val, int(eval_count / max(elapsed, 1e-9))))
+	finally:
+		if own_executor is not None:
+			own_executor.shutdown()
+	if verbose:
+		elapsed = time.perf_counter() - start_time
+		print('%s evaluations in %s seconds (%s evaluations/s)' % (eval_count, round(elapsed, 3), int(eval_count / max(elapsed, 1e-9))))
+	return params, iterations
+
+def maximize_parallel(
+	f, p0, precision=1e-5, iteration_limit=100000, batch_f=None, executor=None, max_workers=None, verbose=True
+):
+	"""
+		Parallel version of maximize(...), see minimize_parallel(...)
+
+		Assumes ``Y = f(*params)`` (or ``Y = batch_f(P)`` for a (M, N) array
+		of M parameter vectors).
+
+		Returns
+		-------
+		popt : array
+			Optimal values for the parameters so that the result of
+			``f(*popt)`` is maximized.
+		num_iters :int
+			Number of iterations used to reach the optimum parameter values
+	"""
+	return minimize_parallel(
+		f=None if f is None else _Negated(f), p0=p0, precision=precision, iteration_limit=iteration_limit,
+		batch_f=None if batch_f is None else _Negated(batch_f), executor=executor, max_workers=max_workers,
+		verbose=verbose
+	)
+
+def minimize_successive_halving(
+	f, p0, num_samples, precision=1e-5, iteration_limit=100000, min_subset=1000, eta=2, tolerance=0.0, seed=None,
+	verbose=True
+):
+	"""
+		Version of minimize(...) for costs that are an average over a data
+		set (eg classification error), which scores candidate moves on
+		growing random subsets of the samples and drops the worse moves early
+		(successive halving). For each parameter, the four candidate moves
+		(short and long jumps left and right) are scored on a subset of
+		min_subset samples, the candidates that are clearly worse than the
+		current parameters (by more than the tolerance) and the worse half of
+		the rest are dropped, and the survivors are re-scored on eta times as
+		many samples, until one candidate remains. The best candidate always
+		survives (even if it scored worse than the current parameters on a
+		subset, as small subsets are noisy), and only that final move is
+		scored on the full data set, where it is accepted if it beats the
+		current parameters. Step sizes are adapted with the same rules as
+		minimize(...).
+
+		Assumes ``Y = f(params, indices)``, where indices is an array of
+		sample indices to calculate the cost from, or None for all samples.
+
+		Parameters
+		----------
+		f : callable
+			The cost function, f(params, indices).
+		p0 : array_like
+			Initial guess for the parameters (length N)
+		num_samples : int
+			Number of samples in the full data set
+		precision : float (optional, default = 0.00001)
+			Keep tuning the parameters until the parameters are within this
+			epsilon of the local optimum
+		iteration_limit : int (optional, default = 100000)
+			Give up after this many iterations
+		min_subset : int (optional, default = 1000)
+			Number of samples in the first (smallest) subset
+		eta : int (optional, default = 2)
+			Growth factor of the subset size between rounds
+		tolerance : float (optional, default = 0)
+			Candidates are only dropped for scoring worse than the current
+			parameters on a subset if they are worse by more than this (eg
+			about one standard error of the cost on min_subset samples);
+			the margin shrinks with the square-root of the subset size
+		seed : int (optional)
+			Random seed for choosing the subsets
+		verbose : bool (optional, default = True)
+			Print the speed-up versus scoring every candidate on the full
+			data set
+
+		Returns
+		-------
+		popt : array
+			Optimal values for the parameters so that the result of
+			``f(popt, None)`` is minimized.
+		num_iters :int
+			Number of iterations used to reach the optimum parameter values
+	"""
+	rng = numpy.random.default_rng(seed)
+	p0 = numpy.asarray(p0, dtype=numpy.float64)
+	num_params = len(p0)
+	params = p0.copy()
+	jump_size = numpy.zeros_like(p0) + 16*precision
+	## subset sizes of each round (the full set is only used to confirm the final move)
+	subset_sizes = []
+	size = int(min_subset)
+	while size < num_samples:
+		subset_sizes.append(size)
+		size = int(size * eta)
+	work = 0 # number of sample evaluations
+	full_work = 0 # number of sample evaluations that minimize(...) would have done
+	start_time = time.perf_counter()
+	iterations = 0
+	base_val = f(params, None)
+	work += num_samples
+	full_work += num_samples
+	jump_multiples = [-1, 1, -2, 2]
+	while (iterations := iterations+1) < iteration_limit and numpy.max(jump_size) > precision:
+		for i in range(0, num_params):
+			candidates = []
+			for m in jump_multiples:
+				c = params.copy()
+				c[i] = c[i] + m*jump_size[i]
+				candidates.append(c)
+			survivors = list(range(0, len(candidates)))
+			if len(subset_sizes) > 0:
+				## nested random subsets (prefixes of one random draw, without repeated samples)
+				subset = rng.choice(num_samples, size=subset_sizes[-1], replace=False)
+				for size in subset_sizes:
+					if len(survivors) <= 1:
+						break
+					indices = subset[:size]
+					subset_base = f(params, indices)
+					vals = [f(candidates[k], indices) for k in survivors]
+					work += size * (1 + len(survivors))
+					margin = tolerance * numpy.sqrt(subset_sizes[0] / size)
+					order = numpy.argsort(vals, kind='stable')
+					## (the best candidate is always kept, so that noise on a small subset cannot hide an improvement)
+					ranked = [survivors[k] for k in order[:1]] + [
+						survivors[k] for k in order[1:] if vals[k] <= subset_base + margin
+					]
+					survivors = ranked[:max(1, -(-len(survivors) // eta))]
+				survivors = survivors[:1]
+			best_index = 0
+			if len(survivors) > 0:
+				## confirm on the full data set (and if more than one candidate is left, pick the best of them)
+				full_vals = [f(candidates[k], None) for k in survivors]
+				work += num_samples * len(survivors)
+				k = int(numpy.argmin(full_vals))
+				if full_vals[k] < base_val:
+					best_index = survivors[k] + 1
+					base_val = full_vals[k]
+					params = candidates[survivors[k]]
+			full_work += 4 * num_samples
+			if best_index == 0:
+				# existing param already best, shrink step size
+				jump_size[i] = jump_size[i] * 0.25
+			elif best_index > 2:
+				# long jump gave best result, expand step size
+				jump_size[i] = jump_size[i] * 4
+	if verbose:
+		elapsed = time.perf_counter() - start_time
+		print('successive halving: %s sample evaluations instead of %s (%sx speed-up) in %s seconds' % (
+			work, full_work, round(full_work / max(work, 1), 2), round(elapsed, 3)
+		))
+	return params, iterations
+
+def maximize_successive_halving(
+	f, p0, num_samples, precision=1e-5, iteration_limit=100000, min_subset=1000, eta=2, tolerance=0.0, seed=None,
+	verbose=True
+):
+	"""
+		Version of maximize(...) that scores candidate moves on growing
+		random subsets of the data, see minimize_successive_halving(...)
+
+		Assumes ``Y = f(params, indices)``, where indices is an array of
+		sample indices to calculate the value from, or None for all samples.
+
+		Returns
+		-------
+		popt : array
+			Optimal values for the parameters so that the result of
+			``f(popt, None)`` is maximized.
+		num_iters :int
+			Number of iterations used to reach the optimum parameter values
+	"""
+	return minimize_successive_halving(
+		f=_Negated(f), p0=p0, num_samples=num_samples, precision=precision, iteration_limit=iteration_limit,
+		min_subset=min_subset, eta=eta, tolerance=tolerance, seed=seed, verbose=verbose
+	)
+
+class _StarCall:
+	## picklable f(*params) adapter for executor.map
+	def __init__(self, f):
+		self.f = f
+	def __call__(self, params):
+		return self.f(*params)
+
+class _Negated:
+	## picklable negation wrapper (closures can't be sent to a process pool)
+	def __init__(self, f):
+		self.f = f
+	def __call__(self, *args):
+		return -1*numpy.asarray(self.f(*args))
+
 def curve_fit(
 	f, xdata, ydata, p0, precision=1e-5, iteration_limit=100000
 ):
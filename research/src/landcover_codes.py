@@ -26,3 +26,21 @@ FAO_HYDRO_GRASSLANDS = 30
 FAO_HYDRO_SHRUBLANDS = 40
 FAO_HYDRO_HERBACEOUS_WETLANDS = 50
 FAO_HYDRO_TUNDRA = 51
+
+FAO_LCCS1_BARREN = 1
+FAO_LCCS1_PERMANENT_SNOW_AND_ICE = 2
+FAO_LCCS1_WATER_BODIES = 3
+FAO_LCCS1_EVERGREEN_NEEDLELEAF_FORESTS = 11
+FAO_LCCS1_EVERGREEN_BROADLEAF_FORESTS = 12
+FAO_LCCS1_DECIDUOUS_NEEDLELEAF_FORESTS = 13
+FAO_LCCS1_DECIDUOUS_BROADLEAF_FORESTS = 14
+FAO_LCCS1_MIXED_BROADLEAF_NEEDLELEAF_FORESTS = 15
+FAO_LCCS1_MIXED_BROADLEAF_EVERGREEN_DECIDUOUS_FORESTS = 16
+FAO_LCCS1_OPEN_FORESTS = 21
+FAO_LCCS1_SPARSE_FORESTS = 22
+FAO_LCCS1_DENSE_HERBACEOUS = 31
+FAO_LCCS1_SPARSE_HERBACEOUS = 32
+FAO_LCCS1_DENSE_SHRUBLANDS = 41
+FAO_LCCS1_SHRUBLAND_GRASSLAND_MOSAICS = 42
+FAO_LCCS1_SPARSE_SHRUBLANDS = 43
+FAO_LCCS1_UNCLASSIFIED = 255
@@ -0,0 +1,214 @@
+import os, threading, numpy
+from os import path
+from collections import OrderedDict
+from numpy import ndarray
+
+## Lazy, tile-by-tile derivation of global raster layers. Source layers are memory-mapped from .npy files, and derived
+## layers are declared as nodes in a graph that are only computed (one tile at a time) when a tile is requested. Computed
+## tiles are kept in a least-recently-used cache with a memory limit, so an analysis only needs the tiles it is
+## currently working on to be in memory instead of every full-size layer at once.
+
+
+class RasterWindow:
+	"""
+	A rectangular window (tile) of a global raster, passed to node functions so that position-dependent calculations
+	(eg latitude) can be done per tile.
+
+	:param y0: first row of the window (inclusive)
+	:param y1: last row of the window (exclusive)
+	:param x0: first column of the window (inclusive)
+	:param x1: last column of the window (exclusive)
+	:param raster_shape: shape of the full raster
+	"""
+	def __init__(self, y0: int, y1: int, x0: int, x1: int, raster_shape):
+		self.y0 = y0
+		self.y1 = y1
+		self.x0 = x0
+		self.x1 = x1
+		self.raster_shape = tuple(raster_shape)
+
+	@property
+	def shape(self):
+		return (self.y1 - self.y0, self.x1 - self.x0)
+
+	def row_latitudes(self, dtype=numpy.float32) -> ndarray:
+		"""latitude in degrees of each row in the window"""
+		h = self.raster_shape[0]
+		return 180 * numpy.arange(self.y0, self.y1, dtype=dtype)/(h-1) - 90
+
+	def column_longitudes(self, dtype=numpy.float32) -> ndarray:
+		"""longitude in degrees of each column in the window"""
+		w = self.raster_shape[1]
+		return 360 * numpy.arange(self.x0, self.x1, dtype=dtype)/(w-1) - 180
+
+	def latitudes(self, dtype=numpy.float32) -> ndarray:
+		"""latitude in degrees of each pixel in the window (same values as preprocess.latitudes_like on the full raster)"""
+		return numpy.outer(self.row_latitudes(dtype=dtype), numpy.ones((self.x1 - self.x0,), dtype=dtype))
+
+	def longitudes(self, dtype=numpy.float32) -> ndarray:
+		"""longitude in degrees of each pixel in the window (same values as preprocess.longitudes_like on the full raster)"""
+		return numpy.outer(numpy.ones((self.y1 - self.y0,), dtype=dtype), self.column_longitudes(dtype=dtype))
+
+	def __repr__(self):
+		return 'RasterWindow[%s:%s, %s:%s]' % (self.y0, self.y1, self.x0, self.x1)
+
+
+class RasterGraph:
+	"""
+	Graph of named raster layers. Sources are full-size arrays (usually memory-mapped .npy files) and nodes are
+	derived layers which are computed per tile from other layers when requested.
+
+	Usage:
+		graph = RasterGraph(tile_shape=(1080, 2160), cache_bytes=2**30)
+		graph.add_npy_source('altitude', 'data/altitude.npy', loader=lambda: zunpickle('data/altitude.pickle.gz'))
+		graph.add_node('land_altitude', lambda altitude: numpy.clip(altitude, 0, numpy.inf), inputs=['altitude'])
+		thumbnail = graph.read('land_altitude', stride=10)
+
+	:param tile_shape: (rows, columns) of each computed tile
+	:param cache_bytes: max total size of cached node tiles, least recently used tiles are evicted first
+	"""
+	def __init__(self, tile_shape=(1024, 1024), cache_bytes=1024**3):
+		self.tile_shape = (int(tile_shape[0]), int(tile_shape[1]))
+		self.cache_bytes = int(cache_bytes)
+		self.shape = None
+		self._sources = {}
+		self._nodes = {}
+		self._cache = OrderedDict()
+		self._cached_bytes = 0
+		self._lock = threading.RLock()
+
+	def add_source(self, name: str, array: ndarray):
+		"""adds a full-size source layer (eg a numpy memmap), all layers in a graph must have the same shape"""
+		self._check_name(name)
+		if self.shape is None:
+			self.shape = tuple(array.shape)
+		elif tuple(array.shape) != self.shape:
+			raise ValueError('Source %s has shape %s, but graph has shape %s' % (name, array.shape, self.shape))
+		self._sources[name] = array
+
+	def add_npy_source(self, name: str, npy_filepath: str, loader=None):
+		"""
+		Adds a source layer which is memory-mapped (read-only) from a .npy file. If the file does not exist yet, it is
+		created from the array returned by loader() (eg a function that unpickles the original data).
+		"""
+		if not path.exists(npy_filepath):
+			if loader is None:
+				raise FileNotFoundError("File '%s' does not exist" % path.abspath(npy_filepath))
+			print('Converting %s source to %s...' % (name, npy_filepath))
+			os.makedirs(path.dirname(path.abspath(npy_filepath)), exist_ok=True)
+			tmp_filepath = npy_filepath + '.tmp.npy'
+			numpy.save(tmp_filepath, numpy.asarray(loader()))
+			os.replace(tmp_filepath, npy_filepath)
+		self.add_source(name, numpy.load(npy_filepath, mmap_mode='r'))
+
+	def add_node(self, name: str, func, inputs: [str], pass_window=False):
+		"""
+		Declares a derived layer. When a tile of this layer is requested, the same tile of each input layer is
+		retrieved and passed to func as keyword arguments (named after the inputs), plus window=RasterWindow if
+		pass_window is True. func must return an array with the same shape as the tile.
+
+		:param name: name of the new layer
+		:param func: function that calculates a tile of this layer
+		:param inputs: names of the layers that this layer is calculated from (must already exist)
+		:param pass_window: if True, the tile's RasterWindow is also passed to func as window=...
+		"""
+		self._check_name(name)
+		for i in inputs:
+			if i not in self._sources and i not in self._nodes:
+				raise KeyError('Unknown input layer %s for node %s' % (i, name))
+		self._nodes[name] = (func, list(inputs), bool(pass_window))
+
+	@property
+	def layers(self) -> [str]:
+		return list(self._sources.keys()) + list(self._nodes.keys())
+
+	def array(self, name: str) -> ndarray:
+		"""returns the full-size array of a source layer (no copy is made)"""
+		return self._sources[name]
+
+	@property
+	def tile_count(self):
+		return (-(-self.shape[0] // self.tile_shape[0]), -(-self.shape[1] // self.tile_shape[1]))
+
+	def window(self, tile_row: int, tile_col: int) -> RasterWindow:
+		(th, tw) = self.tile_shape
+		y0 = tile_row * th
+		x0 = tile_col * tw
+		return RasterWindow(y0, min(y0 + th, self.shape[0]), x0, min(x0 + tw, self.shape[1]), self.shape)
+
+	def tile(self, name: str, tile_row: int, tile_col: int) -> ndarray:
+		"""returns one tile of a layer, computing it (and any tiles it depends on) if it is not cached"""
+		window = self.window(tile_row, tile_col)
+		if name in self._sources:
+			return self._sources[name][window.y0:window.y1, window.x0:window.x1]
+		key = (name, tile_row, tile_col)
+		with self._lock:
+			if key in self._cache:
+				self._cache.move_to_end(key)
+				return self._cache[key]
+		(func, inputs, pass_window) = self._nodes[name]
+		kwargs = {i: self.tile(i, tile_row, tile_col) for i in inputs}
+		if pass_window:
+			kwargs['window'] = window
+		data = numpy.asarray(func(**kwargs))
+		if data.shape != window.shape:
+			raise ValueError('Node %s returned shape %s for %s' % (name, data.shape, window))
+		with self._lock:
+			if key not in self._cache:
+				self._cache[key] = data
+				self._cached_bytes += data.nbytes
+				self._evict()
+		return data
+
+	def tiles(self, name: str):
+		"""generator of (RasterWindow, tile data) for every tile of a layer, in row-major order"""
+		(rows, cols) = self.tile_count
+		for tr in range(0, rows):
+			for tc in range(0, cols):
+				yield (self.window(tr, tc), self.tile(name, tr, tc))
+
+	def read(self, name: str, y0=0, y1=None, x0=0, x1=None, stride=1, dtype=None) -> ndarray:
+		"""
+		Assembles a (optionally sub-sampled) region of a layer, computing only the tiles that overlap the region. The
+		result is the same as full_layer[y0:y1:stride, x0:x1:stride].
+		"""
+		y1 = self.shape[0] if y1 is None else min(y1, self.shape[0])
+		x1 = self.shape[1] if x1 is None else min(x1, self.shape[1])
+		stride = int(stride)
+		out = None
+		(th, tw) = self.tile_shape
+		for tr in range(y0 // th, -(-y1 // th)):
+			for tc in range(x0 // tw, -(-x1 // tw)):
+				win = self.window(tr, tc)
+				## first row/column in this tile that is on the stride grid
+				sy0 = max(win.y0, y0)
+				sy0 += (y0 - sy0) % stride
+				sx0 = max(win.x0, x0)
+				sx0 += (x0 - sx0) % stride
+				sy1 = min(win.y1, y1)
+				sx1 = min(win.x1, x1)
+				if sy0 >= sy1 or sx0 >= sx1:
+					continue
+				data = self.tile(name, tr, tc)[sy0-win.y0:sy1-win.y0:stride, sx0-win.x0:sx1-win.x0:stride]
+				if out is None:
+					out = numpy.empty((len(range(y0, y1, stride)), len(range(x0, x1, stride))), dtype=dtype or data.dtype)
+				oy = (sy0 - y0) // stride
+				ox = (sx0 - x0) // stride
+				out[oy:oy+data.shape[0], ox:ox+data.shape[1]] = data
+		return out
+
+	def clear_cache(self):
+		with self._lock:
+			self._cache.clear()
+			self._cached_bytes = 0
+
+	def _evict(self):
+		while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+			(_, data) = self._cache.popitem(last=False)
+			self._cached_bytes -= data.nbytes
+
+	def _check_name(self, name: str):
+		if name in self._sources or name in self._nodes:
+			raise KeyError('Layer %s already exists' % name)
+		if name == 'window':
+			raise KeyError('"window" is reserved and cannot be used as a layer name')
@@ -1,10 +1,11 @@
-import os, shutil, sys, re, requests, base64, urllib.parse, numpy, pandas, json, pickle, ssl, time, gzip
+import os, shutil, sys, re, struct, requests, base64, urllib.parse, numpy, pandas, json, pickle, ssl, time, gzip
 from os import path
 from subprocess import call
 from PIL import Image
 from copy import deepcopy
+from collections import OrderedDict
+import threading
 
-from imblearn.under_sampling import RandomUnderSampler
 from numpy import ndarray, nan, uint8, float32, logical_and, logical_or, logical_not, clip, sin, cos, square, sqrt, power, log10
 from pandas import DataFrame
 from sklearn.pipeline import Pipeline
@@ -19,6 +20,8 @@ from matplotlib import pyplot
 from biome_enum import Biome
 from photophysiology import *
 import hillclimb
+from feature_dataset import scan_feature_dataset
+from sampling import StratifiedReservoirSampler
 
 import pyximport
 pyximport.install()
@@ -31,22 +34,30 @@ def main():
 	PATCH_SOLAR_FLUX = True
 	data_dir = 'data'
 	data_sets_zpickles = [path.join(data_dir, 'Earth_biome_DataFrame-%s.pickle.gz' % n) for n in range(0,4)]
-	# data splitting: 3 training batches and 1 test batch
-	src_data: DataFrame = zunpickle(data_sets_zpickles[0])
-	if PATCH_SOLAR_FLUX:
-		# had accidentally used pi/2 instead of 2/pi
-		two_over_pi = 2 / numpy.pi
-		pi_over_2 = 0.5 * numpy.pi
-		src_data['solar_flux'] = src_data['solar_flux'] / pi_over_2 * two_over_pi
-	# remove unclassified rows
-	src_data: DataFrame = src_data[src_data['biome'] != 0].copy()
-	# patch-in tundra
-	tmp_b = numpy.asarray(src_data['biome'])
-	tmp_b[(src_data['precipitation'] > 110) * (src_data['temperature_mean'] < 5) \
-					  * (src_data['temperature_mean'] + src_data['temperature_range'] > 0)] = Biome.TUNDRA.value
-	src_data['biome'] = tmp_b
-	del tmp_b
-	# remove unclassified rows and reduce data size and remove oceans
+	feature_dataset_path = path.join(data_dir, 'Earth_biome_features.parquet')
+	# class-balanced sample of the land rows (bounded memory) and a random quarter of all rows for exploration
+	balancer = StratifiedReservoirSampler(capacity_per_class=200000, seed=1)
+	if path.exists(feature_dataset_path):
+		## both are taken from the full-resolution data set in the same pass, one row group at a time
+		rng = numpy.random.default_rng(1)
+		parts = []
+		for chunk in scan_feature_dataset(feature_dataset_path):
+			chunk = patch_biome_labels(chunk)
+			parts.append(chunk[rng.random(len(chunk)) < 0.25])
+			chunk = chunk[chunk['biome'] < 0x10]
+			balancer.add(chunk.drop(['biome', 'gravity'], axis=1, inplace=False), chunk['biome'])
+		src_data: DataFrame = pandas.concat(parts, ignore_index=True)
+		del parts
+	else:
+		# data splitting: 3 training batches and 1 test batch
+		src_data: DataFrame = zunpickle(data_sets_zpickles[0])
+		if PATCH_SOLAR_FLUX:
+			# had accidentally used pi/2 instead of 2/pi
+			two_over_pi = 2 / numpy.pi
+			pi_over_2 = 0.5 * numpy.pi
+			src_data['solar_flux'] = src_data['solar_flux'] / pi_over_2 * two_over_pi
+		src_data = patch_biome_labels(src_data)
+	# reduce data size and remove oceans
 	dev_data = src_data[src_data['biome'] < 0x10]
 	print('columns: ', list(dev_data.columns))
 	labels = dev_data['biome']
@@ -63,8 +74,9 @@ def main():
 			pressure_kPa=dev_data['pressure']
 		)
 	})
-	balancer = RandomUnderSampler()
-	bfeatures, blabels = balancer.fit_resample(features, labels)
+	if not path.exists(feature_dataset_path):
+		balancer.add(features, labels)
+	bfeatures, blabels = balancer.sample(balanced=True)
 
 
 	## lets take a peek at the data
@@ -143,11 +155,18 @@ def main():
 	##
 	print('balanced data:', len(bfeatures), 'rows')
 	print('old params:', bc.get_param_array())
-	def opti_bc(*params):
+	def opti_bc(params, indices):
 		bc.set_param_array(params)
-		return bc.score(bfeatures, blabels)
+		if indices is None:
+			return bc.score(bfeatures, blabels)
+		return bc.score(bfeatures.iloc[indices], blabels.iloc[indices])
 	print('optimizing...')
-	opt_p, iters = hillclimb.maximize(opti_bc, bc.get_param_array(), precision=0.1)
+	## candidate moves are first compared on small random subsets of the balanced data, only the winner is scored on all of it
+	## (moves are only dropped early if their accuracy on the subset is worse by more than about one standard error)
+	opt_p, iters = hillclimb.maximize_successive_halving(
+		opti_bc, bc.get_param_array(), num_samples=len(bfeatures), precision=0.1, min_subset=4096, tolerance=0.005,
+		seed=1
+	)
 	print('...completed in %s iterations' % iters)
 	bc.set_param_array(opt_p)
 	print('new params:', bc.get_param_array())
@@ -186,13 +205,20 @@ def main():
 	print('optimizing...')
 	rp = rp_pipe['my_classifier']
 	print('old params:', rp.get_param_array())
-	def opti_rp(*params):
-		rp.set_param_array(params)
-		return rp_pipe.score(bfeatures, blabels)
+	## normalize once, then score incrementally (each hill-climbing step only moves one reference point)
+	rp_X = rp_pipe['normalize'].transform(bfeatures)
+	rp_y = numpy.asarray(blabels)
+	opti_rp = ReferencePointScorer(rp_X, rp_y, rp.classes_, rp.ref_points)
 	opti_batch_size = 10
 	iter_count = 0
+	## the scorer doesn't modify rp, so each batch continues from the previous batch's result
+	opt_p = rp.get_param_array()
 	for batch in range(0, opti_batch_size):
-		opt_p, iters = hillclimb.maximize(opti_rp, rp.get_param_array(), precision=0.1, iteration_limit=10)
+		opt_p, iters = hillclimb.maximize_successive_halving(
+			opti_rp.score, opt_p, num_samples=len(rp_y), precision=0.1, iteration_limit=10,
+			min_subset=4096, tolerance=0.005, seed=batch
+		)
+		print(opti_rp.stats())
 		iter_count += iters
 		if iters < opti_batch_size:
 			zpickle(opt_p, 'opti-iter-%s.pickle.gz' % iter_count)
@@ -213,6 +239,7 @@ def main():
 	print('normalizer.data_range_ =', normalizer.data_range_)
 	print('normalizer.scale_ =', normalizer.scale_)
 	zpickle(rp_pipe, 'rp_pipe.pickle.gz')
+	export_calculator_model(rp_pipe, 'rp_model.bin')
 
 	# for dtree_size in range(2,10):
 	dtree_size = 6
@@ -236,6 +263,16 @@ def main():
 	#
 	print('...Done!')
 
+def patch_biome_labels(src_data: DataFrame) -> DataFrame:
+	# remove unclassified rows
+	src_data: DataFrame = src_data[src_data['biome'] != 0].copy()
+	# patch-in tundra
+	tmp_b = numpy.asarray(src_data['biome']).copy()
+	tmp_b[(src_data['precipitation'] > 110) * (src_data['temperature_mean'] < 5) \
+					  * (src_data['temperature_mean'] + src_data['temperature_range'] > 0)] = Biome.TUNDRA.value
+	src_data['biome'] = tmp_b
+	return src_data
+
 def hexplot_y_vs_x_for_z_df(df: DataFrame, x_col_name: str, y_col_name: str, z_col_name: str,
 		z_value, name, x_range: (float,float), x_grids: int, y_range: (float,float), y_grids: int,
 		cmap='rainbow', show=False
@@ -281,8 +318,10 @@ def fit_and_score(pipe: Pipeline, input_data: DataFrame, labels: ndarray):
 	print('Definitions:')
 	print('\tprecision - true positives / all positive IDs')
 	print('\trecall - true positives / real number')
-	print(classification_report(y_true=labels, y_pred=pipe.predict(input_data)))
-	percent_accuracy = 100 * pipe.score(X=input_data, y=labels)
+	## predict only once (same accuracy as pipe.score(...), without classifying everything a second time)
+	predictions = pipe.predict(input_data)
+	print(classification_report(y_true=labels, y_pred=predictions))
+	percent_accuracy = 100 * numpy.mean(predictions == numpy.asarray(labels))
 	print('Overall accuracy: %s %%' % int(percent_accuracy+0.5))
 
 ## inputs:  ['solar_flux', 'pressure', 'altitude', 'temperature_mean', 'temperature_range', 'precipitation']
@@ -332,32 +371,44 @@ class FastBiomeClassifier(BaseEstimator, TransformerMixin, ClassifierMixin):
 
 
 	def fit(self, X, y):
-		# Check that X and y have correct shape
-		X: ndarray = numpy.asarray(X)
+		## no fitting operation, so only the shapes are checked (without converting X to a 2D float array)
+		columns = self._feature_columns(X)
 		y: ndarray = numpy.asarray(y)
-		X, y = check_X_y(X, y)
+		if len(y) != len(columns[0]):
+			raise ValueError('X and y must have the same number of rows (%s != %s)' % (len(columns[0]), len(y)))
 		# Store the classes seen during fit
 		self.classes_ = unique_labels(y)
-		self.feature_count_ = len(X[0])
-		## no fitting operation
+		self.feature_count_ = len(self.columns)
 		# Return the classifier
 		return self
 
-	def predict(self, X):
+	def predict(self, X, chunk_size=1048576):
+		"""
+		Classifies X (DataFrame, structured array, or 2D array with self.columns) one chunk of rows at a time. The
+		needed columns are viewed in place and only converted to float32 one chunk at a time (no conversion at all if
+		they are already float32), so that whole-Earth data sets can be classified without copying the whole table.
+		"""
 		# Check is fit had been called
 		check_is_fitted(self)
+		columns = self._feature_columns(X)
+		n = len(columns[0])
+		biomes = numpy.zeros((n,), dtype=uint8)
+		for c in range(0, n, chunk_size):
+			e = min(c + chunk_size, n)
+			biomes[c:e] = self.classify_biomes(*[numpy.asarray(col[c:e], dtype=float32) for col in columns])
+		return biomes
 
-		# Input validation
-		X = check_array(X)
-		X = numpy.asarray(X, dtype=float32)
-
-		return self.classify_biomes(
-			altitude_m=X[:, self.index_altitude],
-			mean_temp_C=X[:, self.index_mean_temp],
-			temp_var_C=X[:, self.index_temp_var],
-			annual_precip_mm=X[:, self.index_precip],
-			mean_solar_flux_Wpm2=X[:, self.index_solar_flux]
-		)
+	def _feature_columns(self, X) -> [ndarray]:
+		## (solar flux, altitude, mean temp, temp variation, precipitation) columns of X, as views when possible
+		names = ['solar_flux', 'altitude', 'temperature_mean', 'temperature_range', 'precipitation']
+		if isinstance(X, DataFrame):
+			return [X[name].to_numpy(copy=False) for name in names]
+		X = numpy.asarray(X)
+		if X.dtype.names is not None:
+			return [X[name] for name in names]
+		if X.ndim != 2 or X.shape[1] != len(self.columns):
+			raise ValueError('Expected a 2D array with %s columns, got shape %s' % (len(self.columns), X.shape))
+		return [X[:, self.columns.index(name)] for name in names]
 
 terrestrial_reference_classes = numpy.asarray([1, 2, 3, 4, 5, 6, 7, 8, 9], dtype=uint8)
 terrestrial_reference_points = numpy.asarray([
@@ -416,52 +467,127 @@ terrestrial_reference_points = numpy.asarray([
         [0.8729486 , 0.81519806, 0.4026484 , 0.0783796 ],
         [0.24349129, 0.7866096 , 0.45044297, 0.11177942]]
 ], dtype=float32)
-def classify_biomes(altitude: ndarray, mean_temp: ndarray, annual_precip: ndarray, temp_var: ndarray, pressure: ndarray, solar_flux: ndarray, exoplanet=False) -> ndarray:
-	biomes = numpy.zeros(altitude.shape, dtype=numpy.uint8)
-	# NOTE: boolean * is AND and + is OR
+## normalization of the features of the terrestrial reference points (same as the biome calculator)
+### ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
+terrestrial_reference_minmaxes = numpy.asarray([
+	## mins
+	[  0, -20,  0,  0],
+	## maxes
+	[800,  50, 35, 75]
+], dtype=float32)
+
+def classify_biomes(
+		altitude: ndarray, mean_temp: ndarray, annual_precip: ndarray, temp_var: ndarray, pressure: ndarray,
+		solar_flux: ndarray, exoplanet=False, chunk_size=65536, out: ndarray = None
+) -> ndarray:
+	"""
+	Classifies biomes (1D arrays) one chunk at a time, re-using the same scratch buffers for every chunk, so peak memory
+	use is proportional to chunk_size instead of to the number of samples.
+
+	:param out: optional uint8 array (same size as altitude) to write the biome codes to
+	:return: array of biome codes (uint8)
+	"""
+	n = len(altitude)
+	biomes = numpy.zeros((n,), dtype=uint8) if out is None else out
+	chunk_size = max(1, min(int(chunk_size), n))
+	scratch = _BiomeScratch(chunk_size)
+	for c in range(0, n, chunk_size):
+		e = min(c + chunk_size, n)
+		_classify_biomes_chunk(
+			altitude[c:e], mean_temp[c:e], annual_precip[c:e], temp_var[c:e], pressure[c:e], solar_flux[c:e],
+			exoplanet, biomes[c:e], scratch.view(e - c)
+		)
+	return biomes
+
+class _BiomeScratch:
+	## re-usable temporary arrays for _classify_biomes_chunk(...)
+	def __init__(self, size: int):
+		self.norm = numpy.zeros((4, size), dtype=float32)
+		self.dist = numpy.zeros((size,), dtype=float32)
+		self.tmp = numpy.zeros((size,), dtype=float32)
+		self.best = numpy.zeros((size,), dtype=float32)
+		self.boiling = numpy.zeros((size,), dtype=float32)
+		self.terrestrial = numpy.zeros((size,), dtype=bool)
+		self.aquatic = numpy.zeros((size,), dtype=bool)
+		self.mask = numpy.zeros((size,), dtype=bool)
+		self.cond = numpy.zeros((size,), dtype=bool)
+
+	def view(self, n: int):
+		if n == len(self.dist):
+			return self
+		v = object.__new__(_BiomeScratch)
+		for (k, arr) in self.__dict__.items():
+			v.__dict__[k] = arr[..., :n]
+		return v
+
+def _classify_biomes_chunk(
+		altitude: ndarray, mean_temp: ndarray, annual_precip: ndarray, temp_var: ndarray, pressure: ndarray,
+		solar_flux: ndarray, exoplanet: bool, biomes: ndarray, s: _BiomeScratch
+):
+	## each rule is (biome code, condition, condition, ...) where a condition is a boolean array or a
+	## (array, comparison ufunc, value) triple, and later rules override earlier ones
+	def apply(code, *conditions):
+		mask = s.mask
+		for (i, cond) in enumerate(conditions):
+			if isinstance(cond, tuple):
+				cond = cond[1](cond[0], cond[2], out=s.cond)
+			if i == 0:
+				numpy.copyto(mask, cond)
+			else:
+				numpy.logical_and(mask, cond, out=mask)
+		numpy.copyto(biomes, code, where=mask)
+	(lt, le, gt, ge) = (numpy.less, numpy.less_equal, numpy.greater, numpy.greater_equal)
+	terrestrial_biomes = gt(altitude, 0, out=s.terrestrial)
+	aquatic_biomes = le(altitude, 0, out=s.aquatic)
 	## terrestrial biomes
-	terrestrial_biomes = (altitude > 0)
-	minmax = terrestrial_data_normalizer_minmaxes
-	### normalize data for nearest control point analysis
-	t_data = numpy.asarray([
-		### ['solar_flux', 'pressure', 'altitude', 'temperature_mean', 'temperature_range', 'precipitation']
-		(solar_flux - minmax['solar_flux'][0])/(minmax['solar_flux'][1]-minmax['solar_flux'][0]),
-		(pressure - minmax['pressure'][0])/(minmax['pressure'][1]-minmax['pressure'][0]),
-		(altitude - minmax['altitude'][0])/(minmax['altitude'][1]-minmax['altitude'][0]),
-		(mean_temp - minmax['temperature_mean'][0])/(minmax['temperature_mean'][1]-minmax['temperature_mean'][0]),
-		(temp_var - minmax['temperature_range'][0])/(minmax['temperature_range'][1]-minmax['temperature_range'][0]),
-		(annual_precip - minmax['precipitation'][0])/(minmax['precipitation'][1]-minmax['precipitation'][0]),
-	]).T
-	class_dists = numpy.zeros((len(terrestrial_reference_classes), len(altitude)), dtype=float32) + numpy.inf
-	for i in range(0, len(terrestrial_reference_classes)):
-		class_dists[i] = euclidean_distances(t_data, terrestrial_reference_points[i]).min(axis=1)
-
-	closest = numpy.argmin(class_dists, axis=0)
-	biomes = numpy.ma.masked_array(biomes, mask=logical_not(terrestrial_biomes))
-	biomes[:] = terrestrial_reference_classes[closest]
-	biomes = numpy.asarray(biomes)
+	### normalize data for nearest reference point analysis
+	(mins, maxs) = terrestrial_reference_minmaxes
+	for (i, x) in enumerate((solar_flux, mean_temp, temp_var, annual_precip)):
+		norm = s.norm[i]
+		if i == 3:
+			x = numpy.sqrt(x, out=norm, casting='unsafe')
+		numpy.subtract(x, mins[i], out=norm, casting='unsafe')
+		numpy.multiply(norm, float32(1) / (maxs[i] - mins[i]), out=norm)
+	### nearest reference point (squared distances; only a strictly closer point wins, so ties go to the first class)
+	s.best.fill(numpy.inf)
+	biomes[:] = terrestrial_reference_classes[0]
+	(num_classes, pts_per_class, _) = terrestrial_reference_points.shape
+	for c in range(0, num_classes):
+		for r in range(0, pts_per_class):
+			point = terrestrial_reference_points[c, r]
+			numpy.subtract(s.norm[0], point[0], out=s.dist)
+			numpy.square(s.dist, out=s.dist)
+			for i in range(1, 4):
+				numpy.subtract(s.norm[i], point[i], out=s.tmp)
+				numpy.square(s.tmp, out=s.tmp)
+				numpy.add(s.dist, s.tmp, out=s.dist)
+			lt(s.dist, s.best, out=s.mask)
+			numpy.copyto(s.best, s.dist, where=s.mask)
+			numpy.copyto(biomes, terrestrial_reference_classes[c], where=s.mask)
+	### NOTE: like the original masked array assignment, every row keeps its nearest reference class here (aquatic rows
+	### are overwritten below), so rows whose altitude is NaN (neither terrestrial nor aquatic) keep it too
+	max_temp = numpy.add(mean_temp, temp_var, out=s.tmp, casting='unsafe')
 	### training set didn't have tundra :(
-	biomes[terrestrial_biomes * (mean_temp < 5) * (mean_temp+temp_var > 0)] = Biome.TUNDRA.value
+	apply(Biome.TUNDRA.value, terrestrial_biomes, (mean_temp, lt, 5), (max_temp, gt, 0))
 	### turn over-saturated rainfall areas to wetland
 	max_rain_limit = 4170
-	biomes[terrestrial_biomes * (mean_temp >= 5) * (annual_precip > max_rain_limit)] = Biome.WETLAND.value
+	apply(Biome.WETLAND.value, terrestrial_biomes, (mean_temp, ge, 5), (annual_precip, gt, max_rain_limit))
 	## aquatic biomes
-	aquatic_biomes = altitude <= 0
-	biomes[aquatic_biomes] = Biome.DEEP_OCEAN.value
-	biomes[aquatic_biomes * (altitude > -200)] = Biome.SHALLOW_OCEAN.value
-	biomes[aquatic_biomes * (solar_flux >= 85)] = Biome.ROCKY_SHALLOWS.value
-	biomes[aquatic_biomes * (solar_flux >= 85) * (mean_temp > 5) * (mean_temp < 20)] = Biome.SEA_FOREST.value
-	biomes[aquatic_biomes * (solar_flux >= 85) * (mean_temp >= 20) * (mean_temp < 30)] = Biome.TROPICAL_REEF.value
+	numpy.copyto(biomes, Biome.DEEP_OCEAN.value, where=aquatic_biomes)
+	apply(Biome.SHALLOW_OCEAN.value, aquatic_biomes, (altitude, gt, -200))
+	apply(Biome.ROCKY_SHALLOWS.value, aquatic_biomes, (solar_flux, ge, 85))
+	apply(Biome.SEA_FOREST.value, aquatic_biomes, (solar_flux, ge, 85), (mean_temp, gt, 5), (mean_temp, lt, 20))
+	apply(Biome.TROPICAL_REEF.value, aquatic_biomes, (solar_flux, ge, 85), (mean_temp, ge, 20), (mean_temp, lt, 30))
 	## extreme biomes
 	min_rain_limit = 110
-	biomes[terrestrial_biomes * (annual_precip < min_rain_limit) * (mean_temp > 15)] = Biome.SAND_SEA.value
-	biomes[terrestrial_biomes * (annual_precip < min_rain_limit) * (mean_temp <= 15)] = Biome.BARREN.value
-	boiling_temp = boiling_point(pressure)
-	biomes[aquatic_biomes * (mean_temp >= boiling_temp)] = Biome.BOILING_SEA.value
-	biomes[(mean_temp+temp_var <= 0)] = Biome.ICE_SHEET.value
+	apply(Biome.SAND_SEA.value, terrestrial_biomes, (annual_precip, lt, min_rain_limit), (mean_temp, gt, 15))
+	apply(Biome.BARREN.value, terrestrial_biomes, (annual_precip, lt, min_rain_limit), (mean_temp, le, 15))
+	boiling_temp = _boiling_point_into(pressure, s.boiling, s.dist)
+	apply(Biome.BOILING_SEA.value, aquatic_biomes, (mean_temp, ge, boiling_temp))
+	apply(Biome.ICE_SHEET.value, (max_temp, le, 0))
 	if exoplanet:
 		## astronomical biomes
-		biomes[terrestrial_biomes * (mean_temp >= boiling_temp)] = Biome.MOONSCAPE.value
+		apply(Biome.MOONSCAPE.value, terrestrial_biomes, (mean_temp, ge, boiling_temp))
 		### cryogen params based on liquid nitrogen ( https://www.engineeringtoolbox.com/nitrogen-d_1421.html )
 		#### alternative cryogens: ammonia, methane; both would oxidize in presense of oxygen, so not as interesting
 		#### (oxygen is a pretty common element)
@@ -469,12 +595,30 @@ def classify_biomes(altitude: ndarray, mean_temp: ndarray, annual_precip: ndarra
 		cryo_crit_pressure = 3400 # kPa
 		cryo_triple_temp = -210 # C
 		# cryo_triple_pressure = 12.5 # kPa
-		cryo = (mean_temp > cryo_triple_temp)*(mean_temp < cryo_crit_temp)*(pressure < cryo_crit_pressure)*( pressure > (1.6298e9*numpy.exp(0.08898*mean_temp)))
-		biomes[aquatic_biomes * cryo] = Biome.CRYOGEN_SEA.value
+		with numpy.errstate(over='ignore'):
+			cryo_min_pressure = numpy.multiply(mean_temp, 0.08898, out=s.dist, casting='unsafe')
+			numpy.exp(cryo_min_pressure, out=cryo_min_pressure)
+			numpy.multiply(cryo_min_pressure, 1.6298e9, out=cryo_min_pressure)
+		apply(
+			Biome.CRYOGEN_SEA.value, aquatic_biomes, (mean_temp, gt, cryo_triple_temp), (mean_temp, lt, cryo_crit_temp),
+			(pressure, lt, cryo_crit_pressure), (pressure, gt, cryo_min_pressure)
+		)
 		rock_melting_point = 600
 		rock_boiling_point = 2230
-		biomes[aquatic_biomes * (mean_temp > rock_melting_point) * (mean_temp < rock_boiling_point)] = Biome.MAGMA_SEA.value
-	return biomes
+		apply(Biome.MAGMA_SEA.value, aquatic_biomes, (mean_temp, gt, rock_melting_point), (mean_temp, lt, rock_boiling_point))
+
+def _boiling_point_into(pressure_kPa: ndarray, out: ndarray, tmp: ndarray) -> ndarray:
+	## same as boiling_point(pressure_kPa), but evaluated in place (Horner's method) in the given float32 buffers
+	## NOTE: boiling_point(...) returns the high pressure polynomial at every pressure, because assigning to a masked
+	## array also overwrites the masked elements, so only that polynomial is evaluated here
+	ln_mbar = numpy.log(numpy.multiply(pressure_kPa, 10, out=tmp, casting='unsafe'), out=tmp)
+	coeffs = numpy.asarray([0.47092, -8.2481, 75.520, -183.98], dtype=float32)
+	numpy.multiply(ln_mbar, coeffs[0], out=out)
+	for c in coeffs[1:-1]:
+		numpy.add(out, c, out=out)
+		numpy.multiply(out, ln_mbar, out=out)
+	numpy.add(out, coeffs[-1], out=out)
+	return out
 
 def boiling_point(pressure_kPa: ndarray) -> ndarray:
 	ln_mbar = numpy.log(pressure_kPa*10)
@@ -687,14 +831,211 @@ class ReferencePointClassifier(BaseEstimator, TransformerMixin, ClassifierMixin)
 
 		# Input validation
 		X = check_array(X)
+		return self._predict_with_ref_points(X, self.ref_points)
 
+	def score_param_array(self, p: ndarray, X: ndarray, y: ndarray) -> float:
+		## accuracy with the given parameters instead of self.ref_points (does not modify self, so it is thread-safe)
+		ref_points = numpy.asarray(p).reshape((self.class_count_, self.num_pts_per_class, self.feature_count_))
+		return float(numpy.mean(self._predict_with_ref_points(X, ref_points) == y))
+
+	def _predict_with_ref_points(self, X: ndarray, ref_points: ndarray) -> ndarray:
 		class_dists = numpy.zeros((len(self.classes_),len(X))) + numpy.inf
 		for i in range(0, len(self.classes_)):
-			class_dists[i] = euclidean_distances(X, self.ref_points[i]).min(axis=1)
+			class_dists[i] = euclidean_distances(X, ref_points[i]).min(axis=1)
 
 		closest = numpy.argmin(class_dists, axis=0)
 		return self.classes_[closest]
 
+class ReferencePointScorer:
+	"""
+	Incremental accuracy scoring of ReferencePointClassifier parameter arrays, for use as a hill-climbing objective
+	(scorer(*params) returns the same value as ReferencePointClassifier.score_param_array(params, X, y)).
+
+	For every sample, the (squared) distance to and index of the nearest and second-nearest reference point are kept
+	for the current base parameters. A parameter array that only differs from the base in one reference point is
+	scored from just the distances to that point, O(N) instead of O(N x K). When more than one point differs, the
+	base is moved to the new parameters one point at a time, re-scanning all reference points only for the samples
+	whose nearest or second-nearest point moved away. Scores of recently evaluated parameter arrays are cached.
+	score(params, indices) scores only a subset of the samples (eg for hillclimb.maximize_successive_halving(...)).
+
+	:param X: normalized features (N samples x D features)
+	:param y: labels of the samples
+	:param classes: class of each group of reference points
+	:param ref_points: initial reference points (classes x points per class x D)
+	:param cache_size: max number of objective values to cache
+	"""
+	def __init__(self, X: ndarray, y: ndarray, classes: ndarray, ref_points: ndarray, cache_size=4096):
+		self.X = numpy.asarray(X, dtype=numpy.float64)
+		self.classes = numpy.asarray(classes)
+		self._shape = numpy.asarray(ref_points).shape
+		(num_classes, pts_per_class, num_features) = self._shape
+		self._points = numpy.asarray(ref_points, dtype=numpy.float64).reshape((num_classes * pts_per_class, num_features)).copy()
+		self._point_class = numpy.repeat(numpy.arange(num_classes), pts_per_class)
+		## label of each sample as an index into classes (-1 if not a known class, which always scores as wrong)
+		y = numpy.asarray(y)
+		self._y_index = numpy.full((len(y),), -1, dtype=numpy.int64)
+		for i in range(0, num_classes):
+			self._y_index[y == self.classes[i]] = i
+		n = len(self.X)
+		self._best_d = numpy.zeros((n,), dtype=numpy.float64)
+		self._best_i = numpy.zeros((n,), dtype=numpy.int64)
+		self._second_d = numpy.zeros((n,), dtype=numpy.float64)
+		self._second_i = numpy.zeros((n,), dtype=numpy.int64)
+		self.cache_size = cache_size
+		self._cache = OrderedDict()
+		self._lock = threading.RLock()
+		self.evaluations = 0
+		self.cache_hits = 0
+		self.rescanned_samples = 0
+		self._rescan(numpy.arange(n))
+
+	def __call__(self, *params) -> float:
+		return self.score(params)
+
+	def score(self, params, indices: ndarray = None) -> float:
+		"""
+		:param params: parameter array (as from ReferencePointClassifier.get_param_array())
+		:param indices: indices of the samples to score (default: all samples)
+		:return: fraction of the samples that are classified correctly
+		"""
+		p = numpy.asarray(params, dtype=numpy.float64).reshape((-1,))
+		if indices is not None:
+			return self._score_subset(p, numpy.asarray(indices))
+		key = p.tobytes()
+		with self._lock:
+			self.evaluations += 1
+			if key in self._cache:
+				self.cache_hits += 1
+				self._cache.move_to_end(key)
+				return self._cache[key]
+			points = p.reshape(self._points.shape)
+			changed = numpy.nonzero(numpy.any(points != self._points, axis=1))[0]
+			if len(changed) == 1:
+				nearest = self._nearest_if_moved(changed[0], points[changed[0]])
+			else:
+				for j in changed:
+					self._move_point(j, points[j])
+				nearest = self._best_i
+			val = float(numpy.mean(self._point_class[nearest] == self._y_index))
+			self._cache[key] = val
+			if len(self._cache) > self.cache_size:
+				self._cache.popitem(last=False)
+			return val
+
+	def _score_subset(self, p: ndarray, rows: ndarray) -> float:
+		## subset scores are not cached, since the subsets change from one call to the next
+		with self._lock:
+			self.evaluations += 1
+			points = p.reshape(self._points.shape)
+			changed = numpy.nonzero(numpy.any(points != self._points, axis=1))[0]
+			if len(changed) == 1:
+				nearest = self._nearest_if_moved(changed[0], points[changed[0]], rows=rows)
+			else:
+				for j in changed:
+					self._move_point(j, points[j])
+				nearest = self._best_i[rows]
+			return float(numpy.mean(self._point_class[nearest] == self._y_index[rows]))
+
+	def stats(self) -> str:
+		return 'reference point scorer: %s evaluations, %s cache hits, %s samples re-scanned' % (
+			self.evaluations, self.cache_hits, self.rescanned_samples
+		)
+
+	def _sq_dist(self, point: ndarray, rows=None) -> ndarray:
+		X = self.X if rows is None else self.X[rows]
+		return numpy.square(X - point).sum(axis=1)
+
+	def _nearest_if_moved(self, j: int, point: ndarray, rows: ndarray = None) -> ndarray:
+		## index of the nearest point of every sample (or of the given rows) if point j were moved (without changing the base)
+		d = self._sq_dist(point, rows)
+		if rows is None:
+			(nearest, best_d, second_d, second_i) = (self._best_i.copy(), self._best_d, self._second_d, self._second_i)
+		else:
+			(nearest, best_d, second_d, second_i) = (self._best_i[rows], self._best_d[rows], self._second_d[rows], self._second_i[rows])
+		# where j was nearest but moved further away than the second nearest, the second nearest is now nearest
+		moved_away = numpy.logical_and(nearest == j, d > second_d)
+		nearest[moved_away] = second_i[moved_away]
+		nearest[d < best_d] = j
+		return nearest
+
+	def _move_point(self, j: int, point: ndarray):
+		d = self._sq_dist(point)
+		self._points[j] = point
+		was_best = self._best_i == j
+		was_second = self._second_i == j
+		## samples where j was nearest or second nearest and moved beyond the second nearest need a full re-scan
+		rescan = numpy.logical_and(numpy.logical_or(was_best, was_second), d > self._second_d)
+		# j was nearest and is still nearest
+		m = numpy.logical_and(was_best, numpy.logical_not(rescan))
+		self._best_d[m] = d[m]
+		# j is the new nearest, old nearest becomes second
+		m = numpy.logical_and(numpy.logical_not(was_best), d < self._best_d)
+		self._second_d[m] = self._best_d[m]
+		self._second_i[m] = self._best_i[m]
+		self._best_d[m] = d[m]
+		self._best_i[m] = j
+		# j is the new second nearest
+		m2 = numpy.logical_and.reduce((numpy.logical_not(was_best), numpy.logical_not(m), numpy.logical_not(rescan), d <= self._second_d))
+		m2 = numpy.logical_and(m2, numpy.logical_or(was_second, d < self._second_d))
+		self._second_d[m2] = d[m2]
+		self._second_i[m2] = j
+		self._rescan(numpy.nonzero(rescan)[0])
+
+	def _rescan(self, rows: ndarray, chunk_size=4096):
+		self.rescanned_samples += len(rows)
+		for c in range(0, len(rows), chunk_size):
+			r = rows[c:c+chunk_size]
+			d = numpy.square(self.X[r][:, numpy.newaxis, :] - self._points[numpy.newaxis, :, :]).sum(axis=2)
+			order = numpy.argsort(d, axis=1, kind='stable')[:, :2]
+			self._best_i[r] = order[:, 0]
+			self._best_d[r] = d[numpy.arange(len(r)), order[:, 0]]
+			self._second_i[r] = order[:, 1]
+			self._second_d[r] = d[numpy.arange(len(r)), order[:, 1]]
+
+## calculator model file format, mirrored from MODEL_MAGIC, MODEL_VERSION, MODEL_FEATURES, and _HEADER in
+## calculator/python/biomecalculator/model.py (the research code can't import the calculator package); keep them in
+## sync, or biomecalculator.use_model(...) will reject the exported files
+CALCULATOR_MODEL_MAGIC = b'BIOMMDL\x00'
+CALCULATOR_MODEL_VERSION = 1
+CALCULATOR_MODEL_FEATURES = ['solar_flux', 'temperature_mean', 'temperature_range', 'sqrt_precipitation']
+_CALCULATOR_MODEL_HEADER = struct.Struct('<8sIIII3d')
+
+def export_calculator_model(
+		rp_pipe: Pipeline, filepath: str, min_rain_limit_mm=110., max_rain_limit_mm=6000., jungle_max_temp_var_C=6.0
+):
+	"""
+	Writes the reference points and normalization bounds of a fitted reference point classifier pipeline to a binary
+	model file for the biome calculator (see calculator/python/biomecalculator/model.py for the file format), so that
+	it can be used with biomecalculator.use_model(filepath) instead of copying the reference points into the source.
+
+	:param rp_pipe: Pipeline with a 'normalize' MinMaxScaler and a 'my_classifier' ReferencePointClassifier
+	:param filepath: destination model file
+	:param min_rain_limit_mm: land with less annual precipitation than this is barren or sand sea
+	:param max_rain_limit_mm: land with more annual precipitation than this is wetland
+	:param jungle_max_temp_var_C: jungle with more temperature variation than this is grassland instead
+	"""
+	model_features = CALCULATOR_MODEL_FEATURES
+	normalizer: MinMaxScaler = rp_pipe['normalize']
+	rp: ReferencePointClassifier = rp_pipe['my_classifier']
+	if list(normalizer.feature_names_in_) != model_features:
+		raise ValueError('The calculator model needs features %s, not %s' % (model_features, list(normalizer.feature_names_in_)))
+	if tuple(normalizer.feature_range) != (0, 1):
+		raise ValueError('The calculator model needs features normalized to 0-1')
+	classes = numpy.asarray(rp.classes_, dtype=uint8)
+	ref_points = numpy.ascontiguousarray(rp.ref_points, dtype='<f4')
+	(num_classes, pts_per_class, num_features) = ref_points.shape
+	print('Exporting %s x %s reference points to %s...' % (num_classes, pts_per_class, filepath))
+	with open(filepath, 'wb') as fout:
+		fout.write(_CALCULATOR_MODEL_HEADER.pack(
+			CALCULATOR_MODEL_MAGIC, CALCULATOR_MODEL_VERSION, num_classes, pts_per_class, num_features,
+			min_rain_limit_mm, max_rain_limit_mm, jungle_max_temp_var_C
+		))
+		fout.write(numpy.asarray(normalizer.data_min_, dtype='<f8').tobytes())
+		fout.write(numpy.asarray(normalizer.data_max_, dtype='<f8').tobytes())
+		fout.write(classes.tobytes())
+		fout.write(bytes(-num_classes % 8))
+		fout.write(ref_points.tobytes())
+
 def zpickle(obj, filepath):
 	print('Pickling %s with gzip compression...' % filepath)
 	parent = path.dirname(path.abspath(filepath))
@@ -11,6 +11,10 @@ from matplotlib import pyplot
 ## biome codes
 from landcover_codes import *
 from biome_enum import Biome
+from photophysiology import photosynthesis_score
+from lazy_rasters import RasterGraph, RasterWindow
+from concurrent.futures import ThreadPoolExecutor
+from feature_dataset import FeatureDatasetWriter
 
 def main():
 	data_dir = 'data'
@@ -27,124 +31,42 @@ def main():
 	annual_precip_variation_zpickle = path.join(data_dir, 'precip_var_1852m_singrid.pickle.gz')
 	drp_biomes_zpickle = path.join(data_dir, 'drp_biomes_1852m_singrid.pickle.gz')
 
-	##
-	altitude = zunpickle(altitude_zpickle)
+	## source rasters are memory-mapped and derived layers are calculated one tile at a time, as needed
+	features = build_feature_graph(data_dir, sealevel_pressure_kPa=101.3, gravity_m_per_s2=9.81,
+		toa_solar_flux_Wpm2=1373, axis_tilt_deg=23, tidal_lock=False)
+	altitude = features.array('altitude')
 	#altitude[altitude < 0] = nan
-	imshow(altitude[::10,::10], 'altitude', cmap='terrain')
-	surface_temp_mean = zunpickle(surface_temp_mean_zpickle)
-	shadow = numpy.clip(altitude[::10,::10], -1, 1)
-	test_pressure = pressure_at_altitude(101, 9.81, surface_temp_mean[::10,::10], numpy.clip(altitude[::10,::10],0,numpy.inf))
+	imshow(features.read('altitude', stride=10), 'altitude', cmap='terrain')
+	surface_temp_mean = features.array('surface_temp_mean')
+	shadow = numpy.clip(features.read('altitude', stride=10), -1, 1)
+	test_pressure = features.read('pressure', stride=10)
 	imshow(test_pressure, 'pressure (kPa)', shadow_img=shadow)
 	if not path.exists(mean_solar_flux_zpickle):
-		mean_solar_flux = solar_flux_at_altitude(
-			top_of_atmosphere_flux=1373, sealevel_pressure_kPa=101.3,
-			gravity_m_per_s2=9.81, mean_temp_C=surface_temp_mean,
-			altitude_m=numpy.clip(altitude, 0, numpy.inf), axis_tilt_deg=23, tidal_lock = False
-		)
-		zpickle(mean_solar_flux, mean_solar_flux_zpickle)
-	else:
-		mean_solar_flux = zunpickle(mean_solar_flux_zpickle)
-	# test_sol_flux = solar_flux_at_altitude(1373, 101,
-	# 	9.81, surface_temp_mean[::10,::10], altitude[::10,::10], axis_tilt_deg=23, tidal_lock=False)
-	test_sol_flux = mean_solar_flux[::10, ::10]
+		zpickle(features.read('solar_flux'), mean_solar_flux_zpickle)
+	test_sol_flux = features.read('solar_flux', stride=10)
 	imshow(test_sol_flux, 'annual mean solar flux (W/m2)', shadow_img=shadow)
-	imshow(surface_temp_mean[::10,::10], 'surface temperature', shadow_img=shadow)
-	surface_temp_range = zunpickle(surface_temp_variation_zpickle)
-	imshow(surface_temp_range[::10, ::10], 'surface temp variation', shadow_img=shadow)
-	precip_mean = zunpickle(annual_precip_mean_zpickle)
-	imshow(precip_mean[::10, ::10], 'annual precipitation', shadow_img=shadow)
+	imshow(features.read('surface_temp_mean', stride=10), 'surface temperature', shadow_img=shadow)
+	surface_temp_range = features.array('surface_temp_range')
+	imshow(features.read('surface_temp_range', stride=10), 'surface temp variation', shadow_img=shadow)
+	precip_mean = features.array('precip_mean')
+	imshow(features.read('precip_mean', stride=10), 'annual precipitation', shadow_img=shadow)
 	pyplot.hist(precip_mean.ravel(), bins=25, range=(0,5000)); pyplot.title('linear space precipitation'); pyplot.show()
 	imshow(numpy.log10(precip_mean[::10, ::10]), '(log10) annual precipitation', range=(-1,4), shadow_img=shadow)
 	pyplot.hist(numpy.log10(precip_mean.ravel()), bins=25, range=(-1,4)); pyplot.title('log10 space precipitation'); pyplot.show()
-	imshow(numpy.sqrt(precip_mean[::10, ::10]), 'sqrt annual precipitation', shadow_img=shadow)
+	imshow(features.read('sqrt_precip', stride=10), 'sqrt annual precipitation', shadow_img=shadow)
 	pyplot.hist(numpy.sqrt(precip_mean.ravel()), bins=25, range=(0,100)); pyplot.title('sqrt space precipitation'); pyplot.show()
 	imshow(1.0/(precip_mean[::10, ::10]), 'inverse annual precipitation', range=(0,0.2), shadow_img=shadow)
 	pyplot.hist(1.0/(precip_mean.ravel()), bins=25, range=(0,0.2)); pyplot.title('inverse space precipitation'); pyplot.show()
+	imshow(features.read('photosynthesis', stride=10), 'relative photosynthesis', shadow_img=shadow)
+	features.clear_cache()
 
 	print('Converting biomes...')
 	# convert to DrPlantabyte biomes
-	drplantabyte_biomes = numpy.zeros(shape_1852m, dtype=numpy.uint8)
 	igbp = zunpickle(igbp_zpickle)
 	fao_hydro = zunpickle(fao_hydro_zpickle)
-	##### TERRESTRIAL BIOMES #####
-	## wetland
-	mask = logical_or(
-		igbp == IGBP_PERMANENT_WETLAND,
-		logical_or(fao_hydro == FAO_HYDRO_HERBACEOUS_WETLANDS, fao_hydro == FAO_HYDRO_WOODY_WETLANDS)
+	drplantabyte_biomes = EARTH_BIOME_LABELS.label(
+		igbp=igbp, fao_hydro=fao_hydro, altitude=altitude, mean_temp_C=surface_temp_mean
 	)
-	drplantabyte_biomes += Biome.WETLAND.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## jungle
-	mask = igbp == IGBP_EVERGREEN_BROADLEAF_FOREST
-	drplantabyte_biomes += Biome.JUNGLE.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## seasonal forest
-	mask = logical_or(
-		igbp == IGBP_DECIDUOUS_BROADLEAF_FOREST,
-		logical_or(igbp == IGBP_DECIDUOUS_NEEDLELEAF_FOREST, igbp == IGBP_MIXED_FOREST)
-	)
-	drplantabyte_biomes += Biome.SEASONAL_FOREST.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## needle-leaf/taiga forest
-	mask = igbp == IGBP_EVERGREEN_NEEDLELEAF_FOREST
-	drplantabyte_biomes += Biome.NEEDLELEAF_FOREST.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## grassland and savannahs
-	mask = logical_or(
-		igbp == IGBP_GRASSLAND,
-		logical_or(igbp == IGBP_SAVANNA, igbp == IGBP_WOODY_SAVANNA)
-	)
-	drplantabyte_biomes += Biome.GRASSLAND.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## deserts and dry shrublands
-	mask = logical_or(igbp == IGBP_OPEN_SHRUBLAND, igbp == IGBP_CLOSED_SHRUBLAND)
-	drplantabyte_biomes += Biome.DESERT_SHRUBLAND.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## sand sea & barren
-	### sand dunes are all between latitude 49 N and 28S, so just going to declare barrens within that sand dunes and
-	### everythong else not sand dunes
-	mask2 = numpy.zeros_like(drplantabyte_biomes)
-	mask2[int((90-28)*drplantabyte_biomes.shape[0]/180):int((90+49)*drplantabyte_biomes.shape[0]/180),:] = 1
-	mask = logical_and(mask2 == 1, igbp == IGBP_BARREN)
-	drplantabyte_biomes += Biome.SAND_SEA.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	mask = logical_and(mask2 == 0, igbp == IGBP_BARREN)
-	drplantabyte_biomes += Biome.BARREN.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	del mask2
-	## ice sheet
-	mask = logical_or(
-		igbp == IGBP_SNOW_AND_ICE, fao_hydro == FAO_HYDRO_PERMANENT_SNOW_AND_ICE
-	)
-	drplantabyte_biomes += Biome.ICE_SHEET.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## artificial biomes
-	mask = logical_or(igbp == IGBP_CROPLAND, igbp == IGBP_CROPLAND_NATURAL_VEGETATION_MOSAICS)
-	drplantabyte_biomes += Biome.FARMLAND.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	mask = igbp == IGBP_URBAN_AND_BUILT_UP_LANDSCAPE
-	drplantabyte_biomes += Biome.URBAN.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	##### AQUATIC BIOMES #####
-	## fresh water
-	mask = logical_and(
-		altitude > 0,
-		logical_or(igbp == IGBP_WATER_BODIES, fao_hydro == FAO_HYDRO_WATER_BODIES)
-	)
-	drplantabyte_biomes += Biome.FRESHWATER.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	### the next bit is a little fuzzy, as no decent global distribution maps exist for sea grasses or kelp forests or corals
-	## sea forest
-	mask = logical_and(
-		logical_and(altitude > -90, altitude < -6),
-		logical_and(surface_temp_mean > 5, surface_temp_mean < 20)
-	)
-	drplantabyte_biomes += Biome.SEA_FOREST.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## tropical reef
-	mask = logical_and(
-		logical_and(altitude > -90, altitude < 0),
-		logical_and(surface_temp_mean >= 20, surface_temp_mean < 30)
-	)
-	drplantabyte_biomes += Biome.TROPICAL_REEF.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## fill the remaining shallows with rocky shores
-	mask = logical_and(altitude > -90, altitude < 0)
-	drplantabyte_biomes += Biome.ROCKY_SHALLOWS.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## shallow ocean areas
-	mask = logical_and(altitude >= -200, altitude <= -90)
-	drplantabyte_biomes += Biome.SHALLOW_OCEAN.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	## fill the rest with  deepocean
-	mask = altitude < -200
-	drplantabyte_biomes += Biome.DEEP_OCEAN.value * mask_to_binary(logical_and(mask, drplantabyte_biomes == 0))
-	#### done!
-	del mask
 	zpickle(drplantabyte_biomes, drp_biomes_zpickle)
 	print('...Biomes converted!')
 	##### finished with biomes #####
@@ -172,50 +94,230 @@ def main():
 	show_counts(small_feature_set, colname='biome')
 	## need to make space in the RAM :(
 	del small_feature_set
-	del altitude
-	del surface_temp_mean
-	del surface_temp_range
-	del precip_mean
-	del drplantabyte_biomes
 	pyplot.clf()
-	import gc
-	gc.collect()
-
-	# save the data in four chunks
-	print('Saving data sets...')
-	stride = 2
-	for yoffset in range(0,stride):
-		for xoffset in range(0, stride):
-			### reloading the data each iteration to save memory
-			altitude = zunpickle(altitude_zpickle)[yoffset::stride, xoffset::stride].copy() # need to copy or we get a view into the old array
-			surface_temp_mean = zunpickle(surface_temp_mean_zpickle)[yoffset::stride, xoffset::stride].copy()
-			surface_temp_range = zunpickle(surface_temp_variation_zpickle)[yoffset::stride, xoffset::stride].copy()
-			precip_mean = zunpickle(annual_precip_mean_zpickle)[yoffset::stride, xoffset::stride].copy()
-			drplantabyte_biomes = zunpickle(drp_biomes_zpickle)[yoffset::stride, xoffset::stride].copy()
-			quarter_sample = extract_features_and_labels(
-				altitude_m=altitude,
-				mean_temp_C = surface_temp_mean,
-				range_temp_C = surface_temp_range,
-				annual_precip_mm = precip_mean,
-				biome_map=drplantabyte_biomes,
-				surface_pressure_kPa= 101, # pressure at sealevel, in kPa
-				planet_mass_kg = 5.972e24,
-				axis_tilt_deg=23,
-				planet_radius_km = 6371,
-				toa_solar_flux_Wpm2 = 1373  # max orbital solar flux, in watts per square meter
-			)
-			del altitude
-			del surface_temp_mean
-			del surface_temp_range
-			del precip_mean
-			del drplantabyte_biomes
-			zpickle(quarter_sample, path.join(data_dir, 'Earth_biome_DataFrame-%s.pickle.gz' % (stride*yoffset+xoffset)))
-			del quarter_sample
-			gc.collect()
-		pass
+
+	# stream the full-resolution data set to disk, one tile at a time
+	print('Saving data set...')
+	row_count = extract_features_and_labels_to_dataset(
+		filepath=path.join(data_dir, 'Earth_biome_features.parquet'),
+		features=features,
+		biome_map=drplantabyte_biomes,
+		surface_pressure_kPa= 101, # pressure at sealevel, in kPa
+		planet_mass_kg = 5.972e24,
+		axis_tilt_deg=23,
+		planet_radius_km = 6371,
+		toa_solar_flux_Wpm2 = 1373  # max orbital solar flux, in watts per square meter
+	)
+	print('Saved %s rows' % row_count)
+	del drplantabyte_biomes
 	#
 	print('...Done!')
 
+def build_feature_graph(
+		data_dir: str, sealevel_pressure_kPa=101.3, gravity_m_per_s2=9.81, toa_solar_flux_Wpm2=1373,
+		axis_tilt_deg=23, tidal_lock=False, tile_shape=(1080, 2160), cache_bytes=2*1024**3
+) -> RasterGraph:
+	"""
+	Declares the source rasters (memory-mapped, converted from the downloaded zpickles on first use) and the derived
+	feature layers (computed tile by tile on demand) used for the Earth biome analysis.
+
+	Layers: altitude, surface_temp_mean, surface_temp_range, precip_mean (sources), land_altitude (altitude clipped
+	to sea level), pressure_and_solar_flux (structured array of both), pressure, solar_flux, sqrt_precip,
+	photosynthesis
+	"""
+	graph = RasterGraph(tile_shape=tile_shape, cache_bytes=cache_bytes)
+	npy_dir = path.join(data_dir, 'npy')
+	for (name, zpickle_name) in [
+		('altitude', 'altitude_1852m_singrid.pickle.gz'),
+		('surface_temp_mean', 'surf_temp_mean_1852m_singrid.pickle.gz'),
+		('surface_temp_range', 'surf_temp_var_1852m_singrid.pickle.gz'),
+		('precip_mean', 'precip_mean_1852m_singrid.pickle.gz')
+	]:
+		zpickle_path = path.join(data_dir, zpickle_name)
+		graph.add_npy_source(name, path.join(npy_dir, '%s.npy' % name), loader=lambda zp=zpickle_path: zunpickle(zp))
+	graph.add_node(
+		'land_altitude', lambda altitude: numpy.clip(altitude, 0, numpy.inf), inputs=['altitude']
+	)
+	## pressure and solar flux are calculated together by one fused kernel call per tile, into the two fields of a
+	## structured array, and the 'pressure' and 'solar_flux' layers are views of those fields
+	def pressure_and_solar_flux(land_altitude, surface_temp_mean, window: RasterWindow):
+		out = numpy.empty(window.shape, dtype=[('pressure', float32), ('solar_flux', float32)])
+		pressure_and_solar_flux_at_altitude(
+			top_of_atmosphere_flux=toa_solar_flux_Wpm2, sealevel_pressure_kPa=sealevel_pressure_kPa,
+			gravity_m_per_s2=gravity_m_per_s2, mean_temp_C=surface_temp_mean,
+			altitude_m=land_altitude, axis_tilt_deg=axis_tilt_deg, tidal_lock=tidal_lock,
+			row_latitudes_deg=window.row_latitudes(), column_longitudes_deg=window.column_longitudes(),
+			out_pressure=out['pressure'], out_solar_flux=out['solar_flux']
+		)
+		return out
+	graph.add_node(
+		'pressure_and_solar_flux', pressure_and_solar_flux, inputs=['land_altitude', 'surface_temp_mean'], pass_window=True
+	)
+	graph.add_node(
+		'pressure', lambda pressure_and_solar_flux: pressure_and_solar_flux['pressure'], inputs=['pressure_and_solar_flux']
+	)
+	graph.add_node(
+		'solar_flux', lambda pressure_and_solar_flux: pressure_and_solar_flux['solar_flux'],
+		inputs=['pressure_and_solar_flux']
+	)
+	graph.add_node('sqrt_precip', lambda precip_mean: numpy.sqrt(precip_mean), inputs=['precip_mean'])
+	graph.add_node(
+		'photosynthesis', lambda surface_temp_mean, surface_temp_range, precip_mean, solar_flux, pressure: photosynthesis_score(
+			mean_temp_C=surface_temp_mean, temp_variation_C=surface_temp_range, precip_mm=precip_mean,
+			solar_flux_Wpm2=solar_flux, pressure_kPa=pressure
+		),
+		inputs=['surface_temp_mean', 'surface_temp_range', 'precip_mean', 'solar_flux', 'pressure']
+	)
+	return graph
+
+class LabelRule:
+	"""
+	One rule of a priority label table. A pixel matches the rule if its IGBP code is in igbp OR its FAO hydrology code
+	is in fao_hydro (if neither is given, every code matches) AND predicate(window, altitude, mean_temp_C) is True
+	(if a predicate is given).
+
+	:param biome: Biome label given to matching pixels
+	:param igbp: IGBP land cover codes that match this rule
+	:param fao_hydro: FAO hydrology land cover codes that match this rule
+	:param predicate: optional function (window: RasterWindow, altitude: ndarray, mean_temp_C: ndarray) -> bool mask
+	"""
+	def __init__(self, biome: Biome, igbp=(), fao_hydro=(), predicate=None):
+		self.biome = biome
+		self.igbp = tuple(igbp)
+		self.fao_hydro = tuple(fao_hydro)
+		self.predicate = predicate
+
+	@property
+	def has_codes(self) -> bool:
+		return len(self.igbp) > 0 or len(self.fao_hydro) > 0
+
+	def __repr__(self):
+		return 'LabelRule(%s, igbp=%s, fao_hydro=%s, predicate=%s)' % (self.biome, self.igbp, self.fao_hydro, self.predicate)
+
+
+class LabelCompositor:
+	"""
+	Assigns each pixel the label of the first rule (in priority order) that it matches, or 0 if no rules match.
+
+	The code conditions of the rules are compiled into 256x256 lookup tables indexed by (IGBP code, FAO hydrology
+	code), so a pixel that matches a code-only rule gets its label from a single table lookup. Only the rules with
+	predicates are evaluated per pixel, and only where they could still change the outcome. Rasters are processed in
+	row tiles, in parallel.
+
+	:param rules: list of LabelRule in priority order (highest priority first)
+	"""
+	def __init__(self, rules: [LabelRule]):
+		self.rules = list(rules)
+		n = len(self.rules)
+		self._code_match = [None] * n
+		self._final_label = numpy.zeros((256, 256), dtype=uint8)
+		self._final_rank = numpy.full((256, 256), n, dtype=numpy.int16)
+		for r in range(n - 1, -1, -1):
+			rule = self.rules[r]
+			if rule.has_codes:
+				match = numpy.zeros((256, 256), dtype=bool)
+				match[list(rule.igbp), :] = True
+				match[:, list(rule.fao_hydro)] = True
+			else:
+				match = numpy.ones((256, 256), dtype=bool)
+			self._code_match[r] = match
+			if rule.predicate is None:
+				## rules are compiled lowest priority first, so higher priority rules overwrite
+				self._final_label[match] = rule.biome.value
+				self._final_rank[match] = r
+		self._predicate_rules = [r for r in range(n - 1, -1, -1) if self.rules[r].predicate is not None]
+
+	def label(
+			self, igbp: ndarray, fao_hydro: ndarray, altitude: ndarray, mean_temp_C: ndarray,
+			tile_rows=512, threads=None, out: ndarray = None
+	) -> ndarray:
+		"""
+		Labels whole rasters (all arrays must have the same shape).
+
+		:param igbp: IGBP land cover codes (uint8)
+		:param fao_hydro: FAO hydrology land cover codes (uint8)
+		:param altitude: altitude in meters
+		:param mean_temp_C: mean surface temperature in C
+		:param tile_rows: number of raster rows per tile
+		:param threads: number of threads to label tiles with (default: number of CPUs)
+		:param out: optional pre-allocated uint8 output array
+		:return: uint8 array of Biome codes
+		"""
+		shape = tuple(igbp.shape)
+		for a in (fao_hydro, altitude, mean_temp_C):
+			if tuple(a.shape) != shape:
+				raise ValueError('All rasters must have the same shape (%s != %s)' % (a.shape, shape))
+		if out is None:
+			out = numpy.zeros(shape, dtype=uint8)
+		windows = [
+			RasterWindow(y0, min(y0 + tile_rows, shape[0]), 0, shape[1], shape)
+			for y0 in range(0, shape[0], tile_rows)
+		]
+		def label_window(w: RasterWindow):
+			out[w.y0:w.y1] = self.label_tile(
+				w, igbp[w.y0:w.y1], fao_hydro[w.y0:w.y1], altitude[w.y0:w.y1], mean_temp_C[w.y0:w.y1]
+			)
+		with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+			for _ in executor.map(label_window, windows):
+				pass
+		return out
+
+	def label_tile(self, window: RasterWindow, igbp: ndarray, fao_hydro: ndarray, altitude: ndarray, mean_temp_C: ndarray) -> ndarray:
+		"""labels one tile of the rasters (window gives the position of the tile in the full raster)"""
+		igbp = numpy.asarray(igbp).astype(uint8, copy=False)
+		fao_hydro = numpy.asarray(fao_hydro).astype(uint8, copy=False)
+		labels = self._final_label[igbp, fao_hydro]
+		rank = self._final_rank[igbp, fao_hydro]
+		## lowest priority first, so that higher priority rules overwrite
+		for r in self._predicate_rules:
+			rule = self.rules[r]
+			candidates = rank > r
+			if rule.has_codes:
+				candidates &= self._code_match[r][igbp, fao_hydro]
+			if not candidates.any():
+				continue
+			mask = logical_and(candidates, rule.predicate(window, altitude, mean_temp_C))
+			labels[mask] = rule.biome.value
+			rank[mask] = r
+		return labels
+
+def _in_sand_dune_latitudes(window: RasterWindow, altitude: ndarray, mean_temp_C: ndarray) -> ndarray:
+	### sand dunes are all between latitude 49 N and 28S, so just going to declare barrens within that sand dunes and
+	### everythong else not sand dunes
+	h = window.raster_shape[0]
+	rows = numpy.arange(window.y0, window.y1)
+	in_band = logical_and(rows >= int((90-28)*h/180), rows < int((90+49)*h/180))
+	return in_band.reshape((-1, 1))
+
+## priority rules for converting MODIS land cover (plus altitude and temperature) to DrPlantabyte biomes
+EARTH_BIOME_LABEL_RULES = [
+	##### TERRESTRIAL BIOMES #####
+	LabelRule(Biome.WETLAND, igbp=[IGBP_PERMANENT_WETLAND], fao_hydro=[FAO_HYDRO_HERBACEOUS_WETLANDS, FAO_HYDRO_WOODY_WETLANDS]),
+	LabelRule(Biome.JUNGLE, igbp=[IGBP_EVERGREEN_BROADLEAF_FOREST]),
+	LabelRule(Biome.SEASONAL_FOREST, igbp=[IGBP_DECIDUOUS_BROADLEAF_FOREST, IGBP_DECIDUOUS_NEEDLELEAF_FOREST, IGBP_MIXED_FOREST]),
+	LabelRule(Biome.NEEDLELEAF_FOREST, igbp=[IGBP_EVERGREEN_NEEDLELEAF_FOREST]),
+	LabelRule(Biome.GRASSLAND, igbp=[IGBP_GRASSLAND, IGBP_SAVANNA, IGBP_WOODY_SAVANNA]),
+	LabelRule(Biome.DESERT_SHRUBLAND, igbp=[IGBP_OPEN_SHRUBLAND, IGBP_CLOSED_SHRUBLAND]),
+	## sand sea & barren
+	LabelRule(Biome.SAND_SEA, igbp=[IGBP_BARREN], predicate=_in_sand_dune_latitudes),
+	LabelRule(Biome.BARREN, igbp=[IGBP_BARREN], predicate=lambda w, a, t: numpy.logical_not(_in_sand_dune_latitudes(w, a, t))),
+	LabelRule(Biome.ICE_SHEET, igbp=[IGBP_SNOW_AND_ICE], fao_hydro=[FAO_HYDRO_PERMANENT_SNOW_AND_ICE]),
+	## artificial biomes
+	LabelRule(Biome.FARMLAND, igbp=[IGBP_CROPLAND, IGBP_CROPLAND_NATURAL_VEGETATION_MOSAICS]),
+	LabelRule(Biome.URBAN, igbp=[IGBP_URBAN_AND_BUILT_UP_LANDSCAPE]),
+	##### AQUATIC BIOMES #####
+	LabelRule(Biome.FRESHWATER, igbp=[IGBP_WATER_BODIES], fao_hydro=[FAO_HYDRO_WATER_BODIES], predicate=lambda w, a, t: a > 0),
+	### the next bit is a little fuzzy, as no decent global distribution maps exist for sea grasses or kelp forests or corals
+	LabelRule(Biome.SEA_FOREST, predicate=lambda w, a, t: logical_and(logical_and(a > -90, a < -6), logical_and(t > 5, t < 20))),
+	LabelRule(Biome.TROPICAL_REEF, predicate=lambda w, a, t: logical_and(logical_and(a > -90, a < 0), logical_and(t >= 20, t < 30))),
+	## fill the remaining shallows with rocky shores
+	LabelRule(Biome.ROCKY_SHALLOWS, predicate=lambda w, a, t: logical_and(a > -90, a < 0)),
+	LabelRule(Biome.SHALLOW_OCEAN, predicate=lambda w, a, t: logical_and(a >= -200, a <= -90)),
+	## fill the rest with deep ocean
+	LabelRule(Biome.DEEP_OCEAN, predicate=lambda w, a, t: a < -200),
+]
+EARTH_BIOME_LABELS = LabelCompositor(EARTH_BIOME_LABEL_RULES)
+
 def histogram(data: ndarray, range: (float,float)=None, bins=25, title=None):
 	data = numpy.asarray(data).astype(float32)
 	if range is None:
@@ -244,7 +346,7 @@ def extract_features_and_labels(
 
 	mean_gravity = G * planet_mass_kg / numpy.square(planet_radius_km * 1000)
 	gravity = (G * planet_mass_kg / numpy.square(planet_radius_km * 1000 + altitude_m)).astype(numpy.float32)
-	surface_solar_flux = solar_flux_at_altitude(
+	(pressure, surface_solar_flux) = pressure_and_solar_flux_at_altitude(
 		top_of_atmosphere_flux=toa_solar_flux_Wpm2,
 		sealevel_pressure_kPa=surface_pressure_kPa,
 		gravity_m_per_s2=mean_gravity,
@@ -253,12 +355,6 @@ def extract_features_and_labels(
 		axis_tilt_deg=axis_tilt_deg,
 		tidal_lock=tidal_lock
 	)
-	pressure = pressure_at_altitude(
-		sealevel_pressure_kPa=surface_pressure_kPa,
-		gravity_m_per_s2=mean_gravity,
-		mean_temp_C=mean_temp_C,
-		altitude_m=altitude_m
-	)
 	df = DataFrame.from_dict({
 		'gravity': gravity.ravel(),
 		'solar_flux': surface_solar_flux.ravel(),
@@ -273,6 +369,59 @@ def extract_features_and_labels(
 	return df
 
 
+def extract_features_and_labels_to_dataset(
+		filepath: str, # destination .parquet file
+		features: RasterGraph, # source rasters (see build_feature_graph(...))
+		biome_map: ndarray, # biome code map (labels)
+		surface_pressure_kPa, # pressure at sealevel, in kPa
+		planet_mass_kg: float, # planet mass in kg
+		axis_tilt_deg: float, # planet axis tilt in degrees
+		planet_radius_km: float, # mean plant surface radius, in km
+		toa_solar_flux_Wpm2: float, # max orbital solar flus, in watts per square meter
+		tidal_lock = False, # True if same side of planet always faces host star
+	) -> int:
+	"""
+	Same features and labels as extract_features_and_labels(...), but calculated one tile at a time and appended to
+	an on-disk columnar data set (see feature_dataset.py) instead of building a DataFrame in memory. Returns the
+	number of rows written.
+	"""
+	G = 6.67430e-11 # N m2 / kg2
+
+	mean_gravity = G * planet_mass_kg / numpy.square(planet_radius_km * 1000)
+	## output buffers are re-used for every tile
+	pressure_buffer = numpy.empty(features.tile_shape, dtype=float32)
+	solar_flux_buffer = numpy.empty(features.tile_shape, dtype=float32)
+	with FeatureDatasetWriter(filepath) as writer:
+		for (window, altitude_m) in features.tiles('altitude'):
+			print('\textracting features from', window)
+			tile = (slice(window.y0, window.y1), slice(window.x0, window.x1))
+			mean_temp_C = features.array('surface_temp_mean')[tile]
+			gravity = (G * planet_mass_kg / numpy.square(planet_radius_km * 1000 + altitude_m)).astype(numpy.float32)
+			(pressure, surface_solar_flux) = pressure_and_solar_flux_at_altitude(
+				top_of_atmosphere_flux=toa_solar_flux_Wpm2,
+				sealevel_pressure_kPa=surface_pressure_kPa,
+				gravity_m_per_s2=mean_gravity,
+				mean_temp_C=mean_temp_C,
+				altitude_m=altitude_m,
+				axis_tilt_deg=axis_tilt_deg,
+				tidal_lock=tidal_lock,
+				row_latitudes_deg=window.row_latitudes(),
+				column_longitudes_deg=window.column_longitudes(),
+				out_pressure=pressure_buffer[:window.y1-window.y0, :window.x1-window.x0],
+				out_solar_flux=solar_flux_buffer[:window.y1-window.y0, :window.x1-window.x0]
+			)
+			writer.append({
+				'gravity': gravity,
+				'solar_flux': surface_solar_flux,
+				'pressure': pressure,
+				'altitude': altitude_m,
+				'temperature_mean': mean_temp_C,
+				'temperature_range': features.array('surface_temp_range')[tile],
+				'precipitation': features.array('precip_mean')[tile],
+				'biome': biome_map[tile]
+			})
+		return writer.row_count
+
 
 def mask_to_binary(m: ndarray) -> ndarray:
 	return m.astype(uint8)
@@ -300,7 +449,9 @@ def pressure_at_altitude(sealevel_pressure_kPa, gravity_m_per_s2, mean_temp_C, a
 	return underwater.filled(above_water)
 
 def solar_flux_at_altitude(top_of_atmosphere_flux, sealevel_pressure_kPa,
-		gravity_m_per_s2, mean_temp_C, altitude_m: ndarray, axis_tilt_deg, tidal_lock=False) -> ndarray:
+		gravity_m_per_s2, mean_temp_C, altitude_m: ndarray, axis_tilt_deg, tidal_lock=False,
+		latitude_deg: ndarray = None, longitude_deg: ndarray = None) -> ndarray:
+	## latitude_deg and longitude_deg default to a full globe the same size as altitude_m (set them to calculate a tile)
 	## solar flux claculation
 	### tidally locked: flux I = Imax * cos(lat) * clip[cos(lon), 0-1]
 	### rotating but without tilt: flux I = Imax * 2/pi * cos(lat)
@@ -316,17 +467,98 @@ def solar_flux_at_altitude(top_of_atmosphere_flux, sealevel_pressure_kPa,
 	)
 	max_flux = underwater.filled(1) * above_water * top_of_atmosphere_flux
 	if tidal_lock:
-		latitude = latitudes_like(altitude_m)
-		longitude = longitudes_like(altitude_m)
+		latitude = latitudes_like(altitude_m) if latitude_deg is None else latitude_deg
+		longitude = longitudes_like(altitude_m) if longitude_deg is None else longitude_deg
 		return max_flux * two_over_pi \
 			* numpy.cos(latitude) * clip(numpy.cos(longitude), 0, 1)
 	else:
-		latitude = latitudes_like(altitude_m)
+		latitude = latitudes_like(altitude_m) if latitude_deg is None else latitude_deg
 		return max_flux * two_over_pi * 0.5 * (
 				clip(cos(deg2Rad * (latitude - axis_tilt_deg)), 0, 1)
 				+ clip(cos(deg2Rad * (latitude + axis_tilt_deg)), 0, 1)
 		)
 
+def pressure_and_solar_flux_at_altitude(
+		top_of_atmosphere_flux, sealevel_pressure_kPa, gravity_m_per_s2, mean_temp_C: ndarray, altitude_m: ndarray,
+		axis_tilt_deg, tidal_lock=False, row_latitudes_deg: ndarray = None, column_longitudes_deg: ndarray = None,
+		out_pressure: ndarray = None, out_solar_flux: ndarray = None, block_rows=256
+) -> (ndarray, ndarray):
+	"""
+	Fused version of pressure_at_altitude(...) and solar_flux_at_altitude(...) which calculates both layers together,
+	a block of rows at a time, directly into float32 output arrays (no masked arrays or full-size temporaries).
+	Insolation only depends on latitude (and longitude when tidally locked), so it is applied as a per-row factor
+	(times a per-column factor) instead of from full latitude/longitude rasters. Gives the same results as the
+	separate functions.
+
+	:param row_latitudes_deg: latitude of each row (default: full globe from -90 to 90, like latitudes_like(...))
+	:param column_longitudes_deg: longitude of each column (default: full globe from -180 to 180, like longitudes_like(...))
+	:param out_pressure: optional pre-allocated float32 output array for pressure (kPa)
+	:param out_solar_flux: optional pre-allocated float32 output array for solar flux (W/m2)
+	:param block_rows: number of rows to calculate at a time
+	:return: (pressure, solar_flux) tuple
+	"""
+	altitude_m = numpy.asarray(altitude_m)
+	mean_temp_C = numpy.broadcast_to(numpy.asarray(mean_temp_C), altitude_m.shape)
+	(height, width) = altitude_m.shape
+	if out_pressure is None:
+		out_pressure = numpy.empty(altitude_m.shape, dtype=float32)
+	if out_solar_flux is None:
+		out_solar_flux = numpy.empty(altitude_m.shape, dtype=float32)
+	two_over_pi = 2 / numpy.pi
+	deg2Rad = numpy.pi / 180
+	water_density_kg = 1
+	R = 8.314510  # j/K/mole
+	air_molar_mass = 0.02897  # kg/mol
+	epsilon_air = 3.46391e-5 # Absorption per kPa (1360 = 1371 * 10^(-eps * 101) )
+	epsilon_water = 0.013333  # Absorption per meter (150m == 1% transmission (0.01 = 10^(-epsilon*150))
+	## per-row and per-column insolation factors
+	if row_latitudes_deg is None:
+		row_latitudes_deg = 180 * numpy.arange(height, dtype=float32)/(height-1) - 90
+	latitude = numpy.asarray(row_latitudes_deg, dtype=float32).reshape((-1, 1))
+	if tidal_lock:
+		if column_longitudes_deg is None:
+			column_longitudes_deg = 360 * numpy.arange(width, dtype=float32)/(width-1) - 180
+		longitude = numpy.asarray(column_longitudes_deg, dtype=float32).reshape((1, -1))
+		row_factor = (top_of_atmosphere_flux * two_over_pi * numpy.cos(latitude)).astype(float32)
+		column_factor = clip(numpy.cos(longitude), 0, 1).astype(float32)
+	else:
+		row_factor = (top_of_atmosphere_flux * two_over_pi * 0.5 * (
+			clip(cos(deg2Rad * (latitude - axis_tilt_deg)), 0, 1)
+			+ clip(cos(deg2Rad * (latitude + axis_tilt_deg)), 0, 1)
+		)).astype(float32)
+		column_factor = None
+	tmp = numpy.empty((min(block_rows, height), width), dtype=float32)
+	underwater = numpy.empty((min(block_rows, height), width), dtype=bool)
+	for y0 in range(0, height, block_rows):
+		y1 = min(y0 + block_rows, height)
+		a = altitude_m[y0:y1]
+		p = out_pressure[y0:y1]
+		f = out_solar_flux[y0:y1]
+		t = tmp[:y1-y0]
+		uw = underwater[:y1-y0]
+		numpy.less(a, 0, out=uw)
+		## pressure, up in the atmosphere: P0 * exp(-(M g h)/(R K))
+		numpy.add(mean_temp_C[y0:y1], 273.15, out=t, casting='unsafe')
+		numpy.multiply(t, R, out=t, casting='unsafe')
+		numpy.multiply(a, -air_molar_mass * gravity_m_per_s2, out=p, casting='unsafe')
+		numpy.divide(p, t, out=p)
+		numpy.exp(p, out=p)
+		numpy.multiply(p, sealevel_pressure_kPa, out=p, casting='unsafe')
+		## pressure, underwater: P0 - g h rho
+		numpy.multiply(a, -gravity_m_per_s2 * water_density_kg, out=t, casting='unsafe')
+		numpy.add(t, sealevel_pressure_kPa, out=p, where=uw, casting='unsafe')
+		## solar flux, absorption by the atmosphere (and the water column, when underwater)
+		numpy.multiply(p, -epsilon_air, out=f, casting='unsafe')
+		numpy.power(10, f, out=f, casting='unsafe')
+		numpy.multiply(a, epsilon_water, out=t, casting='unsafe') # <- note: altitude is negative here
+		numpy.power(10, t, out=t, where=uw, casting='unsafe')
+		numpy.multiply(f, t, out=f, where=uw)
+		## insolation
+		numpy.multiply(f, row_factor[y0:y1], out=f)
+		if column_factor is not None:
+			numpy.multiply(f, column_factor, out=f)
+	return (out_pressure, out_solar_flux)
+
 def zpickle(obj, filepath):
 	print('Pickling %s with gzip compression...' % filepath)
 	parent = path.dirname(path.abspath(filepath))
@@ -0,0 +1,102 @@
+import numpy, pandas
+from numpy import ndarray
+from pandas import DataFrame, Series
+
+## One-pass, bounded-memory stratified sampling of large (streamed) data sets.
+## Each row is given an independent uniform random key, and for every class only the rows with the k smallest keys
+## are kept (bottom-k sampling, a form of reservoir sampling). The rows kept for a class are a uniformly random sample
+## (without replacement) of all of the rows of that class seen so far, no matter how the data was split into chunks.
+
+
+class StratifiedReservoirSampler:
+	"""
+	Streaming stratified sampler. Feed it chunks of rows with add(...), then call sample(...) to get a class-balanced
+	(or per-class capped) random sample, similar to imblearn's RandomUnderSampler but without needing the whole
+	table in memory.
+
+	Usage:
+		sampler = StratifiedReservoirSampler(capacity_per_class=100000, seed=1)
+		for df in scan_feature_dataset('data/Earth_biome_features.parquet'):
+			sampler.add(df.drop(['biome'], axis=1), df['biome'])
+		(features, labels) = sampler.sample()
+
+	:param capacity_per_class: max number of rows to keep per class
+	:param seed: random seed (or numpy Generator) for reproducible sampling
+	"""
+	def __init__(self, capacity_per_class: int = 100000, seed=None):
+		if int(capacity_per_class) < 1: raise ValueError('capacity_per_class must be a positive integer')
+		self.capacity_per_class = int(capacity_per_class)
+		self._rng = numpy.random.default_rng(seed)
+		self._keys = {}
+		self._rows = {}
+		self._seen = {}
+		self._label_name = None
+		self._label_dtype = None
+
+	@property
+	def class_counts(self) -> {object: int}:
+		"""number of rows of each class seen so far"""
+		return dict(self._seen)
+
+	def add(self, features: DataFrame, labels):
+		"""
+		Adds a chunk of rows to the sampler.
+
+		:param features: DataFrame of feature rows
+		:param labels: class label of each row (same length as features)
+		"""
+		if isinstance(labels, Series) and labels.name is not None:
+			self._label_name = labels.name
+		labels = numpy.asarray(labels)
+		self._label_dtype = labels.dtype
+		if len(labels) != len(features):
+			raise ValueError('features and labels must have the same number of rows (%s != %s)' % (len(features), len(labels)))
+		keys = self._rng.random(len(labels))
+		for c in numpy.unique(labels):
+			rows = numpy.nonzero(labels == c)[0]
+			c = c.item() if hasattr(c, 'item') else c
+			self._seen[c] = self._seen.get(c, 0) + len(rows)
+			new_keys = keys[rows]
+			old_keys = self._keys.get(c)
+			if old_keys is not None and len(old_keys) >= self.capacity_per_class:
+				## reservoir is full, so only rows with smaller keys than the current largest can get in
+				smaller = new_keys < old_keys.max()
+				rows = rows[smaller]
+				new_keys = new_keys[smaller]
+			if len(rows) == 0:
+				continue
+			new_rows = features.iloc[rows]
+			if old_keys is None:
+				merged_keys = new_keys
+				merged_rows = new_rows
+			else:
+				merged_keys = numpy.concatenate((old_keys, new_keys))
+				merged_rows = pandas.concat((self._rows[c], new_rows))
+			if len(merged_keys) > self.capacity_per_class:
+				keep = numpy.argpartition(merged_keys, self.capacity_per_class - 1)[:self.capacity_per_class]
+				merged_keys = merged_keys[keep]
+				merged_rows = merged_rows.iloc[keep]
+			self._keys[c] = merged_keys
+			self._rows[c] = merged_rows
+
+	def sample(self, balanced=True) -> (DataFrame, Series):
+		"""
+		Returns the sampled rows, grouped by class.
+
+		:param balanced: if True, every class is trimmed to the size of the smallest class (like RandomUnderSampler),
+			otherwise each class has up to capacity_per_class rows
+		:return: (features, labels) tuple
+		"""
+		classes = sorted(self._keys.keys())
+		if len(classes) == 0:
+			return (DataFrame(), Series([], name=self._label_name, dtype=float))
+		n = min(len(self._keys[c]) for c in classes) if balanced else self.capacity_per_class
+		parts = []
+		part_labels = []
+		for c in classes:
+			order = numpy.argsort(self._keys[c])[:n]
+			parts.append(self._rows[c].iloc[order])
+			part_labels.append(numpy.full((len(order),), c, dtype=self._label_dtype))
+		features = pandas.concat(parts, ignore_index=True)
+		labels = Series(numpy.concatenate(part_labels), name=self._label_name)
+		return (features, labels)
@@ -0,0 +1,301 @@
+import os, json, numpy
+from os import path
+from numpy import ndarray, nan, float32
+
+## Streaming (one pass) mean and variance aggregation using Welford's algorithm, see
+## https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Welford's_online_algorithm
+
+def streaming_std_dev_start(shape, dtype=numpy.float64):
+	count = numpy.zeros(shape, dtype=numpy.int32)
+	mean = numpy.zeros(shape, dtype=dtype)
+	M2 = numpy.zeros(shape, dtype=dtype)
+	return (count, mean, M2)
+
+def streaming_std_dev_update(existingAggregate, newValue):
+	"""updates the (count, mean, M2) aggregate in place (NaN values are ignored) and returns it"""
+	return WelfordAccumulator(*existingAggregate).update(newValue).aggregate
+
+def streaming_std_dev_merge(existingAggregate, otherAggregate):
+	"""merges otherAggregate into the (count, mean, M2) aggregate in place and returns it"""
+	return WelfordAccumulator(*existingAggregate).merge(otherAggregate).aggregate
+
+def streaming_std_dev_finalize(existingAggregate):
+	(count, mean, M2) = existingAggregate
+	mask = count < 2
+	mean_mask = count <= 0
+	c = numpy.ma.masked_array(count, mask=mask, dtype=float32).filled(nan)
+	(mean, variance, sampleVariance) = (mean, M2 / c, M2 / (c - 1))
+	return (numpy.ma.masked_array(mean, mask=mean_mask).filled(nan), variance, sampleVariance)
+
+
+class WelfordAccumulator:
+	"""
+	In-place streaming mean and variance accumulator. The (count, mean, M2) arrays are updated in place with masked
+	ufuncs (where=...), so no new full-size arrays are allocated per update beyond a few scratch buffers that are
+	reused between calls. The arrays may be memory-mapped.
+
+	Partial aggregates (eg from different years or tiles, computed on separate workers) can be combined with merge(),
+	which uses Chan et al.'s parallel variance formula, see
+	https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+
+	Usage:
+		acc = WelfordAccumulator.zeros((180, 360))
+		for day in days:
+			acc.update(load_day(day))
+		(mean, variance, sampleVariance) = acc.finalize()
+
+	:param count: integer array of the number of values aggregated per pixel
+	:param mean: floating-point array of the running mean
+	:param M2: floating-point array of the running sum of squared differences from the mean
+	"""
+	def __init__(self, count: ndarray, mean: ndarray, M2: ndarray):
+		if not (count.shape == mean.shape == M2.shape):
+			raise ValueError('count, mean, and M2 arrays must all have the same shape')
+		self.count = count
+		self.mean = mean
+		self.M2 = M2
+		self._valid = None
+		self._buffers = None
+
+	@staticmethod
+	def zeros(shape, dtype=numpy.float64):
+		"""creates a new accumulator with zeroed in-memory arrays"""
+		return WelfordAccumulator(*streaming_std_dev_start(shape, dtype=dtype))
+
+	@property
+	def aggregate(self) -> (ndarray, ndarray, ndarray):
+		"""the (count, mean, M2) arrays"""
+		return (self.count, self.mean, self.M2)
+
+	def update(self, new_value: ndarray):
+		"""
+		Folds a new value into the aggregate. Pixels where the new value is not finite are left unchanged.
+
+		:param new_value: array of new values, must have the same shape as the aggregate
+		:return: this accumulator
+		"""
+		new_value = numpy.asarray(new_value)
+		if new_value.shape != self.mean.shape:
+			raise ValueError('Cannot aggregate array of shape %s into aggregate of shape %s' % (new_value.shape, self.mean.shape))
+		(valid, delta, tmp, _) = self._scratch()
+		numpy.isfinite(new_value, out=valid)
+		numpy.add(self.count, 1, out=self.count, where=valid)
+		# delta = new - mean; mean += delta / count
+		numpy.subtract(new_value, self.mean, out=delta, where=valid)
+		numpy.divide(delta, self.count, out=tmp, where=valid)
+		numpy.add(self.mean, tmp, out=self.mean, where=valid)
+		# M2 += delta * (new - mean)
+		numpy.subtract(new_value, self.mean, out=tmp, where=valid)
+		numpy.multiply(delta, tmp, out=tmp, where=valid)
+		numpy.add(self.M2, tmp, out=self.M2, where=valid)
+		return self
+
+	def merge(self, other):
+		"""
+		Merges another partial aggregate into this one (Chan's parallel algorithm). The other aggregate is not modified.
+
+		:param other: a WelfordAccumulator or (count, mean, M2) tuple with the same shape as this aggregate
+		:return: this accumulator
+		"""
+		if isinstance(other, WelfordAccumulator):
+			other = other.aggregate
+		(count_b, mean_b, M2_b) = other
+		if mean_b.shape != self.mean.shape:
+			raise ValueError('Cannot merge aggregate of shape %s into aggregate of shape %s' % (mean_b.shape, self.mean.shape))
+		(valid, delta, tmp, n) = self._scratch()
+		numpy.greater(count_b, 0, out=valid) # nothing to merge (and avoids 0/0) where the other count is zero
+		numpy.add(self.count, count_b, out=n, where=valid)
+		# delta = mean_b - mean_a; mean += delta * n_b / n
+		numpy.subtract(mean_b, self.mean, out=delta, where=valid)
+		numpy.multiply(delta, count_b, out=tmp, where=valid)
+		numpy.divide(tmp, n, out=tmp, where=valid)
+		# M2 += M2_b + delta^2 * n_a * n_b / n
+		numpy.multiply(delta, tmp, out=delta, where=valid)
+		numpy.multiply(delta, self.count, out=delta, where=valid)
+		numpy.add(self.M2, M2_b, out=self.M2, where=valid)
+		numpy.add(self.M2, delta, out=self.M2, where=valid)
+		numpy.add(self.mean, tmp, out=self.mean, where=valid)
+		numpy.add(self.count, count_b, out=self.count, where=valid)
+		return self
+
+	def finalize(self):
+		"""returns (mean, variance, sampleVariance) of the aggregate"""
+		return streaming_std_dev_finalize(self.aggregate)
+
+	def _scratch(self):
+		if self._buffers is None:
+			shape = self.mean.shape
+			self._buffers = (
+				numpy.zeros(shape, dtype=numpy.bool_),
+				numpy.zeros(shape, dtype=self.mean.dtype),
+				numpy.zeros(shape, dtype=self.mean.dtype),
+				numpy.zeros(shape, dtype=self.mean.dtype)
+			)
+		return self._buffers
+
+
+class StreamingStatsCheckpoint:
+	"""
+	Disk-backed checkpoint store for a streaming standard deviation aggregate (count, mean, M2).
+
+	The aggregate arrays live in memory-mapped .npy files and are updated in place. Two copies (slots) of the arrays
+	are kept on disk: the committed slot, which matches the last committed progress record, and the working slot,
+	which is updated in place. Committing flushes the working slot and then atomically replaces the small
+	progress.json record (which names the committed slot and holds the caller's progress value), so a crash at any
+	point leaves a consistent aggregate + progress pair to resume from.
+
+	Usage:
+		checkpoint = StreamingStatsCheckpoint('data/LST_stats', checkpoint_interval=10)
+		start = checkpoint.progress if checkpoint.progress is not None else 1
+		for day in range(start, 366):
+			checkpoint.update(load_day(day), progress=day+1)
+		checkpoint.commit(progress=366)
+		(mean, variance, sampleVariance) = checkpoint.finalize()
+
+	:param dirpath: directory to hold the checkpoint files
+	:param checkpoint_interval: number of updates between automatic commits (1 commits after every update)
+	"""
+	_array_names = ('count', 'mean', 'M2')
+
+	def __init__(self, dirpath, checkpoint_interval=1):
+		if int(checkpoint_interval) < 1: raise ValueError('checkpoint_interval must be a positive integer')
+		self.dirpath = dirpath
+		self.checkpoint_interval = int(checkpoint_interval)
+		self._record_path = path.join(dirpath, 'progress.json')
+		self._record = None
+		self._arrays = [None, None]
+		self._accumulators = [None, None]
+		self._working_slot = 0
+		self._uncommitted_updates = 0
+		self._pending_progress = None
+		if path.exists(self._record_path):
+			with open(self._record_path, 'r') as fin:
+				self._record = json.load(fin)
+			self._working_slot = 1 - self._record['slot']
+
+	@property
+	def progress(self):
+		"""the progress value of the last commit, or None if nothing has been committed yet"""
+		if self._record is None:
+			return None
+		return self._record['progress']
+
+	@property
+	def aggregate(self) -> (ndarray, ndarray, ndarray):
+		"""the current (count, mean, M2) aggregate (including uncommitted updates), or None if not started"""
+		if self._uncommitted_updates > 0:
+			return self._slot(self._working_slot)
+		if self._record is not None:
+			return self._slot(self._record['slot'])
+		return None
+
+	def start(self, shape, dtype=numpy.float64):
+		"""creates empty (zeroed) aggregate arrays; this is done automatically by the first call to update()"""
+		self._record_shape = (tuple(shape), numpy.dtype(dtype).str)
+		for slot in (0, 1):
+			self._arrays[slot] = self._create_slot(slot, shape, dtype)
+			self._accumulators[slot] = None
+		self._uncommitted_updates = 0
+
+	def update(self, new_value: ndarray, progress):
+		"""
+		Folds a new value into the aggregate (NaN values are ignored) and commits if the checkpoint interval has been
+		reached.
+
+		:param new_value: array of new values, must have the same shape as the aggregate
+		:param progress: JSON-compatible value that tells the caller where to resume from if this update is committed
+		"""
+		if self._record is None and self._arrays[0] is None:
+			self.start(new_value.shape)
+		self._begin_update().update(new_value)
+		self._uncommitted_updates += 1
+		if self._uncommitted_updates >= self.checkpoint_interval:
+			self.commit(progress)
+		else:
+			self._pending_progress = progress
+
+	def commit(self, progress=None):
+		"""
+		Flushes all pending updates to disk and atomically records the given progress value. Does nothing if there
+		are no pending updates and no new progress value.
+
+		:param progress: JSON-compatible progress value (defaults to the progress value of the latest update)
+		"""
+		if progress is None:
+			if self._uncommitted_updates == 0:
+				return
+			progress = self._pending_progress
+		if self._uncommitted_updates > 0:
+			for a in self._slot(self._working_slot):
+				a.flush()
+			committed_slot = self._working_slot
+		elif self._record is not None:
+			committed_slot = self._record['slot']
+		else:
+			raise ValueError('Cannot commit progress before any data has been aggregated')
+		(shape, dtype) = self._shape_and_dtype()
+		record = {'slot': committed_slot, 'shape': list(shape), 'dtype': dtype, 'progress': progress}
+		tmp_path = self._record_path + '.tmp'
+		with open(tmp_path, 'w') as fout:
+			json.dump(record, fout)
+			fout.flush()
+			os.fsync(fout.fileno())
+		os.replace(tmp_path, self._record_path)
+		self._record = record
+		self._working_slot = 1 - committed_slot
+		self._uncommitted_updates = 0
+
+	def import_aggregate(self, aggregate, progress):
+		"""
+		Replaces the stored aggregate with the given (count, mean, M2) tuple (eg from an old pickle file) and commits
+		it with the given progress value.
+		"""
+		(count, mean, M2) = aggregate
+		self.start(count.shape, dtype=mean.dtype)
+		for dest, src in zip(self._slot(self._working_slot), (count, mean, M2)):
+			dest[...] = src
+		self._uncommitted_updates = 1
+		self.commit(progress)
+
+	def finalize(self):
+		"""returns (mean, variance, sampleVariance) of the current aggregate"""
+		return streaming_std_dev_finalize(self.aggregate)
+
+	def _begin_update(self) -> WelfordAccumulator:
+		working = self._slot(self._working_slot)
+		if self._uncommitted_updates == 0 and self._record is not None:
+			# first update since the last commit, so bring the working slot up to date with the committed slot
+			for dest, src in zip(working, self._slot(self._record['slot'])):
+				numpy.copyto(dest, src)
+		if self._accumulators[self._working_slot] is None:
+			self._accumulators[self._working_slot] = WelfordAccumulator(*working)
+		return self._accumulators[self._working_slot]
+
+	def _slot(self, slot: int) -> (ndarray, ndarray, ndarray):
+		if self._arrays[slot] is None:
+			(shape, dtype) = self._shape_and_dtype()
+			slot_dir = path.join(self.dirpath, 'slot-%s' % slot)
+			if path.exists(path.join(slot_dir, 'count.npy')):
+				self._arrays[slot] = tuple(
+					numpy.lib.format.open_memmap(path.join(slot_dir, '%s.npy' % name), mode='r+')
+					for name in self._array_names
+				)
+			else:
+				self._arrays[slot] = self._create_slot(slot, shape, dtype)
+		return self._arrays[slot]
+
+	def _create_slot(self, slot: int, shape, dtype):
+		slot_dir = path.join(self.dirpath, 'slot-%s' % slot)
+		os.makedirs(slot_dir, exist_ok=True)
+		arrays = []
+		for name, array_dtype in zip(self._array_names, (numpy.int32, dtype, dtype)):
+			a = numpy.lib.format.open_memmap(
+				path.join(slot_dir, '%s.npy' % name), mode='w+', dtype=array_dtype, shape=tuple(shape)
+			)
+			arrays.append(a) # new .npy memmaps are zero-filled
+		return tuple(arrays)
+
+	def _shape_and_dtype(self):
+		if self._record is not None:
+			return (tuple(self._record['shape']), self._record['dtype'])
+		return self._record_shape